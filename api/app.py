@@ -1,26 +1,37 @@
 # app.py
 
 from flask import Flask, request, jsonify, render_template, redirect
-from database import db_session
+from database import db_session, init_db
 from models import User, Channel, Message
+from outbox import Dispatcher, enqueue
+from pagination import keyset_page, link_header, page_args
+from sentiment import polarity
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import (
     JWTManager, jwt_required, create_access_token,
     get_jwt_identity
 )
-from textblob import TextBlob
 
+import click
 import os
 import pusher
 
 app = Flask(__name__)
+init_db()
 
 pusher = pusher.Pusher(
     app_id=os.getenv('PUSHER_APP_ID'),
     key=os.getenv('PUSHER_KEY'),
     secret=os.getenv('PUSHER_SECRET'),
     cluster=os.getenv('PUSHER_CLUSTER'),
-    ssl=True)
+    # PUSHER_HOST/PUSHER_PORT point the client at a local fake_pusher.py
+    host=os.getenv('PUSHER_HOST'),
+    port=int(os.getenv('PUSHER_PORT')) if os.getenv('PUSHER_PORT') else None,
+    ssl=os.getenv('PUSHER_SSL', 'true').lower() == 'true')
+
+# Events are written to the outbox with the request's data and sent in the background
+dispatcher = Dispatcher(pusher)
+app.config.setdefault('OUTBOX_DISPATCHER', os.getenv('OUTBOX_DISPATCHER', 'true').lower() == 'true')
 
 app.config['JWT_SECRET_KEY'] = 'something-super-secret'  # Change this!
 jwt = JWTManager(app)
@@ -36,6 +47,12 @@ def shutdown_session(exception=None):
     db_session.remove()
 
 
+@app.before_first_request
+def start_dispatcher():
+    if app.config['OUTBOX_DISPATCHER']:
+        dispatcher.start()
+
+
 @app.route('/api/register', methods=["POST"])
 def register():
     data = request.get_json()
@@ -107,7 +124,6 @@ def request_chat():
         new_channel.to_user = to_user
         new_channel.name = chat_channel
         db_session.add(new_channel)
-        db_session.commit()
     else:
         # Use the channel name stored on the database
         chat_channel = channel.name
@@ -121,7 +137,9 @@ def request_chat():
     }
 
     # Trigger an event to the other user
-    pusher.trigger(to_user_channel, 'new_chat', data)
+    enqueue(to_user_channel, 'new_chat', data)
+    db_session.commit()
+    dispatcher.wake()
 
     return jsonify(data)
 
@@ -148,23 +166,26 @@ def send_message():
     to_user = request_data.get('to_user', '')
     message = request_data.get('message', '')
     channel = request_data.get('channel')
+    sentiment = getSentiment(message)
 
     new_message = Message(message=message, channel_id=channel)
     new_message.from_user = from_user
     new_message.to_user = to_user
+    new_message.sentiment = sentiment['polarity']
     db_session.add(new_message)
-    db_session.commit()
 
     message = {
         "from_user": from_user,
         "to_user": to_user,
         "message": message,
         "channel": channel,
-        "sentiment": getSentiment(message)
+        "sentiment": sentiment
     }
 
-    # Trigger an event to the other user
-    pusher.trigger(channel, 'new_message', message)
+    # Trigger an event to the other user, committed together with the message
+    enqueue(channel, 'new_message', message)
+    db_session.commit()
+    dispatcher.wake()
 
     return jsonify(message)
 
@@ -172,33 +193,87 @@ def send_message():
 @app.route('/api/users')
 @jwt_required
 def users():
-    users = User.query.all()
-    return jsonify(
+    try:
+        limit, after_id, _ = page_args()
+    except ValueError:
+        return bad_page_args()
+    users, has_more = keyset_page(User.query, User.id, limit, after=after_id)
+    response = jsonify(
         [{"id": user.id, "userName": user.username} for user in users]
-    ), 200
+    )
+    if has_more:
+        response.headers['Link'] = link_header(limit, next={'after_id': users[-1].id})
+    return response, 200
 
 
 @app.route('/api/get_message/<channel_id>')
 @jwt_required
 def user_messages(channel_id):
-    messages = Message.query.filter(Message.channel_id == channel_id).all()
+    # Without a cursor this returns the newest page; before_id pages back, after_id fetches newer messages
+    try:
+        limit, after_id, before_id = page_args()
+    except ValueError:
+        return bad_page_args()
+    messages, has_more = keyset_page(Message.query.filter(Message.channel_id == channel_id), Message.id,
+                                     limit, after=after_id, before=before_id, newest_first=True)
 
-    return jsonify([
+    response = jsonify([
         {
             "id": message.id,
             "message": message.message,
             "to_user": message.to_user,
             "channel_id": message.channel_id,
             "from_user": message.from_user,
-            "sentiment": getSentiment(message.message)
+            "sentiment": storedSentiment(message)
         }
         for message in messages
     ])
+    if messages:
+        # next is always offered so clients can poll it for new messages
+        older = after_id is not None or has_more
+        response.headers['Link'] = link_header(limit,
+                                               prev=older and {'before_id': messages[0].id},
+                                               next={'after_id': messages[-1].id})
+    return response
+
+
+def bad_page_args():
+    return jsonify({
+        "status": "error",
+        "message": "limit, after_id and before_id must be integers"
+    }), 400
 
 
 def getSentiment(message):
-        text = TextBlob(message)
-        return {'polarity': text.polarity}
+    return {'polarity': polarity(message)}
+
+
+def storedSentiment(message):
+    # Rows written before the column existed are filled in by `flask backfill-sentiment`
+    if message.sentiment is None:
+        return getSentiment(message.message)
+    return {'polarity': message.sentiment}
+
+
+@app.cli.command('backfill-sentiment')
+@click.option('--batch-size', default=500, help='Messages updated per commit.')
+def backfill_sentiment(batch_size):
+    """Store sentiment for messages written before it was saved at insert time."""
+    total = 0
+    last_id = 0
+    while True:
+        messages = Message.query.filter(Message.sentiment.is_(None), Message.id > last_id) \
+                                .order_by(Message.id) \
+                                .limit(batch_size) \
+                                .all()
+        if not messages:
+            break
+        for message in messages:
+            message.sentiment = polarity(message.message)
+        db_session.commit()
+        total += len(messages)
+        last_id = messages[-1].id
+    click.echo('Backfilled sentiment for %d messages' % total)
 
 # run Flask app
 if __name__ == "__main__":
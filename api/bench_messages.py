@@ -0,0 +1,118 @@
+"""Channel read latency for GET /api/get_message/<channel_id>.
+
+Seeds a throwaway SQLite database and times the endpoint three ways:
+
+  per-read   sentiment computed with TextBlob for every message on every read
+             (how the endpoint used to work)
+  memoised   no stored sentiment, falling back to the LRU-cached polarity()
+  stored     sentiment read from the messages.sentiment column
+
+Usage: python bench_messages.py [--messages 1000] [--reads 30]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+TEXTS = [
+    'ok', 'good night', 'See you tomorrow!', 'That is great news', 'I am so tired today',
+    'This is terrible, nothing works', 'Thanks a lot, you are awesome', 'what time is the meeting?',
+    'I really love this new place', 'not sure, maybe later', 'haha', 'Sorry, I was busy',
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=1000, help='messages in the channel')
+    parser.add_argument('--reads', type=int, default=30, help='timed reads per mode')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench-messages-')
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(directory, 'bench.db'),
+        # Read the whole channel in one page so every message goes through sentiment
+        'MAX_PAGE_SIZE': str(args.messages),
+        # pusher only accepts a numeric app id
+        'PUSHER_APP_ID': '123', 'PUSHER_KEY': 'bench', 'PUSHER_SECRET': 'bench', 'PUSHER_CLUSTER': 'bench',
+        'OUTBOX_DISPATCHER': 'false',
+    })
+    try:
+        run(args)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(args):
+    # Imported here so the app picks up the throwaway database
+    import app as api
+    import sentiment
+    from database import db_session
+    from flask_jwt_extended import create_access_token
+    from models import Channel, Message, User
+
+    rng = random.Random(42)
+    a, b = User('bench_a', 'x'), User('bench_b', 'x')
+    db_session.add_all([a, b])
+    db_session.commit()
+    channel = Channel(name='private-chat_%s_%s' % (a.id, b.id), from_user=a.id, to_user=b.id)
+    db_session.add(channel)
+    db_session.commit()
+    # Each request ends with db_session.remove(), which detaches the objects loaded here
+    channel_id, from_user, to_user = channel.id, a.id, b.id
+    # Most chat lines are unique, a few short ones repeat
+    texts = [rng.choice(TEXTS) if rng.random() < 0.3 else '%s (%d)' % (rng.choice(TEXTS), i)
+             for i in range(args.messages)]
+    db_session.bulk_save_objects([
+        Message(message=text, from_user=from_user, to_user=to_user, channel_id=channel_id,
+                sentiment=sentiment.polarity(text))
+        for text in texts
+    ])
+    db_session.commit()
+
+    with api.app.app_context():
+        token = create_access_token(identity='bench_a')
+    client = api.app.test_client()
+    headers = {'Authorization': 'Bearer %s' % token}
+    url = '/api/get_message/%s' % channel_id
+    page = {'limit': args.messages}
+
+    def measure():
+        client.get(url, query_string=page, headers=headers)  # warm up
+        latencies = []
+        for _ in range(args.reads):
+            started = time.perf_counter()
+            response = client.get(url, query_string=page, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.data
+        return latencies
+
+    results = {'stored': measure()}
+
+    Message.query.update({Message.sentiment: None})
+    db_session.commit()
+    sentiment.polarity.cache_clear()
+    results['memoised'] = measure()
+
+    api.polarity = sentiment.polarity.__wrapped__
+    try:
+        results['per-read'] = measure()
+    finally:
+        api.polarity = sentiment.polarity
+
+    print('%d messages in the channel, %d reads per mode' % (args.messages, args.reads))
+    for mode in ('per-read', 'memoised', 'stored'):
+        latencies = results[mode]
+        print('  %-9s p50 %8.2f ms   p95 %8.2f ms' % (mode, percentile(latencies, 50), percentile(latencies, 95)))
+    print('stored column is %.1fx faster than per-read sentiment at p50'
+          % (percentile(results['per-read'], 50) / percentile(results['stored'], 50)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""send_message latency and Pusher fan-out throughput, against fake_pusher.py.
+
+Runs the API on a throwaway SQLite database and a local fake Pusher that
+answers after --latency seconds (optionally failing --failure-rate of the
+requests), then sends --messages messages two ways:
+
+  inline   the request triggers Pusher itself before responding
+           (how send_message used to work)
+  outbox   the request only writes the outbox; the dispatcher sends batches
+
+For the outbox run it also reports how long the dispatcher took to deliver
+everything and how many Pusher requests that needed.
+
+Usage: python bench_pusher.py [--messages 500] [--latency 0.05] [--failure-rate 0]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from fake_pusher import FakePusher
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500, help='messages sent per mode')
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Pusher response time in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of Pusher requests that fail')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds to wait for the outbox to drain')
+    args = parser.parse_args()
+
+    fake = FakePusher(latency=args.latency, seed=42).start()
+    directory = tempfile.mkdtemp(prefix='bench-pusher-')
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(directory, 'bench.db'),
+        'PUSHER_APP_ID': '123', 'PUSHER_KEY': 'bench', 'PUSHER_SECRET': 'bench',
+        'PUSHER_HOST': fake.host, 'PUSHER_PORT': str(fake.port), 'PUSHER_SSL': 'false',
+        'OUTBOX_DISPATCHER': 'false', 'OUTBOX_RETRY_BASE': '0.05', 'OUTBOX_RETRY_MAX': '1',
+    })
+    try:
+        run(args, fake)
+    finally:
+        fake.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(args, fake):
+    # Imported here so the app picks up the throwaway database and the fake Pusher
+    import app as api
+    from database import db_session
+    from flask_jwt_extended import create_access_token
+    from models import Channel, OutboxEvent, User
+
+    a, b = User('bench_a', 'x'), User('bench_b', 'x')
+    db_session.add_all([a, b])
+    db_session.commit()
+    channel = Channel(name='private-chat_%s_%s' % (a.id, b.id), from_user=a.id, to_user=b.id)
+    db_session.add(channel)
+    db_session.commit()
+    channel_name, from_user, to_user = channel.name, a.id, b.id
+    db_session.remove()
+
+    with api.app.app_context():
+        token = create_access_token(identity='bench_a')
+    client = api.app.test_client()
+    headers = {'Authorization': 'Bearer %s' % token}
+
+    def send(i):
+        payload = {'from_user': from_user, 'to_user': to_user, 'channel': channel_name,
+                   'message': 'benchmark message %d' % i}
+        started = time.perf_counter()
+        response = client.post('/api/send_message', json=payload, headers=headers)
+        assert response.status_code == 200, response.data
+        return payload, response, started
+
+    # inline: the dispatcher is off, the request waits for Pusher like before
+    inline = []
+    for i in range(args.messages):
+        payload, response, started = send(i)
+        try:
+            api.pusher.trigger(channel_name, 'new_message', response.get_json())
+        except Exception:
+            pass  # the old handler would have returned a 500 here
+        inline.append(time.perf_counter() - started)
+    OutboxEvent.query.delete()
+    db_session.commit()
+    db_session.remove()
+    inline_requests = fake.requests
+
+    # outbox: the request returns after the commit, the dispatcher drains in the background
+    fake.failure_rate = args.failure_rate
+    received_before = fake.received()
+    api.dispatcher.start()
+    outbox = []
+    started_all = time.perf_counter()
+    for i in range(args.messages):
+        _, _, started = send(i)
+        outbox.append(time.perf_counter() - started)
+    deadline = time.time() + args.timeout
+    while fake.received() - received_before < args.messages and time.time() < deadline:
+        time.sleep(0.01)
+    drain_seconds = time.perf_counter() - started_all
+    api.dispatcher.stop()
+    delivered = fake.received() - received_before
+
+    print('%d messages, fake Pusher latency %.0f ms, failure rate %.0f%%'
+          % (args.messages, args.latency * 1000, args.failure_rate * 100))
+    for mode, latencies in (('inline', inline), ('outbox', outbox)):
+        print('  %-7s send_message p50 %7.2f ms   p95 %7.2f ms'
+              % (mode, percentile(latencies, 50), percentile(latencies, 95)))
+    print('  inline  %d Pusher requests' % inline_requests)
+    print('  outbox  %d/%d events delivered in %.2f s (%.0f events/s), %d Pusher requests, %d event send failures'
+          % (delivered, args.messages, drain_seconds, delivered / drain_seconds,
+             api.dispatcher.stats['requests'], api.dispatcher.stats['failures']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Load test for the read endpoints and request_chat.
+
+Seeds a throwaway SQLite database, then hammers GET /api/users,
+GET /api/get_message/<channel_id> and POST /api/request_chat from several
+threads for a fixed time. It runs twice, each in its own process because the
+engine is configured at import time:
+
+  legacy   no pooling, default journal/synchronous pragmas, no composite
+           indexes and unbounded pages (what the API used to do with .all())
+  tuned    the pooled WAL engine, composite indexes and default page size
+
+Usage: python bench_reads.py [--users 5000] [--channels 2000] [--messages 100000]
+                             [--threads 8] [--seconds 10] [--mode both|legacy|tuned]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+UNBOUNDED = 10 ** 9
+
+MODES = {
+    'legacy': {'DB_POOL_SIZE': '0', 'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL',
+               'SQLITE_CACHE_SIZE': '-2000', 'MAX_PAGE_SIZE': str(UNBOUNDED)},
+    'tuned': {},
+}
+LEGACY_INDEXES = ('ix_messages_channel_id_id', 'ix_channels_from_user_to_user')
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--channels', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--mode', choices=['both'] + list(MODES), default='both')
+    args = parser.parse_args()
+
+    if args.mode != 'both':
+        print(json.dumps(run(args)))
+        return
+
+    results = {}
+    for mode in MODES:
+        command = [sys.executable, os.path.abspath(__file__), '--mode', mode] + \
+                  ['--%s=%s' % (name, getattr(args, name)) for name in ('users', 'channels', 'messages', 'threads', 'seconds')]
+        output = subprocess.check_output(command, cwd=os.path.dirname(os.path.abspath(__file__)))
+        results[mode] = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+    legacy, tuned = results['legacy'], results['tuned']
+    print('%d users, %d channels, %d messages, %d threads for %ss'
+          % (args.users, args.channels, args.messages, args.threads, args.seconds))
+    print('  %-22s %21s %21s' % ('', 'legacy p50/p95 ms', 'tuned p50/p95 ms'))
+    for name in tuned['endpoints']:
+        before, after = legacy['endpoints'][name], tuned['endpoints'][name]
+        print('  %-22s %10s/%-10s %10s/%-10s' % (name, before['p50_ms'], before['p95_ms'], after['p50_ms'], after['p95_ms']))
+    for mode in MODES:
+        print('  %-7s %7.1f requests/s, %d errors' % (mode, results[mode]['requests_per_second'], results[mode]['errors']))
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='bench-reads-')
+    path = os.path.join(directory, 'bench.db')
+    os.environ.update(MODES[args.mode])
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + path,
+        'PUSHER_APP_ID': '123', 'PUSHER_KEY': 'bench', 'PUSHER_SECRET': 'bench', 'PUSHER_CLUSTER': 'bench',
+        'OUTBOX_DISPATCHER': 'false',
+    })
+    try:
+        # Imported here so the app picks up the throwaway database and the mode's settings
+        import app as api
+        from flask_jwt_extended import create_access_token
+
+        pairs, busy_channel = seed(path, args)
+        if args.mode == 'legacy':
+            connection = sqlite3.connect(path)
+            for name in LEGACY_INDEXES:
+                connection.execute('DROP INDEX IF EXISTS %s' % name)
+            connection.close()
+        with api.app.app_context():
+            token = create_access_token(identity='bench')
+        return load(api.app, token, pairs, busy_channel, args)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def seed(path, args):
+    rng = random.Random(42)
+    connection = sqlite3.connect(path)
+    connection.executemany('INSERT INTO users (id, username, password) VALUES (?, ?, ?)',
+                           [(i, 'user_%d' % i, 'x') for i in range(1, args.users + 1)])
+    pairs = set()
+    while len(pairs) < args.channels:
+        a, b = rng.sample(range(1, args.users + 1), 2)
+        pairs.add((a, b))
+    pairs = sorted(pairs)
+    connection.executemany('INSERT INTO channels (id, name, from_user, to_user) VALUES (?, ?, ?, ?)',
+                           [(i, 'private-chat_%d_%d' % pair, pair[0], pair[1]) for i, pair in enumerate(pairs, 1)])
+    # A fifth of the messages go to one busy channel, the rest are spread out
+    rows = []
+    for i in range(1, args.messages + 1):
+        channel_id = 1 if rng.random() < 0.2 else rng.randint(1, len(pairs))
+        a, b = pairs[channel_id - 1]
+        rows.append((i, 'message %d' % i, a, b, channel_id, round(rng.uniform(-1, 1), 3)))
+    connection.executemany('INSERT INTO messages (id, message, from_user, to_user, channel_id, sentiment) '
+                           'VALUES (?, ?, ?, ?, ?, ?)', rows)
+    connection.commit()
+    connection.execute('ANALYZE')
+    connection.close()
+    return pairs, 1
+
+
+def load(app, token, pairs, busy_channel, args):
+    headers = {'Authorization': 'Bearer %s' % token}
+    page = {'limit': UNBOUNDED} if args.mode == 'legacy' else {}
+    operations = [
+        ('GET users', 2, lambda client, rng: client.get('/api/users', query_string=page, headers=headers)),
+        ('GET busy channel', 4, lambda client, rng: client.get('/api/get_message/%d' % busy_channel,
+                                                               query_string=page, headers=headers)),
+        ('GET random channel', 2, lambda client, rng: client.get('/api/get_message/%d' % rng.randint(1, len(pairs)),
+                                                                 query_string=page, headers=headers)),
+        ('POST request_chat', 2, lambda client, rng: client.post('/api/request_chat', headers=headers, json=dict(
+            zip(('from_user', 'to_user'), rng.choice(pairs))))),
+    ]
+    weighted = [operation for operation in operations for _ in range(operation[1])]
+    latencies = {name: [] for name, _, _ in operations}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.time() + args.seconds
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        while time.time() < deadline:
+            name, _, call = rng.choice(weighted)
+            started = time.perf_counter()
+            try:
+                status = call(client, rng).status_code
+            except Exception as error:
+                status = repr(error)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[name].append(elapsed)
+                if status != 200:
+                    errors.append(status)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    return {
+        'endpoints': {name: {'requests': len(values), 'p50_ms': percentile(values, 50), 'p95_ms': percentile(values, 95)}
+                      for name, values in latencies.items()},
+        'requests_per_second': sum(len(values) for values in latencies.values()) / elapsed,
+        'errors': len(errors),
+    }
+
+
+if __name__ == '__main__':
+    main()
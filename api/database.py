@@ -1,7 +1,49 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-engine = create_engine('sqlite:///database.db', convert_unicode=True)
+from sqlalchemy.pool import NullPool, QueuePool
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///database.db')
+
+# Connections kept open per process; DB_POOL_SIZE=0 opens a new connection for every session
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
+
+# Applied to every new SQLite connection. WAL lets reads run while the outbox dispatcher writes.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -20000)),  # negative means KiB
+    'temp_store': 'MEMORY',
+}
+
+
+def engine_options(url):
+    if DB_POOL_SIZE <= 0:
+        return {'poolclass': NullPool}
+    options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+    }
+    if url.startswith('sqlite'):
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            # Each in-memory connection is its own database, keep the SQLAlchemy default
+            return {}
+        # SQLAlchemy does not pool file databases by default; pooled connections move between threads
+        options.update(poolclass=QueuePool, connect_args={'check_same_thread': False})
+    else:
+        options['pool_pre_ping'] = True
+    return options
+
+
+engine = create_engine(DATABASE_URL, convert_unicode=True, **engine_options(DATABASE_URL))
 db_session = scoped_session(sessionmaker(autocommit=False,
                                          autoflush=False,
                                          bind=engine))
@@ -9,6 +51,30 @@ Base = declarative_base()
 Base.query = db_session.query_property()
 
 
+@event.listens_for(engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if engine.dialect.name != 'sqlite':
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute('PRAGMA %s=%s' % (name, value))
+    cursor.close()
+
+
 def init_db():
     import models
     Base.metadata.create_all(bind=engine)
+    upgrade_db()
+
+
+def upgrade_db():
+    # create_all() does not touch existing tables, so add newer columns and indexes by hand
+    inspector = inspect(engine)
+    columns = {column['name'] for column in inspector.get_columns('messages')}
+    if 'sentiment' not in columns:
+        engine.execute('ALTER TABLE messages ADD COLUMN sentiment FLOAT')
+    for table in Base.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
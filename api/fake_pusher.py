@@ -0,0 +1,128 @@
+"""A local stand-in for the Pusher HTTP API, for development and benchmarks.
+
+Accepts POST /apps/<app_id>/events and /apps/<app_id>/batch_events, records
+the events it received and answers like Pusher does. Request signatures are
+not checked. Requests carrying an event whose data is longer than
+max_event_size are refused with 400 and nothing in them is recorded. Point the API at it with
+
+    PUSHER_HOST=127.0.0.1 PUSHER_PORT=4567 PUSHER_SSL=false flask run
+
+Usage: python fake_pusher.py [--port 4567] [--latency 0.05] [--failure-rate 0.1]
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakePusher(object):
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, failure_rate=0.0, seed=None, max_event_size=10240):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.max_event_size = max_event_size
+        self.random = random.Random(seed)
+        self.events = []
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.host, self.port = self.server.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='fake-pusher')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def received(self):
+        with self.lock:
+            return len(self.events)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                payload = json.loads(body.decode('utf-8') or '{}')
+                if fake.latency:
+                    time.sleep(fake.latency)
+                with fake.lock:
+                    fake.requests += 1
+                    rejected = fake.too_large(payload)
+                    failed = not rejected and fake.random.random() < fake.failure_rate
+                    if rejected:
+                        fake.rejected += 1
+                    elif failed:
+                        fake.failures += 1
+                    else:
+                        fake.record(self.path, payload)
+                if rejected:
+                    self.reply(400, {'error': 'event data too large'})
+                elif failed:
+                    self.reply(500, {'error': 'fake failure'})
+                else:
+                    self.reply(200, {})
+
+            def reply(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def too_large(self, payload):
+        events = payload.get('batch', [payload])
+        return any(len(event.get('data') or '') > self.max_event_size for event in events)
+
+    def record(self, path, payload):
+        if path.split('?')[0].endswith('/batch_events'):
+            for event in payload.get('batch', []):
+                self.events.append({'channel': event['channel'], 'name': event['name'], 'data': event['data']})
+        else:
+            for channel in payload.get('channels', []):
+                self.events.append({'channel': channel, 'name': payload['name'], 'data': payload['data']})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4567)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='fraction of requests answered with 500')
+    args = parser.parse_args()
+
+    fake = FakePusher(args.host, args.port, args.latency, args.failure_rate).start()
+    print('Fake Pusher listening on http://%s:%s' % (fake.host, fake.port))
+    try:
+        while True:
+            time.sleep(5)
+            print('%d requests, %d failed, %d events received' % (fake.requests, fake.failures, fake.received()))
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+import time
+
+from sqlalchemy import Column, Float, Index, Integer, String, Text, ForeignKey
 from database import Base
 
 
@@ -18,6 +20,8 @@ class User(Base):
 
 class Channel(Base):
     __tablename__ = 'channels'
+    # request_chat looks channels up by the (from_user, to_user) pair
+    __table_args__ = (Index('ix_channels_from_user_to_user', 'from_user', 'to_user'),)
     id = Column(Integer, primary_key=True)
     name = Column(String(60))
     from_user = Column(Integer, ForeignKey('users.id'))
@@ -26,8 +30,26 @@ class Channel(Base):
 
 class Message(Base):
     __tablename__ = 'messages'
+    # Messages of a channel are read in id order, a page at a time
+    __table_args__ = (Index('ix_messages_channel_id_id', 'channel_id', 'id'),)
     id = Column(Integer, primary_key=True)
     message = Column(Text)
     from_user = Column(Integer, ForeignKey('users.id'))
     to_user = Column(Integer, ForeignKey('users.id'))
     channel_id = Column(Integer, ForeignKey('channels.id'))
+    # TextBlob polarity, computed once when the message is written
+    sentiment = Column(Float)
+
+
+class OutboxEvent(Base):
+    """A Pusher event waiting to be sent by the outbox dispatcher."""
+    __tablename__ = 'outbox'
+    id = Column(Integer, primary_key=True)
+    channel = Column(String(200))
+    event = Column(String(200))
+    data = Column(Text)  # JSON encoded payload
+    attempts = Column(Integer, default=0, nullable=False)
+    # Earliest time (unix seconds) the event may be sent: now for new events, later when retrying or claimed
+    available_at = Column(Float, default=0, nullable=False, index=True)
+    claim = Column(String(32))
+    created_at = Column(Float, default=time.time)
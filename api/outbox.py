@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+from pusher.errors import PusherBadRequest
+
+from database import db_session
+from models import OutboxEvent
+
+log = logging.getLogger(__name__)
+
+# Pusher accepts at most 10 events per batch_events call
+OUTBOX_BATCH_SIZE = min(int(os.getenv('OUTBOX_BATCH_SIZE', 10)), 10)
+# How long the dispatcher sleeps when the outbox is empty and nobody woke it up
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 1.0))
+# Claimed events are hidden from other dispatchers (reloader, other workers) for this long
+OUTBOX_LEASE_SECONDS = float(os.getenv('OUTBOX_LEASE_SECONDS', 30))
+# Retry backoff: base * 2^(attempts - 1) with jitter, capped; after max attempts the event is kept but no longer sent
+OUTBOX_RETRY_BASE = float(os.getenv('OUTBOX_RETRY_BASE', 1.0))
+OUTBOX_RETRY_MAX = float(os.getenv('OUTBOX_RETRY_MAX', 300))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+
+
+def enqueue(channel, event, data):
+    """Add a Pusher event to the current session; it is sent once the caller commits."""
+    db_session.add(OutboxEvent(channel=channel, event=event, data=json.dumps(data)))
+
+
+def retry_delay(attempts):
+    delay = min(OUTBOX_RETRY_MAX, OUTBOX_RETRY_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class Dispatcher(object):
+    """Background thread that drains the outbox into Pusher with trigger_batch."""
+
+    def __init__(self, client):
+        self.client = client
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'sent': 0, 'requests': 0, 'failures': 0}
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='pusher-outbox')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """Called after a commit that enqueued events, so they go out without waiting for the next poll."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                sent = self.drain_once()
+            except Exception:
+                log.exception('Outbox dispatch failed')
+                db_session.rollback()
+                sent = 0
+            finally:
+                db_session.remove()
+            if not sent:
+                self._wake.wait(OUTBOX_POLL_INTERVAL)
+
+    def claim(self):
+        now = time.time()
+        token = uuid.uuid4().hex
+        ids = [row.id for row in db_session.query(OutboxEvent.id)
+                                           .filter(OutboxEvent.available_at <= now,
+                                                   OutboxEvent.attempts < OUTBOX_MAX_ATTEMPTS)
+                                           .order_by(OutboxEvent.id)
+                                           .limit(OUTBOX_BATCH_SIZE)]
+        if not ids:
+            return []
+        # Only rows still due are taken, so two dispatchers never claim the same event
+        db_session.query(OutboxEvent) \
+                  .filter(OutboxEvent.id.in_(ids), OutboxEvent.available_at <= now) \
+                  .update({OutboxEvent.available_at: now + OUTBOX_LEASE_SECONDS,
+                           OutboxEvent.claim: token}, synchronize_session=False)
+        db_session.commit()
+        return OutboxEvent.query.filter(OutboxEvent.claim == token).order_by(OutboxEvent.id).all()
+
+    def drain_once(self):
+        """Send one batch of due events; returns how many were delivered."""
+        events = self.claim()
+        if not events:
+            return 0
+        try:
+            self.send(events)
+        except PusherBadRequest:
+            # One malformed event should not hold back the rest of the batch
+            if len(events) == 1:
+                self.failed(events)
+                return 0
+            delivered = 0
+            for event in events:
+                try:
+                    self.send([event])
+                    delivered += 1
+                except Exception:
+                    log.exception('Pusher rejected outbox event %s', event.id)
+                    self.failed([event])
+            return delivered
+        except Exception:
+            log.exception('Pusher batch of %d events failed', len(events))
+            self.failed(events)
+            return 0
+        return len(events)
+
+    def send(self, events):
+        self.stats['requests'] += 1
+        self.client.trigger_batch([
+            {'channel': event.channel, 'name': event.event, 'data': event.data}
+            for event in events
+        ], already_encoded=True)
+        for event in events:
+            db_session.delete(event)
+        db_session.commit()
+        self.stats['sent'] += len(events)
+
+    def failed(self, events):
+        now = time.time()
+        for event in events:
+            event.attempts += 1
+            event.available_at = now + retry_delay(event.attempts)
+            event.claim = None
+            if event.attempts >= OUTBOX_MAX_ATTEMPTS:
+                log.error('Giving up on outbox event %s after %d attempts', event.id, event.attempts)
+        db_session.commit()
+        self.stats['failures'] += len(events)
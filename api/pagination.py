@@ -0,0 +1,43 @@
+import os
+
+from flask import request, url_for
+
+DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 200))
+
+
+def page_args():
+    """limit, after_id and before_id from the query string; raises ValueError if they are not integers."""
+    limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    after_id = request.args.get('after_id')
+    before_id = request.args.get('before_id')
+    return (max(1, min(limit, MAX_PAGE_SIZE)),
+            int(after_id) if after_id else None,
+            int(before_id) if before_id else None)
+
+
+def keyset_page(query, column, limit, after=None, before=None, newest_first=False):
+    """One page of rows in ascending column order, plus whether there are more rows beyond it.
+
+    With after, the page continues forward from that value. Otherwise it is the first page,
+    or with newest_first the last page before `before` (the newest rows when before is None).
+    """
+    if after is not None or not newest_first:
+        if after is not None:
+            query = query.filter(column > after)
+        rows = query.order_by(column).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+    if before is not None:
+        query = query.filter(column < before)
+    rows = query.order_by(column.desc()).limit(limit + 1).all()
+    return list(reversed(rows[:limit])), len(rows) > limit
+
+
+def link_header(limit, **cursors):
+    """RFC 8288 Link header for the current endpoint, e.g. link_header(50, next={'after_id': 10})."""
+    links = []
+    for rel, params in cursors.items():
+        if params:
+            url = url_for(request.endpoint, limit=limit, **dict(request.view_args or {}, **params))
+            links.append('<%s>; rel="%s"' % (url, rel))
+    return ', '.join(links)
@@ -0,0 +1,12 @@
+import os
+from functools import lru_cache
+
+from textblob import TextBlob
+
+# Chats repeat short texts ("ok", "good night") a lot, so keep recent results around
+SENTIMENT_CACHE_SIZE = int(os.getenv('SENTIMENT_CACHE_SIZE', 4096))
+
+
+@lru_cache(maxsize=SENTIMENT_CACHE_SIZE)
+def polarity(text):
+    return TextBlob(text or '').polarity
@@ -0,0 +1,252 @@
+"""Tests for the outbox dispatcher and keyset pagination.
+
+Run from this directory with: python -m unittest tests
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+DIRECTORY = tempfile.mkdtemp(prefix='api-tests-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(DIRECTORY, 'test.db'),
+    'PUSHER_APP_ID': '123', 'PUSHER_KEY': 'test', 'PUSHER_SECRET': 'test', 'PUSHER_CLUSTER': 'test',
+    'OUTBOX_DISPATCHER': 'false',
+})
+
+import app as api  # noqa: E402
+import outbox  # noqa: E402
+from database import db_session  # noqa: E402
+from fake_pusher import FakePusher  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+from models import Channel, Message, OutboxEvent, User  # noqa: E402
+from pagination import keyset_page, link_header  # noqa: E402
+from pusher import Pusher  # noqa: E402
+
+
+def tearDownModule():
+    db_session.remove()
+    shutil.rmtree(DIRECTORY, ignore_errors=True)
+
+
+class DatabaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        for model in (OutboxEvent, Message, Channel, User):
+            model.query.delete()
+        db_session.commit()
+
+    def tearDown(self):
+        db_session.remove()
+
+
+class DispatcherTests(DatabaseTestCase):
+
+    def setUp(self):
+        super(DispatcherTests, self).setUp()
+        self.fake = FakePusher(seed=1).start()
+        self.addCleanup(self.fake.stop)
+        self.dispatcher = outbox.Dispatcher(Pusher(app_id='123', key='test', secret='test',
+                                                   host=self.fake.host, port=self.fake.port, ssl=False))
+
+    def enqueue(self, count, data=None):
+        for i in range(count):
+            outbox.enqueue('private-chat_1_2', 'new_message', data or {'message': 'hello %d' % i})
+        db_session.commit()
+
+    def test_sends_at_most_ten_events_per_batch(self):
+        self.enqueue(25)
+        self.assertEqual([self.dispatcher.drain_once() for _ in range(4)], [10, 10, 5, 0])
+        self.assertEqual(self.fake.requests, 3)
+        self.assertEqual([event['data'] for event in self.fake.events],
+                         [json.dumps({'message': 'hello %d' % i}) for i in range(25)])
+        self.assertEqual(OutboxEvent.query.count(), 0)
+
+    def test_server_error_backs_off_and_counts_attempts(self):
+        self.enqueue(3)
+        self.fake.failure_rate = 1.0
+        before = time.time()
+        with self.assertLogs('outbox', 'ERROR'):
+            self.assertEqual(self.dispatcher.drain_once(), 0)
+        events = OutboxEvent.query.all()
+        self.assertEqual([event.attempts for event in events], [1, 1, 1])
+        for event in events:
+            self.assertIsNone(event.claim)
+            self.assertGreaterEqual(event.available_at, before + outbox.OUTBOX_RETRY_BASE * 0.5)
+        # Nothing is due until the backoff has passed
+        self.assertEqual(self.dispatcher.drain_once(), 0)
+        self.assertEqual(self.fake.requests, 1)
+
+        self.fake.failure_rate = 0.0
+        OutboxEvent.query.update({OutboxEvent.available_at: 0})
+        db_session.commit()
+        self.assertEqual(self.dispatcher.drain_once(), 3)
+        self.assertEqual(self.dispatcher.stats, {'sent': 3, 'requests': 2, 'failures': 3})
+
+    def test_gives_up_after_max_attempts(self):
+        self.enqueue(1)
+        OutboxEvent.query.update({OutboxEvent.attempts: outbox.OUTBOX_MAX_ATTEMPTS})
+        db_session.commit()
+        self.assertEqual(self.dispatcher.drain_once(), 0)
+        self.assertEqual(self.fake.requests, 0)
+        self.assertEqual(OutboxEvent.query.count(), 1)
+
+    def test_bad_request_is_retried_one_event_at_a_time(self):
+        self.enqueue(2)
+        self.enqueue(1, {'message': 'x' * (self.fake.max_event_size + 1)})
+        self.enqueue(1)
+        with self.assertLogs('outbox', 'ERROR') as logs:
+            self.assertEqual(self.dispatcher.drain_once(), 3)
+        self.assertEqual(len(logs.records), 1)
+        # One rejected batch, then one request per event
+        self.assertEqual((self.fake.requests, self.fake.rejected), (5, 2))
+        self.assertEqual([event['data'] for event in self.fake.events],
+                         [json.dumps({'message': 'hello 0'}), json.dumps({'message': 'hello 1'}),
+                          json.dumps({'message': 'hello 0'})])
+        rejected = OutboxEvent.query.one()
+        self.assertEqual((rejected.attempts, rejected.claim), (1, None))
+        self.assertGreater(rejected.available_at, time.time())
+
+    def test_claims_are_exclusive_until_the_lease_expires(self):
+        self.enqueue(15)
+        first, second = outbox.Dispatcher(None), outbox.Dispatcher(None)
+        first_ids = [event.id for event in first.claim()]
+        second_ids = [event.id for event in second.claim()]
+        self.assertEqual((len(first_ids), len(second_ids)), (10, 5))
+        self.assertFalse(set(first_ids) & set(second_ids))
+        self.assertEqual(outbox.Dispatcher(None).claim(), [])
+
+        # An expired lease (the dispatcher died mid-send) makes the events available again
+        OutboxEvent.query.filter(OutboxEvent.id.in_(first_ids)).update({OutboxEvent.available_at: 0},
+                                                                         synchronize_session=False)
+        db_session.commit()
+        self.assertEqual([event.id for event in second.claim()], first_ids)
+
+    def test_concurrent_claims_never_overlap(self):
+        self.enqueue(60)
+        claimed, errors = [], []
+        lock = threading.Lock()
+
+        def worker():
+            dispatcher = outbox.Dispatcher(None)
+            try:
+                while True:
+                    ids = [event.id for event in dispatcher.claim()]
+                    if not ids:
+                        break
+                    with lock:
+                        claimed.extend(ids)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                db_session.remove()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(claimed), sorted(event.id for event in OutboxEvent.query))
+
+
+class SendMessageOutboxTests(DatabaseTestCase):
+
+    def setUp(self):
+        super(SendMessageOutboxTests, self).setUp()
+        with api.app.app_context():
+            self.headers = {'Authorization': 'Bearer %s' % create_access_token(identity='alice')}
+        self.client = api.app.test_client()
+        self.payload = {'from_user': 1, 'to_user': 2, 'channel': 'private-chat_1_2', 'message': 'I love this'}
+
+    def test_message_and_event_are_committed_together(self):
+        response = self.client.post('/api/send_message', json=self.payload, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        message = Message.query.one()
+        event = OutboxEvent.query.one()
+        self.assertEqual((event.channel, event.event), ('private-chat_1_2', 'new_message'))
+        self.assertEqual(json.loads(event.data), response.get_json())
+        self.assertEqual(json.loads(event.data)['sentiment']['polarity'], message.sentiment)
+
+    def test_failed_commit_keeps_neither(self):
+        with mock.patch.object(db_session, 'commit', side_effect=RuntimeError('disk full')), \
+                self.assertLogs(api.app.logger, 'ERROR'):
+            response = self.client.post('/api/send_message', json=self.payload, headers=self.headers)
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual((Message.query.count(), OutboxEvent.query.count()), (0, 0))
+
+
+class PaginationTests(DatabaseTestCase):
+
+    def setUp(self):
+        super(PaginationTests, self).setUp()
+        db_session.add_all([User('user_%d' % i, 'x') for i in range(5)])
+        db_session.add_all([Message(message='message %d' % i, channel_id=1 if i < 7 else 2) for i in range(9)])
+        db_session.commit()
+        self.ids = [message.id for message in Message.query.filter(Message.channel_id == 1).order_by(Message.id)]
+        with api.app.app_context():
+            self.headers = {'Authorization': 'Bearer %s' % create_access_token(identity='alice')}
+        self.client = api.app.test_client()
+
+    def page(self, **kwargs):
+        messages, has_more = keyset_page(Message.query.filter(Message.channel_id == 1), Message.id, 3, **kwargs)
+        return [message.id for message in messages], has_more
+
+    def test_keyset_page_forward(self):
+        ids = self.ids
+        self.assertEqual(self.page(), (ids[:3], True))
+        self.assertEqual(self.page(after=ids[2]), (ids[3:6], True))
+        self.assertEqual(self.page(after=ids[5]), (ids[6:], False))
+        self.assertEqual(self.page(after=ids[6]), ([], False))
+
+    def test_keyset_page_newest_first(self):
+        ids = self.ids
+        self.assertEqual(self.page(newest_first=True), (ids[4:], True))
+        self.assertEqual(self.page(newest_first=True, before=ids[4]), (ids[1:4], True))
+        self.assertEqual(self.page(newest_first=True, before=ids[1]), (ids[:1], False))
+        # after wins over newest_first so clients can poll for newer messages
+        self.assertEqual(self.page(newest_first=True, after=ids[4]), (ids[5:], False))
+
+    def test_link_header(self):
+        with api.app.test_request_context('/api/get_message/1'):
+            self.assertEqual(link_header(3, prev={'before_id': 5}, next={'after_id': 7}),
+                             '</api/get_message/1?limit=3&before_id=5>; rel="prev", '
+                             '</api/get_message/1?limit=3&after_id=7>; rel="next"')
+            self.assertEqual(link_header(3, prev=False, next={'after_id': 7}),
+                             '</api/get_message/1?limit=3&after_id=7>; rel="next"')
+
+    def test_get_message_pages_back_from_newest(self):
+        ids = self.ids
+        response = self.client.get('/api/get_message/1?limit=3', headers=self.headers)
+        self.assertEqual([message['id'] for message in response.get_json()], ids[4:])
+        self.assertEqual(response.headers['Link'],
+                         '</api/get_message/1?limit=3&before_id=%d>; rel="prev", '
+                         '</api/get_message/1?limit=3&after_id=%d>; rel="next"' % (ids[4], ids[6]))
+
+        response = self.client.get('/api/get_message/1?limit=3&before_id=%d' % ids[1], headers=self.headers)
+        self.assertEqual([message['id'] for message in response.get_json()], ids[:1])
+        self.assertNotIn('rel="prev"', response.headers['Link'])
+
+    def test_users_link_only_when_more(self):
+        response = self.client.get('/api/users?limit=3', headers=self.headers)
+        users = response.get_json()
+        self.assertEqual(len(users), 3)
+        self.assertEqual(response.headers['Link'], '</api/users?limit=3&after_id=%d>; rel="next"' % users[-1]['id'])
+        response = self.client.get('/api/users?limit=3&after_id=%d' % users[-1]['id'], headers=self.headers)
+        self.assertEqual(len(response.get_json()), 2)
+        self.assertNotIn('Link', response.headers)
+
+    def test_bad_cursor_is_rejected(self):
+        for url in ('/api/get_message/1?after_id=abc', '/api/get_message/1?before_id=1.5',
+                    '/api/get_message/1?limit=ten', '/api/users?after_id=abc'):
+            response = self.client.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(response.get_json()['status'], 'error')
+
+
+if __name__ == '__main__':
+    unittest.main()
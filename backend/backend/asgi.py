@@ -3,6 +3,11 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The real-time event stream (``/api/events/``) is an async view and must be
+served through this entry point, e.g. ``uvicorn backend.asgi:application``.
+Events are fanned out by the in-process broker in ``chat.events``, so run a
+single worker process per deployment unless an external broker is added.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
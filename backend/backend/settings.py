@@ -21,7 +21,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-r(o3f4l3rxtik^g=b8nh=!sk4%ufruw18s@2d(8_&9$i%zh@n#'
+# 访问令牌用它签名，生产环境务必通过环境变量设置
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY') or 'django-insecure-r(o3f4l3rxtik^g=b8nh=!sk4%ufruw18s@2d(8_&9$i%zh@n#'
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 放在最前面，统计整个请求的耗时（Server-Timing 响应头和 /api/metrics）
+    'chat.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -77,10 +80,31 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite 生产配置：
+# - WAL 模式下读不阻塞写、写不阻塞读；synchronous=NORMAL 在 WAL 下只在检查点时 fsync
+# - 写事务以 BEGIN IMMEDIATE 开始，一开始就拿写锁，配合 busy_timeout 排队等待，
+#   避免事务中途升级写锁失败导致的 "database is locked"
+# - 持久连接，避免每个请求重新打开数据库和执行 PRAGMA
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # 毫秒
+    'cache_size': -20000,  # 负数表示KB，约20MB
+    'mmap_size': 134217728,  # 128MB
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,  # 秒，sqlite3 驱动层面的等待锁超时
+        },
     }
 }
 
@@ -139,8 +163,12 @@ CSRF_TRUSTED_ORIGINS = ['http://localhost:8084', 'http://localhost:8080', 'http:
 
 # REST Framework 配置
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [],
-    'DEFAULT_PERMISSION_CLASSES': [],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'chat.authentication.SignedTokenAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'chat.authentication.IsTokenOwner',
+    ],
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
@@ -149,6 +177,20 @@ REST_FRAMEWORK = {
     ],
 }
 
+# 访问令牌：登录时签发，有效期（秒）；AUTH_TOKEN_REQUIRED 为 True 时未带令牌的请求返回401，
+# 为 False 时兼容尚未升级的客户端（但带了令牌就只能访问令牌用户自己的数据）
+ACCESS_TOKEN_TTL_SECONDS = int(os.environ.get('ACCESS_TOKEN_TTL_SECONDS', 7 * 24 * 3600))
+AUTH_TOKEN_REQUIRED = os.environ.get('AUTH_TOKEN_REQUIRED', 'false').lower() == 'true'
+
+# 令牌身份缓存：进程内缓存的用户数和过期时间（秒）
+IDENTITY_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
+}
+
+# 用户对到聊天频道的进程内缓存条数
+CHANNEL_CACHE_SIZE = int(os.environ.get('CHANNEL_CACHE_SIZE', 10000))
+
 # 免费AI服务配置
 import os
 HUGGINGFACE_API_KEY = os.environ.get('HUGGINGFACE_API_KEY', 'hf_xxx')  # 可选：Hugging Face免费API密钥
@@ -156,6 +198,53 @@ HUGGINGFACE_API_KEY = os.environ.get('HUGGINGFACE_API_KEY', 'hf_xxx')  # 可选
 # 使用本地模板生成（完全免费，无需API密钥）
 USE_LOCAL_AI_TEMPLATES = True
 
+# 批量提醒：AI调用线程池大小、单次调用超时和整体时间预算（秒）
+AI_REMINDER_MAX_WORKERS = int(os.environ.get('AI_REMINDER_MAX_WORKERS', 4))
+AI_CALL_TIMEOUT_SECONDS = float(os.environ.get('AI_CALL_TIMEOUT_SECONDS', 5))
+AI_REMINDER_BUDGET_SECONDS = float(os.environ.get('AI_REMINDER_BUDGET_SECONDS', 8))
+
+# 定时提醒调度：提前多少分钟生成提醒、每批目标数和每批的时间预算（秒）
+REMINDER_LEAD_MINUTES = int(os.environ.get('REMINDER_LEAD_MINUTES', 15))
+REMINDER_DISPATCH_BATCH_SIZE = 50
+REMINDER_DISPATCH_BUDGET_SECONDS = 60
+
+# 情感分析：进程池大小（默认CPU核数且最多4个，0表示在请求进程内计算）、缓存条目数，
+# 以及未命中缓存的文本不超过多少条时改在请求进程内计算（默认0，单条消息也交给进程池）
+SENTIMENT_WORKERS = int(os.environ['SENTIMENT_WORKERS']) if os.environ.get('SENTIMENT_WORKERS') else None
+SENTIMENT_CACHE_SIZE = 10000
+SENTIMENT_INLINE_MAX_BATCH = int(os.environ.get('SENTIMENT_INLINE_MAX_BATCH', 0))
+
+# 提示词模板编译缓存：其他进程修改模板后最多经过该时间（秒）生效
+PROMPT_TEMPLATE_REVALIDATE_SECONDS = 60
+
+# AI消息保留策略：超过该天数的消息在压缩时每个目标每天只保留最新一条
+AI_MESSAGE_RETENTION_DAYS = 90
+
+# 后台AI任务：被领取后超过该时间（秒）仍未完成则重新排队
+AI_JOB_LOCK_TIMEOUT_SECONDS = 300
+
+# AI推理API客户端：连接池、超时（秒）、503重试和熔断
+AI_HTTP_CLIENT = {
+    'CONNECT_TIMEOUT': 3.0,
+    'READ_TIMEOUT': 15.0,
+    'POOL_SIZE': 10,
+    'MAX_RETRIES': 2,
+    'BREAKER_FAILURE_THRESHOLD': 5,
+    'BREAKER_RECOVERY_TIMEOUT': 30.0,
+}
+
+# AI回复缓存：BACKEND 为 local 时使用进程内LRU，为 django 时使用 CACHES 中的缓存（可跨进程共享）
+AI_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'BACKEND': os.environ.get('AI_RESPONSE_CACHE_BACKEND', 'local'),
+    'TTL': int(os.environ.get('AI_RESPONSE_CACHE_TTL', 3600)),
+    'MAX_SIZE': 1024,
+    'CACHE_ALIAS': 'default',
+}
+
+# /api/metrics 只允许这些地址访问（Prometheus 在本机抓取），逗号分隔
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
 print("✅ 使用免费AI服务配置完成！")
 print("   - 本地模板生成：已启用")
 print("   - Hugging Face API：可选（需要免费注册）")
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_CACHE_CONFIG = {
+    'ENABLED': True,
+    'BACKEND': 'local',  # local：进程内LRU；django：使用Django缓存框架，多个工作进程共享
+    'TTL': 3600,  # 缓存有效期（秒）
+    'MAX_SIZE': 1024,  # 进程内缓存的最大条目数
+    'CACHE_ALIAS': 'default',  # BACKEND 为 django 时使用的缓存别名
+    'KEY_PREFIX': 'ai_response:',
+}
+
+
+class ResponseCache:
+    """AI回复缓存：以提示词和生成参数的哈希为键，支持TTL过期和LRU淘汰"""
+
+    def __init__(self, ttl: float = 3600, max_size: int = 1024, backend: str = 'local',
+                 cache_alias: str = 'default', key_prefix: str = 'ai_response:', enabled: bool = True):
+        if backend not in ('local', 'django'):
+            raise ValueError(f"未知的缓存后端: {backend}")
+        self.ttl = ttl
+        self.max_size = max_size
+        self.backend = backend
+        self.cache_alias = cache_alias
+        self.key_prefix = key_prefix
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> 'ResponseCache':
+        config = dict(DEFAULT_CACHE_CONFIG, **getattr(settings, 'AI_RESPONSE_CACHE', {}))
+        return cls(
+            ttl=config['TTL'],
+            max_size=config['MAX_SIZE'],
+            backend=config['BACKEND'],
+            cache_alias=config['CACHE_ALIAS'],
+            key_prefix=config['KEY_PREFIX'],
+            enabled=config['ENABLED'],
+        )
+
+    @staticmethod
+    def make_key(prompt: str, params: Dict[str, Any]) -> str:
+        """提示词和生成参数的内容哈希"""
+        payload = json.dumps({'prompt': prompt, 'params': params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        if self.backend == 'django':
+            value = caches[self.cache_alias].get(self.key_prefix + key)
+        else:
+            value = self._local_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        if self.backend == 'django':
+            caches[self.cache_alias].set(self.key_prefix + key, value, timeout=self.ttl)
+        else:
+            self._local_set(key, value)
+
+    def _local_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _local_set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空进程内缓存和计数（django 后端的共享缓存按TTL自然过期）"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'backend': self.backend,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._entries) if self.backend == 'local' else None,
+            }
+
+
+# 进程内共享的默认缓存实例
+response_cache = ResponseCache.from_settings()
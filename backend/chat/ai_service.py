@@ -1,10 +1,13 @@
-import requests
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from django.conf import settings
 from .models import Goal, CheckIn, Message, User, PromptTemplate, AIMessage
-from datetime import datetime, timedelta
-from snownlp import SnowNLP
+from datetime import date, datetime, timedelta
+from . import metrics, streaks
+from .ai_cache import response_cache
+from .http_client import CircuitOpenError, inference_client
+from .sentiment import sentiment_service
+from .prompt_registry import prompt_registry
 
 class AIService:
     """AI服务类，处理AI大模型调用和提示词模板"""
@@ -15,38 +18,25 @@ class AIService:
         self.api_url = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-medium"
         self.fallback_api_url = "https://api-inference.huggingface.co/models/gpt2"
         
+        # 生成参数（同时作为回复缓存键的一部分）
+        self.generation_parameters = {
+            'max_length': 100,
+            'temperature': 0.7,
+            'do_sample': True
+        }
+        
+        # 相同提示词和参数的回复缓存
+        self.response_cache = response_cache
+        
+        # 共享的连接池客户端（超时、重试、熔断）
+        self.http_client = inference_client
+        
         # 备用方案：使用本地模板生成
         self.use_local_templates = True
     
     def analyze_sentiment(self, text: str) -> Dict[str, Any]:
-        """分析文本情感"""
-        try:
-            s = SnowNLP(text)
-            sentiment_score = s.sentiments  # 0-1之间，越接近1越正面
-            
-            # 将0-1的分数转换为-1到1的分数
-            normalized_score = (sentiment_score - 0.5) * 2
-            
-            # 确定情感标签
-            if sentiment_score > 0.7:
-                sentiment_label = "positive"
-            elif sentiment_score < 0.3:
-                sentiment_label = "negative"
-            else:
-                sentiment_label = "neutral"
-            
-            return {
-                'score': normalized_score,
-                'label': sentiment_label,
-                'confidence': sentiment_score
-            }
-        except Exception as e:
-            print(f"情感分析错误: {e}")
-            return {
-                'score': 0.0,
-                'label': 'neutral',
-                'confidence': 0.5
-            }
+        """分析文本情感（带缓存，在进程池中计算）"""
+        return sentiment_service.analyze(text)
     
     def get_user_context(self, user: User, goal: Goal) -> Dict[str, Any]:
         """获取用户上下文信息"""
@@ -58,15 +48,8 @@ class AIService:
             goal=goal
         ).order_by('-check_in_date')[:7]  # 最近7天
         
-        # 计算连续打卡天数
-        consecutive_days = 0
-        check_date = today
-        while True:
-            if CheckIn.objects.filter(user=user, goal=goal, check_in_date=check_date).exists():
-                consecutive_days += 1
-                check_date -= timedelta(days=1)
-            else:
-                break
+        # 计算连续打卡天数（读取增量维护的统计）
+        consecutive_days = streaks.consecutive_days(user.id, goal.id, today)
         
         # 获取最近的消息情感分析
         recent_messages = Message.objects.filter(
@@ -105,19 +88,17 @@ class AIService:
         }
     
     def fill_prompt_template(self, template: PromptTemplate, context: Dict[str, Any]) -> str:
-        """填充提示词模板"""
-        filled_prompt = template.template_content
-        
-        # 替换模板变量
-        for variable in template.variables:
-            if variable in context:
-                placeholder = f"{{{variable}}}"
-                filled_prompt = filled_prompt.replace(placeholder, str(context[variable]))
-        
-        return filled_prompt
+        """填充提示词模板（使用编译缓存）"""
+        with metrics.timed('prompt'):
+            return prompt_registry.compile(template).render(context)
     
-    def call_free_ai_api(self, prompt: str) -> str:
-        """调用免费AI API"""
+    def call_free_ai_api(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """调用免费AI API，timeout 为单次请求的超时时间（秒）"""
+        cache_key = self.response_cache.make_key(prompt, {'model': self.api_url, **self.generation_parameters})
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             headers = {
                 'Authorization': f'Bearer {self.api_key}',
@@ -126,26 +107,34 @@ class AIService:
             
             data = {
                 'inputs': prompt,
-                'parameters': {
-                    'max_length': 100,
-                    'temperature': 0.7,
-                    'do_sample': True
-                }
+                'parameters': self.generation_parameters
             }
             
-            response = requests.post(self.api_url, headers=headers, json=data)
+            with metrics.timed('ai'):
+                response = self.http_client.post_json(self.api_url, data, headers=headers, deadline=timeout)
             
             if response.status_code == 200:
                 result = response.json()
                 if isinstance(result, list) and len(result) > 0:
-                    return result[0].get('generated_text', '').strip()
-                return result.get('generated_text', '').strip()
+                    generated = result[0].get('generated_text', '').strip()
+                else:
+                    generated = result.get('generated_text', '').strip()
+                # 只缓存模型生成的结果，本地兜底回复不缓存
+                if generated:
+                    self.response_cache.set(cache_key, generated)
+                return generated
             else:
                 print(f"免费AI API调用失败: {response.status_code} - {response.text}")
+                metrics.record_fallback(f'http_{response.status_code}')
                 return self.generate_local_response(prompt)
-                
+        
+        except CircuitOpenError:
+            # 上游不可用期间直接使用本地生成，不再等待失败的请求
+            metrics.record_fallback('circuit_open')
+            return self.generate_local_response(prompt)
         except Exception as e:
             print(f"免费AI API调用异常: {e}")
+            metrics.record_fallback(type(e).__name__)
             return self.generate_local_response(prompt)
     
     def generate_local_response(self, prompt: str) -> str:
@@ -181,26 +170,43 @@ class AIService:
         import random
         return random.choice(default_responses)
     
-    def generate_reminder_message(self, user: User, goal: Goal) -> str:
-        """生成提醒消息（用产品Prompt+业务数据+免费大模型）"""
-        try:
-            # 统计历史打卡
-            today = datetime.now().date()
-            recent_checkins = CheckIn.objects.filter(user=user, goal=goal).order_by('-check_in_date')[:3]
-            if not recent_checkins:
-                history_str = "最近3天均未打卡"
-            else:
-                days = [c.check_in_date.strftime('%Y-%m-%d') for c in recent_checkins]
-                history_str = f"最近3天已打卡：{'、'.join(days)}"
-            prompt = f'''
+    def build_reminder_prompt(self, user: User, goal: Goal, recent_dates: List[date]) -> Tuple[str, Dict[str, Any]]:
+        """构建提醒提示词，recent_dates 为最近的打卡日期（降序，最多3个）"""
+        if not recent_dates:
+            history_str = "最近3天均未打卡"
+        else:
+            days = [d.strftime('%Y-%m-%d') for d in recent_dates]
+            history_str = f"最近3天已打卡：{'、'.join(days)}"
+        prompt = f'''
 作为健身教练，请用温暖风格提醒用户：
 {user.username}设置了目标{goal.title}，
 最近打卡记录：{history_str}.
 请生成30字内的鼓励语。
 '''
+        context_data = {
+            'username': user.username,
+            'goal_title': goal.title,
+            'history_str': history_str
+        }
+        return prompt, context_data
+    
+    def fallback_reminder(self, user: User, goal: Goal) -> str:
+        """AI生成失败时的兜底提醒语"""
+        return f"嗨 {user.username}，记得今天要{goal.title}哦！加油！"
+    
+    def generate_reminder_message(self, user: User, goal: Goal) -> str:
+        """生成提醒消息（用产品Prompt+业务数据+免费大模型）"""
+        try:
+            # 统计历史打卡
+            recent_dates = list(CheckIn.objects.filter(user=user, goal=goal).order_by(
+                '-check_in_date'
+            ).values_list('check_in_date', flat=True)[:3])
+            with metrics.timed('prompt'):
+                prompt, context_data = self.build_reminder_prompt(user, goal, recent_dates)
             # 优先用Hugging Face免费API
             ai_response = self.call_free_ai_api(prompt)
             if not ai_response or len(ai_response) < 5:
+                metrics.record_fallback('empty_response')
                 ai_response = self.generate_local_response(prompt)
             # 保存AI消息记录
             AIMessage.objects.create(
@@ -209,16 +215,13 @@ class AIService:
                 prompt_template=None,
                 filled_prompt=prompt,
                 ai_response=ai_response,
-                context_data={
-                    'username': user.username,
-                    'goal_title': goal.title,
-                    'history_str': history_str
-                }
+                context_data=context_data
             )
             return ai_response
         except Exception as e:
             print(f"生成提醒消息失败: {e}")
-            return f"嗨 {user.username}，记得今天要{goal.title}哦！加油！"
+            metrics.record_fallback('error')
+            return self.fallback_reminder(user, goal)
     
     def generate_motivational_message(self, user: User, goal: Goal, checkin: CheckIn) -> str:
         """生成激励消息（打卡后）"""
@@ -227,12 +230,9 @@ class AIService:
             context['mood_score'] = checkin.mood_score
             context['checkin_notes'] = checkin.notes
             
-            template = PromptTemplate.objects.filter(
-                name='motivational_message',
-                is_active=True
-            ).first()
+            compiled = prompt_registry.get('motivational_message')
             
-            if not template:
+            if not compiled:
                 template = PromptTemplate.objects.create(
                     name='motivational_message',
                     description='打卡后激励消息模板',
@@ -245,10 +245,13 @@ class AIService:
 请生成一段30字内的激励话语，肯定用户的努力并鼓励继续坚持。""",
                     variables=['username', 'goal_title', 'consecutive_days', 'mood_score', 'checkin_notes']
                 )
+                compiled = prompt_registry.compile(template)
             
-            filled_prompt = self.fill_prompt_template(template, context)
+            with metrics.timed('prompt'):
+                filled_prompt = compiled.render(context)
             
             if self.use_local_templates:
+                metrics.record_fallback('local_templates')
                 ai_response = self.generate_local_response(filled_prompt)
             else:
                 ai_response = self.call_free_ai_api(filled_prompt)
@@ -256,7 +259,7 @@ class AIService:
             AIMessage.objects.create(
                 user=user,
                 goal=goal,
-                prompt_template=template,
+                prompt_template_id=compiled.template_id,
                 filled_prompt=filled_prompt,
                 ai_response=ai_response,
                 context_data=context
@@ -266,4 +269,5 @@ class AIService:
             
         except Exception as e:
             print(f"生成激励消息失败: {e}")
+            metrics.record_fallback('error')
             return f"太棒了 {user.username}！你又完成了一次{goal.title}，继续保持！" 
\ No newline at end of file
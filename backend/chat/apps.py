@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
+
+    def ready(self):
+        # 注册打卡统计等信号处理
+        from . import signals  # noqa: F401
+        # 为数据库连接挂上请求级SQL计时
+        from . import metrics  # noqa: F401
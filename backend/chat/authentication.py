@@ -0,0 +1,156 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+from django.core import signing
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import BasePermission
+
+from .models import User
+
+TOKEN_SALT = 'chat.access-token'
+
+# 请求中声明用户身份的参数，带令牌时必须与令牌中的用户一致
+IDENTITY_FIELDS = ('user_id', 'from_user')
+
+
+def token_ttl() -> int:
+    return getattr(settings, 'ACCESS_TOKEN_TTL_SECONDS', 7 * 24 * 3600)
+
+
+def issue_token(user: User) -> str:
+    """签发带时间戳的访问令牌（HMAC签名，不落库）"""
+    return signing.dumps({'uid': user.id}, salt=TOKEN_SALT, compress=False)
+
+
+def verify_token(token: str) -> int:
+    """校验签名和有效期，返回用户ID；无效时抛出 signing.BadSignature / SignatureExpired"""
+    payload = signing.loads(token, salt=TOKEN_SALT, max_age=token_ttl())
+    try:
+        return int(payload['uid'])
+    except (KeyError, TypeError, ValueError):
+        raise signing.BadSignature('令牌内容无效')
+
+
+class IdentityCache:
+    """用户ID到User对象的进程内缓存（LRU + 过期时间）
+
+    令牌校验本身不查库，这里再省掉每个请求重复的 User 查询。本进程内用户被修改或删除时
+    由信号清除；其他进程的修改最多在 ttl 秒后生效。
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls) -> 'IdentityCache':
+        options = getattr(settings, 'IDENTITY_CACHE', {})
+        return cls(max_size=options.get('MAX_SIZE', 10000), ttl=options.get('TTL', 60))
+
+    def get(self, user_id: int) -> Optional[User]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                # 返回副本，避免请求之间共享同一个模型实例
+                return copy.copy(entry[0])
+            self.misses += 1
+        user = User.objects.filter(id=user_id).first()
+        if user is not None:
+            with self._lock:
+                self._entries[user_id] = (user, now + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+            user = copy.copy(user)
+        return user
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+# 进程内共享的身份缓存
+identity_cache = IdentityCache.from_settings()
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authorization: Bearer <令牌>，只校验签名和有效期，用户从身份缓存中取"""
+
+    keyword = 'bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('令牌格式错误')
+        try:
+            token = auth[1].decode()
+            user_id = verify_token(token)
+        except signing.SignatureExpired:
+            raise AuthenticationFailed('令牌已过期，请重新登录')
+        except (signing.BadSignature, UnicodeError):
+            raise AuthenticationFailed('令牌无效')
+        user = identity_cache.get(user_id)
+        if user is None:
+            raise AuthenticationFailed('用户不存在')
+        return user, token
+
+    def authenticate_header(self, request):
+        return 'Bearer'
+
+
+def claimed_user_ids(request) -> list:
+    """请求参数和请求体中声明的用户ID"""
+    values = [request.query_params.get(field) for field in IDENTITY_FIELDS]
+    # 只在有对应解析器时读取请求体，流式读取请求体的接口（如导入）不受影响
+    if request.stream is not None and request.negotiator.select_parser(request, request.parsers) is not None:
+        data = request.data
+        if hasattr(data, 'get'):
+            values += [data.get(field) for field in IDENTITY_FIELDS]
+    return [value for value in values if value not in (None, '')]
+
+
+class IsTokenOwner(BasePermission):
+    """带令牌的请求只能以令牌中的用户身份读写；AUTH_TOKEN_REQUIRED 为 True 时必须带令牌"""
+
+    message = '无权访问其他用户的数据'
+
+    def has_permission(self, request, view):
+        user = request.user
+        if not getattr(user, 'is_authenticated', False):
+            return not getattr(settings, 'AUTH_TOKEN_REQUIRED', False)
+        return all(str(value) == str(user.id) for value in claimed_user_ids(request))
+
+
+def request_user(request, user_id) -> User:
+    """已认证的请求直接使用令牌对应的用户，否则按ID查询（不存在时抛出 User.DoesNotExist）"""
+    if isinstance(request.user, User):
+        return request.user
+    return User.objects.get(id=user_id)
+
+
+def request_user_id(request, user_id=None):
+    """请求未显式传 user_id 时使用令牌中的用户"""
+    if user_id in (None, '') and isinstance(request.user, User):
+        return request.user.id
+    return user_id
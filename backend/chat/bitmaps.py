@@ -0,0 +1,165 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from django.db import transaction
+
+from .models import CheckIn, CheckInBitmap
+
+BITMAP_BYTES = 46  # 366位
+
+
+def day_index(day: date) -> int:
+    """日期在当年的位序号（从0开始）"""
+    return day.timetuple().tm_yday - 1
+
+
+def _year_end(year: int) -> date:
+    return date(year, 12, 31)
+
+
+def bits_from_dates(dates: Iterable[date]) -> Dict[int, int]:
+    """把日期集合编码为 {年份: 位图整数}"""
+    years = defaultdict(int)
+    for day in dates:
+        years[day.year] |= 1 << day_index(day)
+    return dict(years)
+
+
+def encode_bits(value: int) -> bytes:
+    return value.to_bytes(BITMAP_BYTES, 'little')
+
+
+def decode_bits(raw) -> int:
+    return int.from_bytes(bytes(raw), 'little')
+
+
+class CheckInCalendar:
+    """内存中的打卡日历，日期查询和连续天数统计都是位运算"""
+
+    def __init__(self, years: Optional[Dict[int, int]] = None):
+        self.years = years or {}
+
+    def is_checked(self, day: date) -> bool:
+        return bool(self.years.get(day.year, 0) >> day_index(day) & 1)
+
+    def days(self, start: date, end: date) -> List[dict]:
+        """返回区间内每天的打卡情况（含首尾）"""
+        result = []
+        day = start
+        while day <= end:
+            bits = self.years.get(day.year, 0)
+            result.append({'date': day.strftime('%Y-%m-%d'), 'checked': bool(bits >> day_index(day) & 1)})
+            day += timedelta(days=1)
+        return result
+
+    def count(self, start: date, end: date) -> int:
+        """区间内打卡天数"""
+        total = 0
+        for year in range(start.year, end.year + 1):
+            bits = self.years.get(year, 0)
+            if not bits:
+                continue
+            low = day_index(start) if year == start.year else 0
+            high = day_index(end) if year == end.year else day_index(_year_end(year))
+            mask = ((1 << (high + 1)) - 1) ^ ((1 << low) - 1)
+            total += bin(bits & mask).count('1')
+        return total
+
+    def consecutive_days(self, today: date) -> int:
+        """截至 today 的连续打卡天数"""
+        consecutive = 0
+        year, position = today.year, day_index(today)
+        while True:
+            bits = self.years.get(year, 0)
+            window = (1 << (position + 1)) - 1
+            gaps = ~bits & window
+            if gaps:
+                # 最高位的0之上全部为1
+                return consecutive + position - (gaps.bit_length() - 1)
+            consecutive += position + 1
+            year -= 1
+            if year not in self.years:
+                return consecutive
+            position = day_index(_year_end(year))
+
+
+def load_calendar(user_id, goal_id=None, start_year: Optional[int] = None, end_year: Optional[int] = None) -> CheckInCalendar:
+    """一次查询加载位图；不指定目标时合并用户所有目标（任一目标打卡即算当天已打卡）"""
+    rows = CheckInBitmap.objects.filter(user_id=user_id)
+    if goal_id:
+        rows = rows.filter(goal_id=goal_id)
+    if start_year is not None:
+        rows = rows.filter(year__gte=start_year)
+    if end_year is not None:
+        rows = rows.filter(year__lte=end_year)
+    years = defaultdict(int)
+    for year, raw in rows.values_list('year', 'bits'):
+        years[year] |= decode_bits(raw)
+    return CheckInCalendar(dict(years))
+
+
+def set_day(user_id, goal_id, day: date, checked: bool = True):
+    """打卡写入或删除时更新对应的位"""
+    with transaction.atomic():
+        bitmap = CheckInBitmap.objects.select_for_update().filter(
+            user_id=user_id, goal_id=goal_id, year=day.year
+        ).first()
+        bits = decode_bits(bitmap.bits) if bitmap else 0
+        if checked:
+            bits |= 1 << day_index(day)
+        else:
+            bits &= ~(1 << day_index(day))
+        if bitmap is None:
+            if bits:
+                CheckInBitmap.objects.create(user_id=user_id, goal_id=goal_id, year=day.year, bits=encode_bits(bits))
+        elif bits:
+            bitmap.bits = encode_bits(bits)
+            bitmap.save(update_fields=['bits'])
+        else:
+            bitmap.delete()
+
+
+def rebuild_goal_bitmaps(user_id, goal_id):
+    """根据打卡记录重建单个目标的位图"""
+    dates = CheckIn.objects.filter(user_id=user_id, goal_id=goal_id).values_list('check_in_date', flat=True)
+    years = bits_from_dates(dates)
+    with transaction.atomic():
+        CheckInBitmap.objects.filter(user_id=user_id, goal_id=goal_id).delete()
+        CheckInBitmap.objects.bulk_create([
+            CheckInBitmap(user_id=user_id, goal_id=goal_id, year=year, bits=encode_bits(bits))
+            for year, bits in years.items()
+        ])
+
+
+def rebuild_all_bitmaps(batch_size: int = 1000) -> int:
+    """从 CheckIn 表批量重建全部位图，返回写入的记录数"""
+    rows = CheckIn.objects.order_by('user_id', 'goal_id').values_list('user_id', 'goal_id', 'check_in_date')
+    created = 0
+    pending = []
+
+    def collect(key, years):
+        for year, bits in years.items():
+            pending.append(CheckInBitmap(user_id=key[0], goal_id=key[1], year=year, bits=encode_bits(bits)))
+
+    def flush():
+        nonlocal created
+        CheckInBitmap.objects.bulk_create(pending, batch_size=batch_size)
+        created += len(pending)
+        pending.clear()
+
+    with transaction.atomic():
+        CheckInBitmap.objects.all().delete()
+        key, years = None, defaultdict(int)
+        for user_id, goal_id, check_in_date in rows.iterator(chunk_size=batch_size):
+            if (user_id, goal_id) != key:
+                if key is not None:
+                    collect(key, years)
+                key, years = (user_id, goal_id), defaultdict(int)
+            years[check_in_date.year] |= 1 << day_index(check_in_date)
+            if len(pending) >= batch_size:
+                flush()
+        if key is not None:
+            collect(key, years)
+        flush()
+    return created
@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .db import write_transaction
+from .models import Channel, User, channel_pair_key
+
+
+class ChannelCache:
+    """用户对到 (频道ID, 频道名) 的进程内LRU缓存
+
+    频道创建后不会再变，只需在删除时由信号清除；其他进程删除频道的情况很少，不设过期时间。
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, Tuple[int, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[int, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, channel_id: int, name: str):
+        with self._lock:
+            self._entries[key] = (channel_id, name)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+# 进程内共享的频道缓存
+channel_cache = ChannelCache(max_size=getattr(settings, 'CHANNEL_CACHE_SIZE', 10000))
+
+
+def get_or_create_channel(user_a_id: int, user_b_id: int) -> Tuple[int, str, bool]:
+    """返回两个用户之间唯一的频道 (ID, 名称, 是否本次新建)，不存在时创建（顺序无关）
+
+    命中缓存时不查库；并发创建同一对用户的频道时，唯一索引让后到的插入失败，再读取先到的那个。
+    用户不存在时抛出 User.DoesNotExist。
+    """
+    key = channel_pair_key(user_a_id, user_b_id)
+    cached = channel_cache.get(key)
+    if cached is not None:
+        return cached + (False,)
+
+    channel = Channel.objects.filter(pair_key=key).values_list('id', 'name').first()
+    if channel is None:
+        low, high = sorted((int(user_a_id), int(user_b_id)))
+        usernames = dict(User.objects.filter(id__in=(low, high)).values_list('id', 'username'))
+        if low not in usernames or high not in usernames:
+            raise User.DoesNotExist
+        try:
+            with write_transaction():
+                created = Channel.objects.create(name=f"{usernames[low]}-{usernames[high]}",
+                                                 from_user_id=low, to_user_id=high)
+            channel = (created.id, created.name)
+        except IntegrityError:
+            # 并发请求抢先创建了频道
+            channel = Channel.objects.filter(pair_key=key).values_list('id', 'name').get()
+            channel_cache.put(key, *channel)
+            return channel + (False,)
+        # 外层事务回滚时新建的频道也会消失，提交后再放入缓存
+        transaction.on_commit(lambda: channel_cache.put(key, *channel))
+        return channel + (True,)
+
+    channel_cache.put(key, *channel)
+    return channel + (False,)
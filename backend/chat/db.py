@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from django.db import connections, transaction
+
+# 进程内的写锁：SQLite 同一时刻只允许一个写事务，
+# 让本进程的写入先在这里排队，而不是各自在数据库层面忙等重试
+_write_lock = threading.RLock()
+
+
+@contextmanager
+def write_transaction(using: Optional[str] = None):
+    """串行化的写事务
+
+    同一进程内的写入按顺序获取进程锁，再以 IMMEDIATE 事务写库；跨进程的写入由
+    busy_timeout 排队。WAL 模式下读请求不经过这里，不会被写入阻塞。
+    可以嵌套使用，也可以作为装饰器。
+    """
+    alias = using or 'default'
+    if connections[alias].vendor != 'sqlite':
+        with transaction.atomic(using=alias):
+            yield
+        return
+    with _write_lock:
+        with transaction.atomic(using=alias):
+            yield
+
+
+def sqlite_pragmas(using: Optional[str] = None) -> dict:
+    """读取当前连接实际生效的 PRAGMA，用于检查生产配置"""
+    connection = connections[using or 'default']
+    if connection.vendor != 'sqlite':
+        return {}
+    result = {}
+    with connection.cursor() as cursor:
+        for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store'):
+            cursor.execute(f'PRAGMA {name}')
+            result[name] = cursor.fetchone()[0]
+    return result
+
+
+@contextmanager
+def scratch_database(default_profile: bool = False, using: str = 'default'):
+    """在临时的SQLite文件数据库上运行（压测、基准测试用），结束后删除并恢复原配置
+
+    default_profile 为 True 时去掉生产配置，使用Django默认的SQLite连接参数作为对照。
+    """
+    connection = connections[using]
+    directory = tempfile.mkdtemp(prefix='chat-scratch-')
+    settings_dict = connection.settings_dict
+    original = {key: settings_dict.get(key) for key in ('OPTIONS', 'CONN_MAX_AGE', 'TEST')}
+    settings_dict['TEST'] = dict(settings_dict.get('TEST') or {}, NAME=os.path.join(directory, 'scratch.sqlite3'))
+    if default_profile:
+        settings_dict['OPTIONS'] = {}
+        settings_dict['CONN_MAX_AGE'] = 0
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        settings_dict.update(original)
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,134 @@
+from typing import Iterable, List, Optional, Set, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import User, UserTrigram, normalize_username
+from .pagination import decode_cursor, encode_cursor, keyset_filter
+
+# 子串搜索至少需要的字符数，更短的查询只做前缀匹配
+MIN_SUBSTRING_LENGTH = 3
+# 估算三字母组选择度时每个最多计数的索引条目
+TRIGRAM_COUNT_CAP = 1000
+# 除扫描起点外，再用索引探测过滤的三字母组个数（其余由最后的子串核对保证）
+TRIGRAM_PROBES = 2
+# 比任何字符都大，用于把前缀查询改写为索引上的范围查询
+_MAX_CHAR = '\U0010ffff'
+
+
+def trigrams(key: str) -> Set[str]:
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def index_users(users: Iterable[User], batch_size: int = 5000) -> int:
+    """重建这些用户的三字母组索引，返回写入的条目数"""
+    users = list(users)
+    rows = [UserTrigram(user_id=user.id, trigram=trigram)
+            for user in users for trigram in trigrams(normalize_username(user.username))]
+    with transaction.atomic():
+        UserTrigram.objects.filter(user_id__in=[user.id for user in users]).delete()
+        UserTrigram.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild_index(batch_size: int = 5000) -> int:
+    """为全部用户重建归一化用户名和三字母组索引，返回处理的用户数"""
+    count = 0
+    last_id = 0
+    while True:
+        users = list(User.objects.filter(id__gt=last_id).order_by('id').only('id', 'username', 'username_key')[:batch_size])
+        if not users:
+            break
+        stale = []
+        for user in users:
+            key = normalize_username(user.username)
+            if user.username_key != key:
+                user.username_key = key
+                stale.append(user)
+        with transaction.atomic():
+            User.objects.bulk_update(stale, ['username_key'], batch_size=batch_size)
+            index_users(users, batch_size=batch_size)
+        count += len(users)
+        last_id = users[-1].id
+    return count
+
+
+def _prefix_range(key: str) -> Q:
+    # 只用 B 树索引的范围扫描，不依赖数据库对 LIKE 的优化
+    return Q(username_key__gte=key, username_key__lt=key + _MAX_CHAR)
+
+
+def prefix_matches(key: str, exclude_id: Optional[int], limit: int, after: Optional[list]) -> List[tuple]:
+    """用户名以 key 开头的用户，按 (username_key, id) 排序"""
+    queryset = User.objects.filter(_prefix_range(key))
+    if exclude_id is not None:
+        queryset = queryset.exclude(id=exclude_id)
+    if after is not None:
+        queryset = queryset.filter(keyset_filter(queryset, ('username_key', 'id'), after))
+    return list(queryset.order_by('username_key', 'id').values_list('id', 'username', 'username_key')[:limit])
+
+
+def trigrams_by_selectivity(grams: Set[str]) -> List[str]:
+    """用一条SQL对每个三字母组做有上限的计数，按倒排长度从短到长排序"""
+    grams = sorted(grams)
+    if len(grams) == 1:
+        return grams
+    table = connection.ops.quote_name(UserTrigram._meta.db_table)
+    part = f'SELECT %s, (SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE trigram = %s LIMIT %s))'
+    params = []
+    for gram in grams:
+        params += [gram, gram, TRIGRAM_COUNT_CAP]
+    with connection.cursor() as cursor:
+        cursor.execute(' UNION ALL '.join([part] * len(grams)), params)
+        counts = dict(cursor.fetchall())
+    return sorted(grams, key=lambda gram: counts[gram])
+
+
+def substring_matches(key: str, exclude_id: Optional[int], limit: int, after_id: Optional[int]) -> List[tuple]:
+    """用户名包含 key 但不以它开头的用户，按 id 排序
+
+    沿最稀有的三字母组的倒排顺序扫描，再用次稀有的几个三字母组做索引探测，最后核对完整子串。
+    """
+    driver, *others = trigrams_by_selectivity(trigrams(key))
+    queryset = UserTrigram.objects.filter(trigram=driver)
+    for gram in others[:TRIGRAM_PROBES]:
+        queryset = queryset.filter(Exists(UserTrigram.objects.filter(trigram=gram, user_id=OuterRef('user_id'))))
+    queryset = queryset.filter(user__username_key__contains=key).exclude(user__username_key__startswith=key)
+    if exclude_id is not None:
+        queryset = queryset.exclude(user_id=exclude_id)
+    if after_id is not None:
+        queryset = queryset.filter(user_id__gt=after_id)
+    return list(queryset.order_by('user_id').values_list('user_id', 'user__username')[:limit])
+
+
+def search(query: str, exclude_id: Optional[int] = None, limit: int = 20,
+           cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """用户目录搜索：先返回前缀匹配（按用户名排序），再返回子串匹配（按注册顺序）
+
+    查询为空时按用户名列出全部用户。返回 (结果, 下一页游标)，游标无效时抛出 ValueError。
+    """
+    key = normalize_username(query.strip())
+    phase, after = 'prefix', None
+    if cursor:
+        values = decode_cursor(cursor)
+        if not values or (values[0], len(values)) not in (('prefix', 3), ('substring', 2)):
+            raise ValueError(cursor)
+        phase, after = values[0], values[1:]
+
+    results, next_cursor = [], None
+    if phase == 'prefix':
+        rows = prefix_matches(key, exclude_id, limit + 1, after)
+        results = [{'id': user_id, 'username': username} for user_id, username, _ in rows[:limit]]
+        if len(rows) > limit:
+            _, _, last_key = rows[limit - 1]
+            return results, encode_cursor(['prefix', last_key, rows[limit - 1][0]])
+        after = None
+
+    if len(key) >= MIN_SUBSTRING_LENGTH:
+        remaining = limit - len(results)
+        rows = substring_matches(key, exclude_id, remaining + 1, int(after[0]) if after else None)
+        results += [{'id': user_id, 'username': username} for user_id, username in rows[:remaining]]
+        if len(rows) > remaining:
+            # 本页在前缀阶段已满时 remaining 为0，下一页从子串阶段开头开始
+            next_cursor = encode_cursor(['substring', rows[remaining - 1][0] if remaining else 0])
+    return results, next_cursor
@@ -0,0 +1,105 @@
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional
+
+
+def channel_topic(channel_id) -> str:
+    """聊天频道的订阅主题"""
+    return f"channel:{channel_id}"
+
+
+def user_topic(user_id) -> str:
+    """用户个人通知的订阅主题（新会话、打卡等）"""
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """单个订阅者，事件投递到其所在事件循环的队列中"""
+
+    def __init__(self, topics: Iterable[str], loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _deliver(self, event: Dict[str, Any]):
+        # 在订阅者的事件循环中执行；慢消费者直接丢弃，客户端可通过游标补齐
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def get(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class EventBroker:
+    """进程内发布/订阅中心
+
+    publish 可以在任意线程中调用（例如同步视图所在的线程），
+    事件通过 call_soon_threadsafe 投递给各订阅者的事件循环。
+    注意：只能触达同一进程内的订阅者，多进程部署时需要外部消息中间件。
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+        self._ids = itertools.count(1)
+
+    def subscribe(self, topics: Iterable[str]) -> Subscription:
+        """在当前事件循环中创建订阅"""
+        subscription = Subscription(topics, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscribers.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def subscriber_count(self, topic: Optional[str] = None) -> int:
+        with self._lock:
+            if topic is not None:
+                return len(self._subscribers.get(topic, ()))
+            return len({s for subs in self._subscribers.values() for s in subs})
+
+    def publish(self, topic: str, event_type: str, data: Any) -> int:
+        """发布事件，返回投递的订阅者数量；发布失败不影响调用方"""
+        event = {
+            'id': next(self._ids),
+            'topic': topic,
+            'type': event_type,
+            'data': data,
+        }
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        delivered = 0
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+                delivered += 1
+            except RuntimeError:
+                # 事件循环已关闭，订阅者会在断开时自行注销
+                continue
+        return delivered
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """按 Server-Sent Events 格式编码事件"""
+    payload = json.dumps(event['data'], ensure_ascii=False, default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+# 全局事件中心
+broker = EventBroker()
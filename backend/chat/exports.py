@@ -0,0 +1,140 @@
+import csv
+import io
+import json
+from itertools import islice
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+
+from .models import AIMessage, CheckIn, Message
+
+# 导出时每次从数据库读取的行数
+EXPORT_CHUNK_SIZE = 2000
+# 每次向客户端写出的行数
+EXPORT_WRITE_LINES = 200
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+CHECKIN_EXPORT_FIELDS = ['id', 'goal_id', 'goal_title', 'check_in_date', 'check_in_time', 'notes', 'mood_score']
+MESSAGE_EXPORT_FIELDS = ['id', 'channel_id', 'from_user_id', 'to_user_id', 'message', 'created_at',
+                         'sentiment_score', 'sentiment_label']
+AI_MESSAGE_EXPORT_FIELDS = ['id', 'goal_id', 'prompt_template_id', 'filled_prompt', 'ai_response',
+                            'context_data', 'created_at']
+
+
+def ndjson_lines(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """逐行输出NDJSON，每行一个JSON对象"""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, default=str) + '\n'
+
+
+def csv_lines(rows: Iterable[Dict[str, Any]], fields: List[str]) -> Iterator[str]:
+    """逐行输出CSV（含表头），只保留一行的缓冲"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        # JSON字段在CSV中保存为JSON字符串
+        writer.writerow({key: json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+                         for key, value in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # 没有数据行时仍输出表头
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def encode_lines(rows: Iterable[Dict[str, Any]], fmt: str, fields: List[str]) -> Iterator[str]:
+    if fmt == 'csv':
+        return csv_lines(rows, fields)
+    return ndjson_lines(rows)
+
+
+def batched_lines(lines: Iterable[str], size: int = EXPORT_WRITE_LINES) -> Iterator[str]:
+    """把多行合并后写出，减少小块写入的开销"""
+    iterator = iter(lines)
+    while True:
+        chunk = ''.join(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def async_batched_lines(lines: Iterable[str], size: int = EXPORT_WRITE_LINES) -> AsyncIterator[str]:
+    """ASGI下逐块在同一个线程中读取数据库，避免Django先把同步迭代器整体读入内存"""
+    iterator = batched_lines(lines, size)
+    next_chunk = sync_to_async(lambda: next(iterator, None), thread_sensitive=True)
+    while True:
+        chunk = await next_chunk()
+        if chunk is None:
+            return
+        yield chunk
+
+
+def streaming_response(request, rows: Iterable[Dict[str, Any]], fmt: str, fields: List[str],
+                       filename: str) -> StreamingHttpResponse:
+    """以附件形式流式返回导出结果，内存占用与数据总量无关"""
+    lines = encode_lines(rows, fmt, fields)
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        content = async_batched_lines(lines)
+    else:
+        content = batched_lines(lines)
+    response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    # 禁止反向代理缓冲，让首字节尽快到达客户端
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def iter_rows(queryset, fields: List[str], columns: Optional[List[str]] = None,
+              chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """分块读取查询结果并转换为字典，不会一次性加载全部数据"""
+    rows = queryset.values_list(*(columns or fields)).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield dict(zip(fields, row))
+
+
+def checkin_rows(user_id, goal_id=None, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """按日期顺序导出用户的打卡记录"""
+    queryset = CheckIn.objects.filter(user_id=user_id)
+    if goal_id is not None:
+        queryset = queryset.filter(goal_id=goal_id)
+    columns = ['id', 'goal_id', 'goal__title', 'check_in_date', 'check_in_time', 'notes', 'mood_score']
+    return iter_rows(queryset.order_by('check_in_date', 'id'), CHECKIN_EXPORT_FIELDS, columns, chunk_size)
+
+
+def message_rows(channel_id=None, user_id=None, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """按时间顺序导出某个频道或某个用户收发的全部聊天消息"""
+    queryset = Message.objects.all()
+    if channel_id is not None:
+        queryset = queryset.filter(channel_id=channel_id)
+    if user_id is not None:
+        queryset = queryset.filter(Q(from_user_id=user_id) | Q(to_user_id=user_id))
+    return iter_rows(queryset.order_by('created_at', 'id'), MESSAGE_EXPORT_FIELDS, chunk_size=chunk_size)
+
+
+def ai_message_rows(user_id, goal_id=None, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """按时间顺序导出用户的AI消息日志（包含完整提示词和上下文）"""
+    queryset = AIMessage.objects.filter(user_id=user_id)
+    if goal_id is not None:
+        queryset = queryset.filter(goal_id=goal_id)
+    columns = ['id', 'goal_id', 'prompt_template_id', 'prompt_blob__content', 'ai_response',
+               'context_blob__content', 'created_at']
+    for row in iter_rows(queryset.order_by('created_at', 'id'), AI_MESSAGE_EXPORT_FIELDS, columns, chunk_size):
+        row['filled_prompt'] = row['filled_prompt'] or ''
+        row['context_data'] = json.loads(row['context_data']) if row['context_data'] else {}
+        yield row
+
+
+def parse_format(value: Optional[str], default: str = 'ndjson') -> str:
+    fmt = (value or default).lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(value)
+    return fmt
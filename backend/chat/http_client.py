@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HTTP_CONFIG = {
+    'CONNECT_TIMEOUT': 3.0,  # 建立连接超时（秒）
+    'READ_TIMEOUT': 15.0,  # 读取响应超时（秒）
+    'POOL_SIZE': 10,  # 连接池大小（保持长连接）
+    'MAX_RETRIES': 2,  # 503（模型加载中）时的最大重试次数
+    'BACKOFF_BASE': 0.5,  # 重试退避基数（秒），实际等待时间带随机抖动
+    'BACKOFF_MAX': 4.0,  # 单次退避的最长等待时间（秒）
+    'BREAKER_FAILURE_THRESHOLD': 5,  # 连续失败多少次后熔断
+    'BREAKER_RECOVERY_TIMEOUT': 30.0,  # 熔断后多久允许试探请求（秒）
+}
+
+# 这些状态码说明上游当前不可用（或密钥无效），计入熔断失败次数
+UNHEALTHY_STATUS_CODES = {401, 403, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """熔断器：连续失败达到阈值后打开，冷却后放行一个试探请求"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class InferenceClient:
+    """带连接池、超时、重试和熔断的推理API客户端（线程安全，全局共享）"""
+
+    def __init__(self, connect_timeout: float = 3.0, read_timeout: float = 15.0, pool_size: int = 10,
+                 max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 4.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def from_settings(cls) -> 'InferenceClient':
+        config = dict(DEFAULT_HTTP_CONFIG, **getattr(settings, 'AI_HTTP_CLIENT', {}))
+        return cls(
+            connect_timeout=config['CONNECT_TIMEOUT'],
+            read_timeout=config['READ_TIMEOUT'],
+            pool_size=config['POOL_SIZE'],
+            max_retries=config['MAX_RETRIES'],
+            backoff_base=config['BACKOFF_BASE'],
+            backoff_max=config['BACKOFF_MAX'],
+            breaker=CircuitBreaker(config['BREAKER_FAILURE_THRESHOLD'], config['BREAKER_RECOVERY_TIMEOUT']),
+        )
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """指数退避加随机抖动；模型加载中时参考返回的 estimated_time"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if response is not None:
+            try:
+                estimated = float(response.json().get('estimated_time', 0))
+                delay = min(self.backoff_max, max(delay, estimated))
+            except (ValueError, AttributeError, TypeError):
+                pass
+        return random.uniform(delay / 2, delay)
+
+    def post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                  deadline: Optional[float] = None) -> requests.Response:
+        """发送JSON请求；deadline 为本次调用（含重试）的总时限（秒）
+
+        熔断打开时抛出 CircuitOpenError，网络错误和超时抛出 requests 的异常。
+        """
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(url)
+
+        expires_at = time.monotonic() + deadline if deadline is not None else None
+        attempt = 0
+        while True:
+            read_timeout = self.read_timeout
+            if expires_at is not None:
+                read_timeout = min(read_timeout, max(0.01, expires_at - time.monotonic()))
+            try:
+                response = self.session.post(
+                    url, json=payload, headers=headers,
+                    timeout=(min(self.connect_timeout, read_timeout), read_timeout),
+                )
+            except requests.RequestException:
+                self.breaker.record_failure()
+                raise
+
+            if response.status_code == 503 and attempt < self.max_retries:
+                delay = self._backoff(attempt, response)
+                if expires_at is None or time.monotonic() + delay < expires_at:
+                    response.close()
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+            if response.status_code in UNHEALTHY_STATUS_CODES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            return response
+
+
+# 进程内共享的客户端实例
+inference_client = InferenceClient.from_settings()
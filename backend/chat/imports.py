@@ -0,0 +1,183 @@
+import codecs
+import csv
+import json
+from datetime import date
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import bitmaps, streaks
+from .db import write_transaction
+from .models import CheckIn, Goal, User
+
+# 每批校验和写入的行数
+IMPORT_CHUNK_SIZE = 1000
+# 结果中最多返回的错误行数
+MAX_REPORTED_ERRORS = 100
+
+
+def detect_format(explicit: Optional[str] = None, filename: str = '', content_type: str = '') -> str:
+    """根据参数、文件扩展名或 Content-Type 判断导入格式"""
+    if explicit:
+        fmt = explicit.lower()
+    elif filename.lower().endswith('.csv') or 'csv' in content_type:
+        fmt = 'csv'
+    else:
+        fmt = 'ndjson'
+    if fmt not in ('ndjson', 'csv'):
+        raise ValueError(explicit)
+    return fmt
+
+
+def decode_lines(byte_lines: Iterable[bytes]) -> Iterator[str]:
+    """把按行读取的字节流增量解码为文本行（兼容带BOM的UTF-8）"""
+    return codecs.iterdecode(byte_lines, 'utf-8-sig')
+
+
+def read_records(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """逐行解析，产出 (行号, 记录, 错误)"""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None, 'JSON格式错误'
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, '每行必须是一个JSON对象'
+            continue
+        yield line_no, record, None
+
+
+def parse_mood_score(value) -> Optional[int]:
+    if value in (None, ''):
+        return None
+    score = int(value)
+    if not 1 <= score <= 10:
+        raise ValueError(value)
+    return score
+
+
+class CheckInImporter:
+    """批量导入一个用户的历史打卡记录
+
+    按块校验并用 bulk_create(ignore_conflicts=True) 写入，已存在的 (目标, 日期)
+    会被跳过；不触发打卡信号和AI生成，导入结束后统一重建受影响目标的连续打卡统计和日历位图。
+    记录通过 goal_id 或 goal_title 指定目标，标题不存在时自动创建目标。
+    """
+
+    def __init__(self, user: User, chunk_size: int = IMPORT_CHUNK_SIZE):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.goals_by_id = {}
+        self.goals_by_title = {}
+        for goal in Goal.objects.filter(user=user):
+            self.goals_by_id[goal.id] = goal
+            self.goals_by_title.setdefault(goal.title, goal)
+        self.affected_goal_ids = set()
+        self.result = {'total': 0, 'imported': 0, 'skipped': 0, 'invalid': 0, 'goals_created': 0, 'errors': []}
+
+    def run(self, records: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> Dict[str, Any]:
+        records = iter(records)
+        try:
+            while True:
+                chunk = list(islice(records, self.chunk_size))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
+        finally:
+            self.rebuild()
+        return self.result
+
+    def add_error(self, line_no: int, message: str):
+        self.result['invalid'] += 1
+        if len(self.result['errors']) < MAX_REPORTED_ERRORS:
+            self.result['errors'].append({'line': line_no, 'error': message})
+
+    def resolve_goal(self, record: Dict[str, Any]) -> Goal:
+        goal_id = record.get('goal_id')
+        if goal_id not in (None, ''):
+            try:
+                goal = self.goals_by_id.get(int(goal_id))
+            except (TypeError, ValueError):
+                raise ValueError('goal_id无效')
+            if goal is not None:
+                return goal
+        title = str(record.get('goal_title') or '').strip()
+        if not title:
+            raise ValueError('目标不存在，请提供goal_id或goal_title')
+        goal = self.goals_by_title.get(title)
+        if goal is None:
+            goal = Goal.objects.create(user=self.user, title=title[:100])
+            self.goals_by_id[goal.id] = goal
+            self.goals_by_title[title] = goal
+            self.result['goals_created'] += 1
+        return goal
+
+    def validate(self, record: Dict[str, Any]) -> CheckIn:
+        try:
+            check_in_date = date.fromisoformat(str(record.get('check_in_date') or '').strip())
+        except ValueError:
+            raise ValueError('check_in_date格式应为YYYY-MM-DD')
+        try:
+            mood_score = parse_mood_score(record.get('mood_score'))
+        except (TypeError, ValueError):
+            raise ValueError('mood_score应为1-10的整数')
+        # 其他字段都有效后再解析目标，无效行不会创建新目标
+        goal = self.resolve_goal(record)
+        return CheckIn(user=self.user, goal=goal, check_in_date=check_in_date,
+                       notes=str(record.get('notes') or ''), mood_score=mood_score)
+
+    def import_chunk(self, chunk: List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]):
+        candidates = {}
+        for line_no, record, error in chunk:
+            self.result['total'] += 1
+            if error is not None:
+                self.add_error(line_no, error)
+                continue
+            try:
+                checkin = self.validate(record)
+            except ValueError as e:
+                self.add_error(line_no, str(e))
+                continue
+            key = (checkin.goal_id, checkin.check_in_date)
+            if key in candidates:
+                self.result['skipped'] += 1
+            else:
+                candidates[key] = checkin
+        if not candidates:
+            return
+
+        # 一次查询找出已存在的打卡，准确统计跳过数量
+        existing = set(CheckIn.objects.filter(
+            user=self.user,
+            goal_id__in={goal_id for goal_id, _ in candidates},
+            check_in_date__in={day for _, day in candidates},
+        ).values_list('goal_id', 'check_in_date'))
+        new_checkins = [checkin for key, checkin in candidates.items() if key not in existing]
+        self.result['skipped'] += len(candidates) - len(new_checkins)
+        with write_transaction():
+            # 唯一约束兜底并发写入的重复记录
+            CheckIn.objects.bulk_create(new_checkins, ignore_conflicts=True)
+        self.result['imported'] += len(new_checkins)
+        self.affected_goal_ids.update(checkin.goal_id for checkin in new_checkins)
+
+    def rebuild(self):
+        """bulk_create 不触发信号，在这里统一重建统计"""
+        for goal_id in sorted(self.affected_goal_ids):
+            streaks.rebuild_streak(self.user.id, goal_id)
+            bitmaps.rebuild_goal_bitmaps(self.user.id, goal_id)
+        self.affected_goal_ids.clear()
+
+
+def import_checkins(user: User, byte_lines: Iterable[bytes], fmt: str,
+                    chunk_size: int = IMPORT_CHUNK_SIZE) -> Dict[str, Any]:
+    """从按行读取的字节流导入打卡记录，返回导入统计"""
+    records = read_records(decode_lines(byte_lines), fmt)
+    return CheckInImporter(user, chunk_size=chunk_size).run(records)
@@ -0,0 +1,120 @@
+import time
+import traceback
+from datetime import timedelta
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .db import write_transaction
+from .models import AIJob, CheckIn
+
+# 任务类型 -> 处理函数，处理函数返回可JSON序列化的结果
+HANDLERS: Dict[str, Callable[[Any, Dict[str, Any]], Dict[str, Any]]] = {}
+
+
+def handler(kind: str):
+    """注册任务处理函数"""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+@handler('motivational_message')
+def run_motivational_message(ai_service, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """打卡后生成激励消息"""
+    checkin = CheckIn.objects.select_related('user', 'goal').get(id=payload['checkin_id'])
+    ai_message = ai_service.generate_motivational_message(checkin.user, checkin.goal, checkin)
+    return {'ai_message': ai_message}
+
+
+def enqueue(kind: str, payload: Dict[str, Any], max_attempts: int = 3) -> AIJob:
+    """写入一个待执行任务"""
+    if kind not in HANDLERS:
+        raise ValueError(f"未知的任务类型: {kind}")
+    return AIJob.objects.create(kind=kind, payload=payload, max_attempts=max_attempts)
+
+
+def claim_next() -> Optional[AIJob]:
+    """领取一个到期的任务；用带状态条件的 UPDATE 保证多个工作进程不会重复领取"""
+    now = timezone.now()
+    candidates = AIJob.objects.filter(
+        status=AIJob.STATUS_PENDING, run_after__lte=now
+    ).order_by('run_after', 'id').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        with write_transaction():
+            claimed = AIJob.objects.filter(id=job_id, status=AIJob.STATUS_PENDING).update(
+                status=AIJob.STATUS_RUNNING, locked_at=now, attempts=F('attempts') + 1
+            )
+        if claimed:
+            return AIJob.objects.get(id=job_id)
+    return None
+
+
+def requeue_stale(timeout_seconds: Optional[float] = None) -> int:
+    """把领取后长时间未完成的任务（工作进程崩溃等）放回队列，返回放回的任务数
+
+    领取时已经计入一次尝试；尝试次数用完的任务直接标记为失败，
+    避免每次都让工作进程崩溃或卡死的任务被无限重新领取。
+    """
+    timeout_seconds = timeout_seconds or getattr(settings, 'AI_JOB_LOCK_TIMEOUT_SECONDS', 300)
+    cutoff = timezone.now() - timedelta(seconds=timeout_seconds)
+    stale = AIJob.objects.filter(status=AIJob.STATUS_RUNNING, locked_at__lt=cutoff)
+    with write_transaction():
+        stale.filter(attempts__gte=F('max_attempts')).update(
+            status=AIJob.STATUS_FAILED, locked_at=None, updated_at=timezone.now(),
+            error=f'任务执行超过{timeout_seconds}秒未完成，已达到最大尝试次数'
+        )
+        return stale.update(status=AIJob.STATUS_PENDING, locked_at=None, updated_at=timezone.now())
+
+
+def run_job(ai_service, job: AIJob) -> AIJob:
+    """执行任务并记录结果；失败时按指数退避重新排队"""
+    try:
+        job.result = HANDLERS[job.kind](ai_service, job.payload)
+        job.status = AIJob.STATUS_DONE
+        job.error = ''
+    except ObjectDoesNotExist as e:
+        # 关联数据已被删除，重试没有意义
+        job.status = AIJob.STATUS_FAILED
+        job.error = str(e)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = AIJob.STATUS_PENDING
+            job.run_after = timezone.now() + timedelta(seconds=min(60, 2 ** job.attempts))
+        else:
+            job.status = AIJob.STATUS_FAILED
+    job.locked_at = None
+    with write_transaction():
+        job.save(update_fields=['result', 'status', 'error', 'run_after', 'locked_at', 'updated_at'])
+    return job
+
+
+def work(ai_service, poll_interval: float = 1.0, max_jobs: Optional[int] = None,
+         exit_when_empty: bool = False, should_stop: Callable[[], bool] = lambda: False) -> int:
+    """工作进程主循环，返回处理的任务数"""
+    processed = 0
+    last_requeue = 0.0
+    while not should_stop():
+        close_old_connections()
+        if time.monotonic() - last_requeue > 60:
+            requeue_stale()
+            last_requeue = time.monotonic()
+
+        job = claim_next()
+        if job is None:
+            if exit_when_empty:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        run_job(ai_service, job)
+        processed += 1
+        if max_jobs is not None and processed >= max_jobs:
+            break
+    return processed
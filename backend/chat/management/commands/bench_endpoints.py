@@ -0,0 +1,317 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+
+from chat import jobs, urls, views
+from chat.authentication import issue_token
+from chat.db import scratch_database
+from chat.models import Channel, CheckIn, Goal, Message, PromptTemplate
+from chat.seeding import MESSAGES, SCALES, SEED_PASSWORD, seed
+
+# 不参与基准的接口及原因
+SKIPPED = {
+    'event_stream': 'SSE长连接，延迟见 bench_push',
+}
+
+# AI调用指向本机不可达的端口，基准测的是本地兜底路径，不受外部服务波动影响
+OFFLINE_AI_URL = 'http://127.0.0.1:9/'
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 2)
+
+
+def url_names(patterns, found=None):
+    """chat/urls.py 中全部具名路由（含 router 生成的）"""
+    found = set() if found is None else found
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            url_names(pattern.url_patterns, found)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            found.add(pattern.name)
+    return found
+
+
+def build_fixtures():
+    """从生成的数据中挑一个有频道、目标和消息的用户作为请求主体，并准备写入接口用的对象"""
+    channel = Channel.objects.filter(messages__isnull=False).select_related('from_user').first()
+    if channel is None:
+        raise CommandError('数据中没有聊天消息，请调大规模参数')
+    user = channel.from_user
+    goal = Goal.objects.filter(user=user).first()
+    if goal is None:
+        raise CommandError('数据中没有目标，请调大规模参数')
+    checkin = CheckIn.objects.filter(goal=goal).first()
+    template = PromptTemplate.objects.create(
+        name='bench_template', description='基准测试模板', variables=['username', 'goal_title'],
+        template_content='{username}，今天的{goal_title}完成了吗？')
+    middle = Message.objects.filter(channel=channel).order_by('created_at', 'id')
+    return {
+        'user_id': user.id,
+        'username': user.username,
+        'token': issue_token(user),
+        'peer_id': channel.to_user_id,
+        'goal_id': goal.id,
+        'channel_id': channel.id,
+        'message_id': middle.first().id,
+        'before_id': middle[middle.count() // 2].id,
+        'template_id': template.id,
+        'job_id': jobs.enqueue('motivational_message', {'checkin_id': checkin.id if checkin else 0}).id,
+        # 写入接口使用单独的对象，不影响读接口的数据分布
+        'write_goal_id': Goal.objects.create(user=user, title='基准写入目标').id,
+        'delete_goal_id': Goal.objects.create(user=user, title='基准删除目标').id,
+        'delete_template_id': PromptTemplate.objects.create(
+            name='bench_delete', description='基准测试模板', template_content='x', variables=[]).id,
+    }
+
+
+def endpoint_specs(ctx):
+    """每项为 (名称, 方法, 路由名, 构造请求的函数)；函数接收请求序号 i，返回 (路径, 参数或请求体)"""
+    u, g, ch = ctx['user_id'], ctx['goal_id'], ctx['channel_id']
+    day = lambda i: (date(2000, 1, 1) + timedelta(days=i)).isoformat()
+    return [
+        ('GET api-root', 'GET', 'api-root', lambda i: (reverse('api-root'), None)),
+        ('GET user-list', 'GET', 'user-list', lambda i: (reverse('user-list'), None)),
+        ('GET user-search', 'GET', 'user-search', lambda i: (reverse('user-search'), {'q': 'seed_1'})),
+        ('GET user-search (substring)', 'GET', 'user-search', lambda i: (reverse('user-search'), {'q': 'ed_2'})),
+        ('GET user-detail', 'GET', 'user-detail', lambda i: (reverse('user-detail', args=[u]), None)),
+        ('GET channel-list', 'GET', 'channel-list', lambda i: (reverse('channel-list'), None)),
+        ('GET channel-detail', 'GET', 'channel-detail', lambda i: (reverse('channel-detail', args=[ch]), None)),
+        ('GET message-list', 'GET', 'message-list', lambda i: (reverse('message-list'), None)),
+        ('GET message-detail', 'GET', 'message-detail',
+         lambda i: (reverse('message-detail', args=[ctx['message_id']]), None)),
+        ('POST register', 'POST', 'register',
+         lambda i: (reverse('register'), {'username': f'bench_{i}', 'password': SEED_PASSWORD})),
+        ('POST login', 'POST', 'login',
+         lambda i: (reverse('login'), {'username': ctx['username'], 'password': SEED_PASSWORD})),
+        ('GET goals', 'GET', 'goals', lambda i: (reverse('goals'), {'user_id': u})),
+        ('POST goals', 'POST', 'goals', lambda i: (reverse('goals'), {'user_id': u, 'title': f'基准目标{i}'})),
+        ('GET goal_detail', 'GET', 'goal_detail', lambda i: (reverse('goal_detail', args=[g]), None)),
+        ('PUT goal_detail', 'PUT', 'goal_detail',
+         lambda i: (reverse('goal_detail', args=[ctx['write_goal_id']]), {'description': f'第{i}次修改'})),
+        ('DELETE goal_detail', 'DELETE', 'goal_detail',
+         lambda i: (reverse('goal_detail', args=[ctx['delete_goal_id']]), None)),
+        ('GET checkins', 'GET', 'checkins', lambda i: (reverse('checkins'), {'user_id': u, 'goal_id': g})),
+        ('POST checkins', 'POST', 'checkins',
+         lambda i: (reverse('checkins'), {'user_id': u, 'goal_id': ctx['write_goal_id'],
+                                          'check_in_date': day(i), 'mood_score': 7, 'notes': '基准打卡'})),
+        ('GET checkin_stats', 'GET', 'checkin_stats', lambda i: (reverse('checkin_stats'), {'user_id': u})),
+        ('GET checkin_calendar', 'GET', 'checkin_calendar',
+         lambda i: (reverse('checkin_calendar'), {'user_id': u, 'goal_id': g})),
+        ('POST checkins_import', 'POST', 'checkins_import',
+         lambda i: (f"{reverse('checkins_import')}?user_id={u}",
+                    json.dumps({'goal_title': '基准导入目标', 'check_in_date': day(i), 'mood_score': 6}).encode())),
+        ('GET checkins_export', 'GET', 'checkins_export',
+         lambda i: (reverse('checkins_export'), {'user_id': u, 'goal_id': g})),
+        ('POST generate_reminder', 'POST', 'generate_reminder',
+         lambda i: (reverse('generate_reminder'), {'user_id': u, 'goal_id': g})),
+        ('GET ai_messages', 'GET', 'ai_messages', lambda i: (reverse('ai_messages'), {'user_id': u})),
+        ('GET ai_messages (full)', 'GET', 'ai_messages',
+         lambda i: (reverse('ai_messages'), {'user_id': u, 'detail': 'full'})),
+        ('GET ai_messages_export', 'GET', 'ai_messages_export',
+         lambda i: (reverse('ai_messages_export'), {'user_id': u})),
+        ('GET ai_job_detail', 'GET', 'ai_job_detail', lambda i: (reverse('ai_job_detail', args=[ctx['job_id']]), None)),
+        ('POST send_message', 'POST', 'send_message',
+         lambda i: (reverse('send_message'), {'message': MESSAGES[i % len(MESSAGES)], 'from_user': u,
+                                              'to_user': ctx['peer_id'], 'channel': ch})),
+        ('GET get_messages', 'GET', 'get_messages', lambda i: (reverse('get_messages'), {'channel': ch})),
+        ('GET get_messages (before_id)', 'GET', 'get_messages',
+         lambda i: (reverse('get_messages'), {'channel': ch, 'before_id': ctx['before_id']})),
+        ('GET messages_export', 'GET', 'messages_export', lambda i: (reverse('messages_export'), {'channel': ch})),
+        ('POST sentiment_batch', 'POST', 'sentiment_batch',
+         lambda i: (reverse('sentiment_batch'), {'texts': [f'{text}{i}' for text in MESSAGES]})),
+        ('GET prompt_templates', 'GET', 'prompt_templates', lambda i: (reverse('prompt_templates'), None)),
+        ('POST prompt_templates', 'POST', 'prompt_templates',
+         lambda i: (reverse('prompt_templates'), {'name': f'bench_{i}', 'description': '基准测试模板',
+                                                  'template_content': '{username}加油', 'variables': ['username']})),
+        ('GET prompt_template_detail', 'GET', 'prompt_template_detail',
+         lambda i: (reverse('prompt_template_detail', args=[ctx['template_id']]), None)),
+        ('PUT prompt_template_detail', 'PUT', 'prompt_template_detail',
+         lambda i: (reverse('prompt_template_detail', args=[ctx['template_id']]), {'description': f'第{i}次修改'})),
+        ('DELETE prompt_template_detail', 'DELETE', 'prompt_template_detail',
+         lambda i: (reverse('prompt_template_detail', args=[ctx['delete_template_id']]), None)),
+        ('POST request_chat', 'POST', 'request_chat',
+         lambda i: (reverse('request_chat'), {'from_user': ctx['peer_id'], 'to_user': u})),
+        ('GET batch_reminders', 'GET', 'batch_reminders', lambda i: (reverse('batch_reminders'), {'user_id': u})),
+        ('GET metrics', 'GET', 'metrics', lambda i: (reverse('metrics'), None)),
+    ]
+
+
+def perform(client, method, path, payload):
+    """发出请求并读完响应体（流式响应也要读完，才能计入完整耗时和查询）"""
+    if method == 'GET':
+        response = client.get(path, payload or {})
+    elif isinstance(payload, bytes):
+        response = client.generic(method, path, payload, content_type='application/x-ndjson')
+    else:
+        response = client.generic(method, path, json.dumps(payload or {}), content_type='application/json')
+    if response.streaming:
+        b''.join(response.streaming_content)
+    response.close()
+    return response.status_code
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = '接口基准测试：在临时数据库中生成数据，逐个请求 chat/urls.py 的接口，统计延迟分位数、查询次数和峰值内存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='生成数据的预设规模')
+        parser.add_argument('--users', type=int, default=None, help='覆盖预设的用户数')
+        parser.add_argument('--iterations', type=int, default=50, help='每个接口计时的请求次数')
+        parser.add_argument('--warmup', type=int, default=3, help='每个接口计时前的预热请求次数')
+        parser.add_argument('--memory-iterations', type=int, default=3, help='统计峰值内存的请求次数')
+        parser.add_argument('--only', action='append', default=[], help='只测名称中包含该字符串的接口，可重复')
+        parser.add_argument('--output', default=None, help='结果写入的JSON文件')
+        parser.add_argument('--compare', default=None, help='与之前保存的结果对比')
+        parser.add_argument('--threshold', type=float, default=20.0, help='p95 变慢超过该百分比视为退化')
+        parser.add_argument('--fail-on-regression', action='store_true', help='存在退化或查询数增加时以非零状态退出')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        log = None if options['json'] else self.stdout.write
+        original_urls = views.ai_service.api_url, views.ai_service.fallback_api_url
+        views.ai_service.api_url = views.ai_service.fallback_api_url = OFFLINE_AI_URL
+        try:
+            # 在临时数据库文件上运行，不影响正在使用的数据库
+            with scratch_database():
+                dataset = seed(options['scale'], log=log, users=options['users'])
+                results, uncovered = self.run_benchmark(options)
+        finally:
+            views.ai_service.api_url, views.ai_service.fallback_api_url = original_urls
+
+        report = {
+            'meta': {
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'scale': options['scale'],
+                'dataset': dataset,
+                'iterations': options['iterations'],
+            },
+            'endpoints': results,
+            'skipped': SKIPPED,
+            'uncovered': uncovered,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False, sort_keys=True)
+                f.write('\n')
+
+        regressions = []
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            regressions = compare(baseline['endpoints'], results, options['threshold'])
+            report['regressions'] = regressions
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False, sort_keys=True))
+        else:
+            self.print_table(results, uncovered, regressions)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} 个接口出现退化')
+
+    def run_benchmark(self, options):
+        ctx = build_fixtures()
+        specs = [spec for spec in endpoint_specs(ctx)
+                 if not options['only'] or any(part in spec[0] for part in options['only'])]
+        covered = {url_name for _, _, url_name, _ in endpoint_specs(ctx)}
+        uncovered = sorted(url_names(urls.urlpatterns) - covered - set(SKIPPED))
+
+        # 与前端一样带访问令牌请求
+        client = Client(headers={'Authorization': f"Bearer {ctx['token']}"})
+        results = {}
+        for name, method, url_name, build in specs:
+            counter = iter(range(10 ** 9))
+            for _ in range(options['warmup']):
+                perform(client, method, *build(next(counter)))
+
+            latencies, queries, statuses = [], [], {}
+            for _ in range(options['iterations']):
+                path, payload = build(next(counter))
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    code = perform(client, method, path, payload)
+                    latencies.append(time.perf_counter() - started)
+                queries.append(len(captured.captured_queries))
+                statuses[str(code)] = statuses.get(str(code), 0) + 1
+
+            # 峰值内存单独统计，tracemalloc 本身会明显拖慢请求
+            peak = 0
+            tracemalloc.start()
+            try:
+                for _ in range(options['memory_iterations']):
+                    path, payload = build(next(counter))
+                    tracemalloc.clear_traces()
+                    tracemalloc.reset_peak()
+                    baseline = tracemalloc.get_traced_memory()[0]
+                    perform(client, method, path, payload)
+                    peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+            finally:
+                tracemalloc.stop()
+
+            results[name] = {
+                'url_name': url_name,
+                'method': method,
+                'status_codes': statuses,
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+                'queries_mean': round(statistics.mean(queries), 1) if queries else None,
+                'queries_max': max(queries) if queries else None,
+                'peak_memory_kb': round(peak / 1024, 1),
+            }
+        return results, uncovered
+
+    def print_table(self, results, uncovered, regressions):
+        self.stdout.write(f"{'接口':<34} {'状态码':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'查询':>6} {'内存KB':>9}")
+        for name, row in results.items():
+            codes = ','.join(sorted(row['status_codes']))
+            line = (f"{name:<34} {codes:<12} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+                    f"{row['queries_mean']:>6} {row['peak_memory_kb']:>9}")
+            failed = any(int(code) >= 400 for code in row['status_codes'])
+            self.stdout.write(self.style.ERROR(line) if failed else line)
+        for name, reason in SKIPPED.items():
+            self.stdout.write(f'跳过 {name}：{reason}')
+        if uncovered:
+            self.stdout.write(self.style.WARNING(f"未覆盖的路由：{', '.join(uncovered)}"))
+        for item in regressions:
+            self.stdout.write(self.style.ERROR(f"退化 {item['endpoint']}：{item['reason']}"))
+
+
+def compare(baseline, current, threshold):
+    """对比两次结果，返回 p95 变慢超过阈值或平均查询数增加的接口"""
+    regressions = []
+    for name, row in current.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        if old.get('p95_ms') and row['p95_ms'] and row['p95_ms'] > old['p95_ms'] * (1 + threshold / 100):
+            regressions.append({'endpoint': name, 'reason': f"p95 {old['p95_ms']} -> {row['p95_ms']} ms"})
+        if old.get('queries_mean') is not None and row['queries_mean'] > old['queries_mean']:
+            regressions.append({'endpoint': name,
+                                'reason': f"查询数 {old['queries_mean']} -> {row['queries_mean']}"})
+    return regressions
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+
+GOALS = ['阅读', '跑步', '学习英语', '冥想', '写代码', '练琴']
+NOTES = ['状态不错', '有点累', '坚持下来了', '今天很忙', '感觉很棒', '']
+
+INLINE_SCHEMA = '''
+CREATE TABLE ai_message (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, goal_id INTEGER NOT NULL,
+    filled_prompt TEXT NOT NULL, ai_response TEXT NOT NULL, context_data TEXT NOT NULL, created_at TEXT NOT NULL
+);
+CREATE INDEX ai_message_user ON ai_message (user_id, created_at, id);
+'''
+
+BLOB_SCHEMA = '''
+CREATE TABLE content_blob (
+    id INTEGER PRIMARY KEY, digest VARCHAR(64) NOT NULL UNIQUE, content TEXT NOT NULL,
+    size INTEGER NOT NULL, created_at TEXT NOT NULL
+);
+CREATE TABLE ai_message (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, goal_id INTEGER NOT NULL,
+    prompt_blob_id INTEGER NULL REFERENCES content_blob (id), ai_response TEXT NOT NULL,
+    context_blob_id INTEGER NULL REFERENCES content_blob (id), created_at TEXT NOT NULL
+);
+CREATE INDEX ai_message_user ON ai_message (user_id, created_at, id);
+CREATE INDEX ai_message_prompt ON ai_message (prompt_blob_id);
+CREATE INDEX ai_message_context ON ai_message (context_blob_id);
+'''
+
+# 与 chat.retention.collapse_old_messages 相同的规则
+COLLAPSE_SQL = '''
+DELETE FROM ai_message WHERE id IN (
+    SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (
+            PARTITION BY user_id, goal_id, substr(created_at, 1, 10) ORDER BY created_at DESC, id DESC
+        ) AS rank FROM ai_message WHERE created_at < ?
+    ) WHERE rank > 1
+)
+'''
+
+DELETE_UNREFERENCED_SQL = '''
+DELETE FROM content_blob WHERE
+    NOT EXISTS (SELECT 1 FROM ai_message WHERE prompt_blob_id = content_blob.id) AND
+    NOT EXISTS (SELECT 1 FROM ai_message WHERE context_blob_id = content_blob.id)
+'''
+
+
+def synthetic_messages(rows: int, days: int, seed: int = 42):
+    """模拟线上写入：每个目标每天若干条相同的提醒（页面刷新触发）加一条打卡激励"""
+    rng = random.Random(seed)
+    per_user = 3 * days * 3  # 3个目标，每天平均约3条
+    users = max(1, math.ceil(rows / per_user))
+    start = date(2026, 1, 1)
+    produced = 0
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        for user_id in range(1, users + 1):
+            for goal_index in range(3):
+                goal_id = user_id * 3 + goal_index
+                title = GOALS[(user_id + goal_index) % len(GOALS)]
+                history = [
+                    {'date': (day - timedelta(days=i)).isoformat(), 'mood_score': rng.randint(1, 10),
+                     'notes': rng.choice(NOTES)}
+                    for i in range(1, 8) if rng.random() < 0.7
+                ]
+                recent = '、'.join(item['date'] for item in history[:3]) or '最近3天均未打卡'
+                prompt = (f'\n作为健身教练，请用温暖风格提醒用户：\nuser{user_id}设置了目标{title}，\n'
+                          f'最近打卡记录：{recent}.\n请生成30字内的鼓励语。\n')
+                context = {'goal_title': title, 'consecutive_days': len(history), 'recent_checkins': history}
+                for hour in range(rng.randint(1, 4)):
+                    created_at = datetime(day.year, day.month, day.day, 8 + hour, rng.randint(0, 59))
+                    yield user_id, goal_id, prompt, '今天也要坚持哦，加油！', context, created_at.isoformat(' ')
+                    produced += 1
+                    if produced >= rows:
+                        return
+                if rng.random() < 0.3:
+                    mood = rng.randint(1, 10)
+                    prompt = (f'用户user{user_id}刚完成了{title}的打卡，心情评分{mood}/10，'
+                              f'备注：{rng.choice(NOTES)}。请生成一句50字内的激励语。')
+                    created_at = datetime(day.year, day.month, day.day, 20, rng.randint(0, 59))
+                    yield user_id, goal_id, prompt, '太棒了，继续保持！', context, created_at.isoformat(' ')
+                    produced += 1
+                    if produced >= rows:
+                        return
+
+
+def dump_context(data) -> str:
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+def file_size(conn: sqlite3.Connection, path: str) -> int:
+    conn.execute('VACUUM')
+    return os.path.getsize(path)
+
+
+class Command(BaseCommand):
+    help = 'AI消息存储空间基准：内联存储、内容去重存储以及保留策略压缩后的数据库大小'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='合成的AI消息数量')
+        parser.add_argument('--days', type=int, default=180, help='数据覆盖的天数')
+        parser.add_argument('--retain-days', type=int, default=30, help='压缩时保留全部消息的天数')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        rows, days = options['rows'], options['days']
+        cutoff = (datetime(2026, 1, 1) + timedelta(days=days - options['retain_days'])).isoformat(' ')
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            inline_path = os.path.join(directory, 'inline.sqlite3')
+            blob_path = os.path.join(directory, 'blob.sqlite3')
+            inline = sqlite3.connect(inline_path)
+            blob = sqlite3.connect(blob_path)
+            inline.executescript(INLINE_SCHEMA)
+            blob.executescript(BLOB_SCHEMA)
+
+            start = time.perf_counter()
+            blob_ids = {}
+            inline_batch, blob_batch, new_blobs = [], [], []
+
+            def intern(content: str) -> int:
+                digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+                blob_id = blob_ids.get(digest)
+                if blob_id is None:
+                    blob_id = blob_ids[digest] = len(blob_ids) + 1
+                    new_blobs.append((blob_id, digest, content, len(content.encode('utf-8')), cutoff))
+                return blob_id
+
+            def flush():
+                inline.executemany('INSERT INTO ai_message (user_id, goal_id, filled_prompt, ai_response, '
+                                   'context_data, created_at) VALUES (?, ?, ?, ?, ?, ?)', inline_batch)
+                blob.executemany('INSERT INTO content_blob VALUES (?, ?, ?, ?, ?)', new_blobs)
+                blob.executemany('INSERT INTO ai_message (user_id, goal_id, prompt_blob_id, ai_response, '
+                                 'context_blob_id, created_at) VALUES (?, ?, ?, ?, ?, ?)', blob_batch)
+                inline_batch.clear()
+                blob_batch.clear()
+                new_blobs.clear()
+
+            for user_id, goal_id, prompt, response, context, created_at in synthetic_messages(rows, days):
+                context_json = dump_context(context)
+                inline_batch.append((user_id, goal_id, prompt, response, context_json, created_at))
+                blob_batch.append((user_id, goal_id, intern(prompt), response, intern(context_json), created_at))
+                if len(inline_batch) >= 10000:
+                    flush()
+            flush()
+            inline.commit()
+            blob.commit()
+            generate_seconds = time.perf_counter() - start
+
+            results['inline'] = {'rows': rows, 'blobs': 0, 'bytes': file_size(inline, inline_path)}
+            results['deduplicated'] = {'rows': rows, 'blobs': len(blob_ids), 'bytes': file_size(blob, blob_path)}
+
+            inline.execute(COLLAPSE_SQL, (cutoff,))
+            inline.commit()
+            collapsed_rows = inline.execute('SELECT COUNT(*) FROM ai_message').fetchone()[0]
+            results['inline_compacted'] = {'rows': collapsed_rows, 'blobs': 0, 'bytes': file_size(inline, inline_path)}
+
+            start = time.perf_counter()
+            blob.execute(COLLAPSE_SQL, (cutoff,))
+            blob.execute(DELETE_UNREFERENCED_SQL)
+            blob.commit()
+            compact_seconds = time.perf_counter() - start
+            results['deduplicated_compacted'] = {
+                'rows': blob.execute('SELECT COUNT(*) FROM ai_message').fetchone()[0],
+                'blobs': blob.execute('SELECT COUNT(*) FROM content_blob').fetchone()[0],
+                'bytes': file_size(blob, blob_path),
+            }
+
+            # 旧消息不再保留上下文快照（compact_ai_messages --drop-context-days）
+            blob.execute('UPDATE ai_message SET context_blob_id = NULL WHERE created_at < ?', (cutoff,))
+            blob.execute(DELETE_UNREFERENCED_SQL)
+            blob.commit()
+            results['deduplicated_compacted_no_context'] = {
+                'rows': blob.execute('SELECT COUNT(*) FROM ai_message').fetchone()[0],
+                'blobs': blob.execute('SELECT COUNT(*) FROM content_blob').fetchone()[0],
+                'bytes': file_size(blob, blob_path),
+            }
+            inline.close()
+            blob.close()
+
+        baseline = results['inline']['bytes']
+        for row in results.values():
+            row['ratio'] = round(row['bytes'] / baseline, 3)
+        summary = {'rows': rows, 'days': days, 'retain_days': options['retain_days'],
+                   'generate_seconds': round(generate_seconds, 2), 'compact_seconds': round(compact_seconds, 2),
+                   'layouts': results}
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        self.stdout.write(f"合成 {rows:,} 条AI消息（{days} 天），保留最近 {options['retain_days']} 天")
+        for name, row in results.items():
+            self.stdout.write(f"  {name:<34} rows={row['rows']:>10,} blobs={row['blobs']:>9,} "
+                              f"{row['bytes'] / 1024 / 1024:>9.1f} MB ({row['ratio']:.1%})")
+        self.stdout.write(f"  压缩耗时 {compact_seconds:.2f} 秒")
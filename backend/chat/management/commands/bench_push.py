@@ -0,0 +1,145 @@
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+
+from chat.events import EventBroker, channel_topic
+from chat.models import User, Channel, Message
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = '对比轮询与事件推送：在大量空闲客户端下的请求量和消息延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=3000, help='同时在线的空闲客户端数量')
+        parser.add_argument('--channels', type=int, default=500, help='客户端分布的频道数量')
+        parser.add_argument('--messages', type=int, default=200, help='推送阶段发布的消息数量')
+        parser.add_argument('--history', type=int, default=1000, help='轮询阶段频道内的历史消息数量')
+        parser.add_argument('--poll-interval', type=float, default=3.0, help='前端轮询间隔（秒）')
+        parser.add_argument('--samples', type=int, default=30, help='轮询阶段的采样请求数')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        polling = self.bench_polling(options)
+        push = asyncio.run(self.bench_push(options))
+        result = {'clients': options['clients'], 'polling': polling, 'push': push}
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+            return
+
+        self.stdout.write(f"客户端数量: {options['clients']}")
+        for mode, stats in (('轮询', polling), ('推送', push)):
+            self.stdout.write(f"[{mode}]")
+            for key, value in stats.items():
+                self.stdout.write(f"  {key}: {value}")
+
+    def bench_polling(self, options):
+        """测量现有轮询方式：每个客户端每隔 poll_interval 请求一次 get-messages"""
+        client = Client()
+        full_times, incremental_times = [], []
+        with transaction.atomic():
+            a = User.objects.create(username='bench_push_a', password='x')
+            b = User.objects.create(username='bench_push_b', password='x')
+            channel = Channel.objects.create(name='bench_push', from_user=a, to_user=b)
+            Message.objects.bulk_create([
+                Message(message=f'历史消息 {i}', from_user=a, to_user=b, channel=channel)
+                for i in range(options['history'])
+            ])
+            last_id = Message.objects.filter(channel=channel).order_by('-id').values_list('id', flat=True).first()
+
+            for _ in range(options['samples']):
+                start = time.perf_counter()
+                client.get('/api/get-messages/', {'channel': channel.id, 'limit': options['history']})
+                full_times.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                client.get('/api/get-messages/', {'channel': channel.id, 'after_id': last_id})
+                incremental_times.append(time.perf_counter() - start)
+            transaction.set_rollback(True)
+
+        interval = options['poll_interval']
+        requests_per_second = options['clients'] / interval
+        full_mean = statistics.mean(full_times)
+        incremental_mean = statistics.mean(incremental_times)
+        return {
+            'requests_per_second': round(requests_per_second, 1),
+            'full_history_request_ms': round(full_mean * 1000, 3),
+            'incremental_request_ms': round(incremental_mean * 1000, 3),
+            # 服务端每秒需要消耗的请求处理时间（秒），>1 表示单核无法承载
+            'server_busy_seconds_per_second_full': round(requests_per_second * full_mean, 2),
+            'server_busy_seconds_per_second_incremental': round(requests_per_second * incremental_mean, 2),
+            # 新消息平均等待半个轮询周期才会被拉取
+            'mean_delivery_latency_ms': round((interval / 2 + incremental_mean) * 1000, 1),
+            'p99_delivery_latency_ms': round((interval * 0.99 + _percentile(incremental_times, 99)) * 1000, 1),
+        }
+
+    async def bench_push(self, options):
+        """测量事件推送：空闲订阅者不产生请求，只在有消息时被唤醒"""
+        broker = EventBroker()
+        clients = options['clients']
+        channels = max(1, min(options['channels'], clients))
+
+        tracemalloc.start()
+        subscriptions = [broker.subscribe([channel_topic(i % channels)]) for i in range(clients)]
+        memory_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        latencies = []
+        expected = 0
+        targets = [random.randrange(channels) for _ in range(options['messages'])]
+        for target in targets:
+            expected += broker.subscriber_count(channel_topic(target))
+
+        async def consume(subscription):
+            while True:
+                event = await subscription.get()
+                latencies.append(time.perf_counter() - event['data']['sent_at'])
+
+        consumers = [asyncio.create_task(consume(s)) for s in subscriptions]
+
+        def produce():
+            # 模拟同步视图线程中的 publish 调用
+            for target in targets:
+                broker.publish(channel_topic(target), 'new_message', {'sent_at': time.perf_counter()})
+                time.sleep(0.001)
+
+        publish_start = time.perf_counter()
+        producer = threading.Thread(target=produce)
+        producer.start()
+        while producer.is_alive() or len(latencies) < expected:
+            await asyncio.sleep(0.005)
+            if time.perf_counter() - publish_start > 60:
+                break
+        producer.join()
+
+        for task in consumers:
+            task.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+        for subscription in subscriptions:
+            broker.unsubscribe(subscription)
+
+        return {
+            'idle_requests_per_second': 0,
+            'events_delivered': len(latencies),
+            'events_expected': expected,
+            'p50_delivery_latency_ms': round(_percentile(latencies, 50) * 1000, 3),
+            'p95_delivery_latency_ms': round(_percentile(latencies, 95) * 1000, 3),
+            'p99_delivery_latency_ms': round(_percentile(latencies, 99) * 1000, 3),
+            'subscription_memory_kb': round(memory_bytes / 1024, 1),
+        }
@@ -0,0 +1,105 @@
+import json
+import os
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.sentiment import SentimentService, _score_many
+
+SUBJECTS = ['今天', '这周', '早上', '晚上', '最近', '刚才']
+ACTIONS = ['跑步', '阅读', '学习英语', '写代码', '冥想', '练琴', '背单词', '健身']
+FEELINGS = ['感觉很棒', '有点累', '非常开心', '特别沮丧', '还不错', '压力很大', '充满动力', '不太想坚持了']
+
+
+def make_corpus(size: int, seed: int = 42):
+    """生成互不重复的中文聊天语料"""
+    rng = random.Random(seed)
+    return [
+        f"{rng.choice(SUBJECTS)}{rng.choice(ACTIONS)}了{i % 120 + 1}分钟，{rng.choice(FEELINGS)}（{i}）"
+        for i in range(size)
+    ]
+
+
+class Command(BaseCommand):
+    help = '情感分析吞吐量基准：单核与多核进程池的每秒处理消息数，以及请求线程逐条分析时的吞吐量'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='每轮分析的消息数量')
+        parser.add_argument('--workers', type=int, nargs='*', default=None,
+                            help='要测试的进程数列表，默认为 1 和CPU核数')
+        parser.add_argument('--threads', type=int, default=8, help='逐条分析时模拟的并发请求线程数')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        corpus = make_corpus(options['messages'])
+        worker_counts = options['workers'] or sorted({1, os.cpu_count() or 1})
+
+        results = []
+        # 基线：在请求线程内逐条计算（改造前的方式）
+        _score_many(corpus[:10])
+        start = time.perf_counter()
+        _score_many(corpus)
+        results.append(self._row('inline', 0, len(corpus), time.perf_counter() - start))
+        # 请求线程逐条调用 analyze()（send_message 的方式），不使用进程池
+        results.append(self._single(SentimentService(workers=0, cache_size=0), corpus, options['threads']))
+
+        for workers in worker_counts:
+            service = SentimentService(workers=workers, cache_size=len(corpus) * 2)
+            self._warm_up(service)
+            try:
+                start = time.perf_counter()
+                service.analyze_many(corpus)
+                results.append(self._row('process_pool', workers, len(corpus), time.perf_counter() - start))
+
+                # 重复文本直接命中缓存
+                start = time.perf_counter()
+                service.analyze_many(corpus)
+                results.append(self._row('memo_hit', workers, len(corpus), time.perf_counter() - start))
+            finally:
+                service.shutdown()
+
+            # 请求线程逐条调用 analyze()，单条文本也交给进程池；不缓存，每条都实际计算
+            service = SentimentService(workers=workers, cache_size=0)
+            self._warm_up(service)
+            try:
+                results.append(self._single(service, corpus, options['threads']))
+            finally:
+                service.shutdown()
+
+        if options['json']:
+            self.stdout.write(json.dumps({'cpu_count': os.cpu_count(), 'results': results}, indent=2))
+            return
+        self.stdout.write(f"CPU核数: {os.cpu_count()}，消息数: {len(corpus)}")
+        for row in results:
+            self.stdout.write(
+                f"  {row['mode']:<13} workers={row['workers']:<3} "
+                f"{row['messages_per_second']:>10.1f} 条/秒  ({row['seconds']:.3f} 秒)"
+            )
+
+    @staticmethod
+    def _warm_up(service):
+        """启动全部工作进程并加载模型"""
+        service.analyze_many([f'预热{i}' for i in range(service.workers * service.chunk_size)])
+
+    def _single(self, service, corpus, threads):
+        """多个线程各自逐条分析语料，返回整体吞吐量"""
+        chunks = [corpus[i::threads] for i in range(threads)]
+        workers = [threading.Thread(target=lambda texts: [service.analyze(text) for text in texts], args=(chunk,))
+                   for chunk in chunks]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return self._row(f'single_x{threads}', service.workers, len(corpus), time.perf_counter() - start)
+
+    @staticmethod
+    def _row(mode, workers, count, seconds):
+        return {
+            'mode': mode,
+            'workers': workers,
+            'seconds': round(seconds, 4),
+            'messages_per_second': round(count / seconds, 1) if seconds else None,
+        }
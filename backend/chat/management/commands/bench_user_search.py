@@ -0,0 +1,170 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from chat.authentication import issue_token
+from chat.db import scratch_database
+from chat.directory import trigrams
+from chat.models import User, normalize_username
+
+ADJECTIVES = ['happy', 'lucky', 'quiet', 'brave', 'sunny', 'tiny', 'wild', 'blue', 'silver', 'golden',
+              'crazy', 'lazy', 'swift', 'calm', 'dark', 'bright', 'little', 'super', 'cool', 'red']
+NOUNS = ['tiger', 'panda', 'river', 'cloud', 'fox', 'moon', 'star', 'wolf', 'rabbit', 'dragon',
+         'coder', 'runner', 'reader', 'cat', 'dog', 'bird', 'lion', 'bear', 'sky', 'tree']
+PINYIN = ['xiaoming', 'lihua', 'zhangwei', 'wangfang', 'liuyang', 'chenjing', 'yangyang', 'zhaolei',
+          'huangli', 'zhoujie', 'wuhao', 'sunli', 'maxiao', 'gaofei', 'linlin', 'hejun']
+CJK = ['小明', '小红', '阿强', '大伟', '晓东', '静静', '思思', '天天', '跑步达人', '读书人']
+
+
+def synthetic_usernames(count: int, seed: int = 42):
+    """模拟真实注册的用户名分布：英文词组、拼音加年份、中文昵称，带或不带数字后缀"""
+    rng = random.Random(seed)
+    seen = set()
+    while len(seen) < count:
+        kind = rng.random()
+        if kind < 0.4:
+            name = f'{rng.choice(ADJECTIVES)}_{rng.choice(NOUNS)}{rng.randint(0, 9999)}'
+        elif kind < 0.7:
+            name = f'{rng.choice(PINYIN)}{rng.randint(1960, 2012)}{rng.choice(["", str(rng.randint(0, 999))])}'
+        elif kind < 0.85:
+            name = f'{rng.choice(ADJECTIVES).title()}{rng.choice(NOUNS).title()}{rng.randint(0, 99999)}'
+        else:
+            name = f'{rng.choice(CJK)}{rng.randint(0, 99999)}'
+        name = name[:50]
+        if name not in seen:
+            seen.add(name)
+            yield name
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 2)
+
+
+class Command(BaseCommand):
+    help = '用户目录搜索基准：在临时数据库中生成大量用户，测量前缀、子串搜索和翻页的接口延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000000, help='生成的用户数')
+        parser.add_argument('--queries', type=int, default=200, help='每类查询的请求次数')
+        parser.add_argument('--target-ms', type=float, default=20.0, help='p99 延迟目标')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            started = time.perf_counter()
+            names = self.populate(options['users'])
+            populate_seconds = time.perf_counter() - started
+            report = self.run_queries(names, options)
+        report.update(users=options['users'], populate_seconds=round(populate_seconds, 1),
+                      target_ms=options['target_ms'])
+        report['passed'] = all(row['p99_ms'] <= options['target_ms'] for row in report['queries'].values())
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+            return
+        self.stdout.write(f"{options['users']:,} 个用户，生成和建索引用时 {report['populate_seconds']} 秒")
+        for kind, row in report['queries'].items():
+            self.stdout.write(f"  {kind:<14} p50/p95/p99 = {row['p50_ms']}/{row['p95_ms']}/{row['p99_ms']} ms，"
+                              f"平均 {row['results_mean']} 条结果，{row['queries_max']} 次SQL")
+        if report['passed']:
+            self.stdout.write(self.style.SUCCESS(f"全部查询 p99 在 {options['target_ms']} ms 以内"))
+        else:
+            self.stdout.write(self.style.ERROR(f"部分查询 p99 超过 {options['target_ms']} ms"))
+
+    def populate(self, count: int):
+        """直接用 executemany 写入用户和三字母组索引（与 directory.index_users 的结果一致，但快得多）"""
+        names = []
+        user_sql = ('INSERT INTO chat_user (id, username, username_key, password, created_at, reminder_time, timezone) '
+                    'VALUES (%s, %s, %s, %s, %s, %s, %s)')
+        trigram_sql = 'INSERT INTO chat_usertrigram (user_id, trigram) VALUES (%s, %s)'
+        users, grams = [], []
+
+        def flush():
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(user_sql, users)
+                cursor.executemany(trigram_sql, grams)
+            users.clear()
+            grams.clear()
+
+        for user_id, name in enumerate(synthetic_usernames(count), 1):
+            key = normalize_username(name)
+            names.append(name)
+            users.append((user_id, name, key, 'x', '2026-01-01 00:00:00', '09:00:00', 'Asia/Shanghai'))
+            grams.extend((user_id, gram) for gram in trigrams(key))
+            if len(users) >= 50000:
+                flush()
+                self.stderr.write(f'  已写入 {user_id:,} 个用户')
+        flush()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return names
+
+    def run_queries(self, names, options):
+        rng = random.Random(7)
+        caller = User.objects.get(id=1)
+        client = Client(headers={'Authorization': f'Bearer {issue_token(caller)}'})
+        url = reverse('user-search')
+
+        def substring(length):
+            name = rng.choice([n for n in rng.sample(names, 20) if len(n) > length + 1] or names)
+            start = rng.randint(1, max(1, len(name) - length))
+            return name[start:start + length]
+
+        kinds = {
+            'prefix_1': lambda: {'q': rng.choice(names)[:1]},
+            'prefix_3': lambda: {'q': rng.choice(names)[:3]},
+            'prefix_6': lambda: {'q': rng.choice(names)[:6]},
+            'substring_3': lambda: {'q': substring(3)},
+            'substring_5': lambda: {'q': substring(5)},
+            'exact': lambda: {'q': rng.choice(names)},
+            'no_match': lambda: {'q': f'zq{rng.randint(0, 99999)}x'},
+            'empty': lambda: {'q': ''},
+        }
+        report = {'queries': {}}
+        for kind, make_params in kinds.items():
+            latencies, result_counts, query_counts = [], [], []
+            for i in range(options['queries'] + 5):
+                params = dict(make_params(), limit=20)
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.get(url, params)
+                    elapsed = time.perf_counter() - started
+                payload = response.json()
+                if i < 5:
+                    continue  # 预热
+                latencies.append(elapsed)
+                result_counts.append(len(payload['results']))
+                query_counts.append(len(captured.captured_queries))
+            report['queries'][kind] = {
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'results_mean': round(sum(result_counts) / len(result_counts), 1),
+                'queries_max': max(query_counts),
+            }
+
+        # 翻页：沿着游标连续取5页
+        latencies = []
+        for _ in range(max(1, options['queries'] // 5)):
+            params = {'q': rng.choice(names)[:2], 'limit': 20}
+            for _ in range(5):
+                started = time.perf_counter()
+                payload = client.get(url, params).json()
+                latencies.append(time.perf_counter() - started)
+                if not payload['next_cursor']:
+                    break
+                params['cursor'] = payload['next_cursor']
+        report['queries']['next_pages'] = {
+            'p50_ms': percentile(latencies, 50), 'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99), 'results_mean': None, 'queries_max': None,
+        }
+        return report
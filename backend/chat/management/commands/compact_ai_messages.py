@@ -0,0 +1,35 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat import retention
+
+
+class Command(BaseCommand):
+    help = '按保留策略压缩AI消息：旧消息每个目标每天只保留最新一条，并清理不再引用的提示词内容'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retain-days', type=int, default=getattr(settings, 'AI_MESSAGE_RETENTION_DAYS', 90),
+                            help='保留最近多少天的全部消息')
+        parser.add_argument('--drop-context-days', type=int, default=None,
+                            help='去掉超过该天数的消息的上下文快照')
+        parser.add_argument('--vacuum', action='store_true', help='压缩后执行 VACUUM 归还磁盘空间（SQLite）')
+        parser.add_argument('--dry-run', action='store_true', help='只统计，不修改数据')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        before = retention.space_report()
+        result = retention.compact(options['retain_days'], options['drop_context_days'], dry_run=options['dry_run'])
+        if options['vacuum'] and not options['dry_run']:
+            retention.vacuum()
+        after = retention.space_report()
+
+        if options['json']:
+            self.stdout.write(json.dumps({'result': result, 'before': before, 'after': after}, indent=2))
+            return
+        prefix = '（试运行）' if options['dry_run'] else ''
+        for key, value in result.items():
+            self.stdout.write(f'{prefix}{key}: {value}')
+        for key in before:
+            self.stdout.write(f'  {key:<15} {before[key]:>14,} -> {after[key]:>14,}')
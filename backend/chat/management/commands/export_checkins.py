@@ -0,0 +1,24 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from chat.exports import CHECKIN_EXPORT_FIELDS, checkin_rows, encode_lines
+
+
+class Command(BaseCommand):
+    help = '流式导出用户的打卡记录为NDJSON或CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, required=True)
+        parser.add_argument('--goal-id', type=int, default=None)
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--output', default='-', help='输出文件路径，默认输出到标准输出')
+
+    def handle(self, *args, **options):
+        rows = checkin_rows(options['user_id'], options['goal_id'])
+        lines = encode_lines(rows, options['format'], CHECKIN_EXPORT_FIELDS)
+        if options['output'] == '-':
+            sys.stdout.writelines(lines)
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            f.writelines(lines)
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.imports import IMPORT_CHUNK_SIZE, detect_format, import_checkins
+from chat.models import User
+
+
+class Command(BaseCommand):
+    help = '从NDJSON或CSV文件批量导入用户的历史打卡记录（不生成AI消息）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='导入文件路径')
+        parser.add_argument('--user-id', type=int, required=True, help='导入到哪个用户')
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default=None, help='文件格式，默认按扩展名判断')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='每批校验和写入的行数')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(id=options['user_id'])
+        except User.DoesNotExist:
+            raise CommandError('用户不存在')
+        fmt = detect_format(options['format'], filename=options['path'])
+        with open(options['path'], 'rb') as f:
+            result = import_checkins(user, f, fmt, chunk_size=options['chunk_size'])
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.bitmaps import rebuild_all_bitmaps
+
+
+class Command(BaseCommand):
+    help = '从打卡记录批量重建按年存储的打卡位图'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批读取和写入的记录数')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_all_bitmaps(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 条打卡位图，耗时 {elapsed:.2f} 秒'))
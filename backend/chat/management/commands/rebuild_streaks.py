@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.streaks import rebuild_all_streaks
+
+
+class Command(BaseCommand):
+    help = '从打卡记录批量重建每个目标的连续打卡统计'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批读取和写入的记录数')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_all_streaks(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 条连续打卡统计，耗时 {elapsed:.2f} 秒'))
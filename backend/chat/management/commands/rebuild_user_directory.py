@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.directory import rebuild_index
+
+
+class Command(BaseCommand):
+    help = '重建用户目录搜索使用的归一化用户名和三字母组索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='每批处理的用户数')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = rebuild_index(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 个用户的目录索引，耗时 {elapsed:.2f} 秒'))
@@ -0,0 +1,58 @@
+import os
+import signal
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+
+from chat import jobs
+from chat.ai_service import AIService
+
+
+class Command(BaseCommand):
+    help = '启动后台AI任务工作进程（处理打卡后的激励消息生成等任务）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='工作进程数量')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='队列为空时的轮询间隔（秒）')
+        parser.add_argument('--max-jobs', type=int, default=None, help='处理指定数量的任务后退出')
+        parser.add_argument('--once', action='store_true', help='处理完当前队列后退出')
+
+    def handle(self, *args, **options):
+        if options['processes'] > 1:
+            return self.run_pool(options)
+
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        self.stdout.write(f'AI任务工作进程已启动 (pid={os.getpid()})')
+        try:
+            processed = jobs.work(
+                AIService(),
+                poll_interval=options['poll_interval'],
+                max_jobs=options['max_jobs'],
+                exit_when_empty=options['once'],
+                should_stop=lambda: bool(stopping),
+            )
+        except KeyboardInterrupt:
+            return
+        self.stdout.write(self.style.SUCCESS(f'工作进程退出，共处理 {processed} 个任务'))
+
+    def run_pool(self, options):
+        """以独立子进程的方式启动多个工作进程，各自拥有数据库连接"""
+        command = [sys.executable, sys.argv[0], 'run_ai_worker', '--processes', '1',
+                   '--poll-interval', str(options['poll_interval'])]
+        if options['max_jobs'] is not None:
+            command += ['--max-jobs', str(options['max_jobs'])]
+        if options['once']:
+            command.append('--once')
+
+        children = [subprocess.Popen(command) for _ in range(options['processes'])]
+        self.stdout.write(f'已启动 {len(children)} 个工作进程')
+        try:
+            for child in children:
+                child.wait()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()
+            for child in children:
+                child.wait()
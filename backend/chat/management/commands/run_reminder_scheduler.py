@@ -0,0 +1,49 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat import scheduler
+from chat.ai_service import AIService
+
+
+class Command(BaseCommand):
+    help = '启动定时提醒调度进程：按用户本地提醒时间提前批量生成每日提醒'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lead-minutes', type=int, default=None,
+                            help='提前多少分钟生成提醒（默认 REMINDER_LEAD_MINUTES）')
+        parser.add_argument('--interval', type=float, default=60.0, help='调度间隔（秒）')
+        parser.add_argument('--batch-size', type=int, default=None, help='每批处理的目标数')
+        parser.add_argument('--once', action='store_true', help='只调度一次后退出')
+
+    def handle(self, *args, **options):
+        lead = timedelta(minutes=options['lead_minutes'] if options['lead_minutes'] is not None
+                         else getattr(settings, 'REMINDER_LEAD_MINUTES', 15))
+        ai_service = AIService()
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+        self.stdout.write(f'定时提醒调度已启动，提前 {lead} 生成')
+
+        # 首次启动从当前时刻开始，之后每轮从上一轮的结束位置继续，不遗漏也不重复
+        window_start = timezone.now()
+        try:
+            while not stopping:
+                tick = time.monotonic()
+                window_end = timezone.now() + lead
+                # 停机太久时只补最近一天
+                window_start = max(window_start, window_end - timedelta(days=1))
+                created = scheduler.dispatch(ai_service, window_start, window_end,
+                                             batch_size=options['batch_size'])
+                if created:
+                    self.stdout.write(f'{window_start:%H:%M}-{window_end:%H:%M} 生成 {created} 条提醒')
+                window_start = window_end
+                if options['once']:
+                    break
+                time.sleep(max(0.0, options['interval'] - (time.monotonic() - tick)))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('定时提醒调度已退出'))
@@ -0,0 +1,38 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.seeding import SCALES, SEED_PASSWORD, seed
+
+
+class Command(BaseCommand):
+    help = '按规模批量生成测试数据：用户、目标、多年打卡记录、聊天频道、消息和AI消息'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='预设规模')
+        parser.add_argument('--users', type=int, default=None)
+        parser.add_argument('--goals-per-user', type=int, default=None)
+        parser.add_argument('--years', type=int, default=None, help='打卡、消息覆盖的年数')
+        parser.add_argument('--channels-per-user', type=int, default=None)
+        parser.add_argument('--messages-per-channel', type=int, default=None)
+        parser.add_argument('--ai-messages-per-goal', type=int, default=None)
+        parser.add_argument('--seed', type=int, default=42, help='随机种子，相同参数生成相同的数据')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        log = None if options['json'] else self.stdout.write
+        started = time.perf_counter()
+        counts = seed(
+            options['scale'], log=log, users=options['users'], goals_per_user=options['goals_per_user'],
+            years=options['years'], channels_per_user=options['channels_per_user'],
+            messages_per_channel=options['messages_per_channel'],
+            ai_messages_per_goal=options['ai_messages_per_goal'], seed=options['seed'],
+            batch_size=options['batch_size'],
+        )
+        elapsed = round(time.perf_counter() - started, 2)
+        if options['json']:
+            self.stdout.write(json.dumps(dict(counts, seconds=elapsed), indent=2))
+            return
+        self.stdout.write(self.style.SUCCESS(f'生成完成，用时 {elapsed} 秒；用户密码均为 {SEED_PASSWORD}'))
@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+
+from chat import jobs
+from chat.db import scratch_database, sqlite_pragmas, write_transaction
+from chat.models import Channel, CheckIn, Goal, GoalStreak, Message, User
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))] * 1000, 2)
+
+
+class Command(BaseCommand):
+    help = 'SQLite并发压力测试：多个写线程同时打卡、发消息，读线程持续查询，统计锁错误和延迟'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=16, help='写线程数')
+        parser.add_argument('--readers', type=int, default=4, help='读线程数')
+        parser.add_argument('--seconds', type=float, default=10.0, help='压测时长')
+        parser.add_argument('--default-profile', action='store_true',
+                            help='使用Django默认的SQLite配置（无WAL、DEFERRED事务）作为对照')
+        parser.add_argument('--no-write-lock', action='store_true', help='不经过进程内写锁，直接使用 atomic')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+
+    def handle(self, *args, **options):
+        # 在临时数据库文件上压测，不影响正在使用的数据库
+        with scratch_database(default_profile=options['default_profile']):
+            report = self.run_workload(options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"配置: {report['profile']}  PRAGMA: {report['pragmas']}")
+        self.stdout.write(f"写线程 {report['writers']}，读线程 {report['readers']}，{report['seconds']} 秒")
+        self.stdout.write(f"  写入 {report['write_ops']} 次（{report['writes_per_second']}/秒），"
+                          f"锁错误 {report['lock_errors']}，p50/p95/p99 = "
+                          f"{report['write_p50_ms']}/{report['write_p95_ms']}/{report['write_p99_ms']} ms")
+        self.stdout.write(f"  读取 {report['read_ops']} 次，锁错误 {report['read_errors']}，"
+                          f"p50/p95 = {report['read_p50_ms']}/{report['read_p95_ms']} ms")
+        if report['lock_errors'] or report['read_errors']:
+            self.stdout.write(self.style.ERROR('出现数据库锁错误'))
+        else:
+            self.stdout.write(self.style.SUCCESS('没有数据库锁错误'))
+
+    def run_workload(self, options):
+        writers, readers = options['writers'], options['readers']
+        write_context = transaction.atomic if options['no_write_lock'] else write_transaction
+
+        fixtures = []
+        for i in range(max(writers, 1)):
+            user = User.objects.create(username=f'stress_{i}', password='x')
+            peer = User.objects.create(username=f'stress_peer_{i}', password='x')
+            goal = Goal.objects.create(user=user, title=f'压测目标{i}')
+            channel = Channel.objects.create(name=f'stress-{i}', from_user=user, to_user=peer)
+            fixtures.append((user.id, peer.id, goal.id, channel.id))
+        pragmas = sqlite_pragmas()
+        connection.close()
+
+        lock = threading.Lock()
+        write_latencies, read_latencies = [], []
+        errors = {'write': [], 'read': []}
+        deadline = time.monotonic() + options['seconds']
+        start_barrier = threading.Barrier(writers + readers)
+
+        def record(kind, latency=None, error=None):
+            with lock:
+                if error is not None:
+                    errors[kind].append(error)
+                else:
+                    (write_latencies if kind == 'write' else read_latencies).append(latency)
+
+        def writer(user_id, peer_id, goal_id, channel_id):
+            day = date(2000, 1, 1)
+            start_barrier.wait()
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        # 与打卡接口相同的写入：打卡 + 统计更新（信号）+ 任务入队，再发一条消息
+                        with write_context():
+                            checkin = CheckIn.objects.create(user_id=user_id, goal_id=goal_id, check_in_date=day)
+                            jobs.enqueue('motivational_message', {'checkin_id': checkin.id})
+                        with write_context():
+                            Message.objects.create(message='打卡完成', from_user_id=user_id, to_user_id=peer_id,
+                                                   channel_id=channel_id)
+                    except OperationalError as e:
+                        record('write', error=str(e))
+                    else:
+                        record('write', time.perf_counter() - started)
+                    day += timedelta(days=1)
+            finally:
+                connections.close_all()
+
+        def reader(index):
+            user_id, _, goal_id, channel_id = fixtures[index % len(fixtures)]
+            start_barrier.wait()
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        list(GoalStreak.objects.filter(user_id=user_id))
+                        list(Message.objects.filter(channel_id=channel_id).order_by('-created_at', '-id')[:50])
+                        CheckIn.objects.filter(goal_id=goal_id).count()
+                    except OperationalError as e:
+                        record('read', error=str(e))
+                    else:
+                        record('read', time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=writer, args=fixture) for fixture in fixtures[:writers]]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'profile': 'default' if options['default_profile'] else 'production',
+            'write_lock': not options['no_write_lock'],
+            'pragmas': pragmas,
+            'writers': writers,
+            'readers': readers,
+            'seconds': round(elapsed, 2),
+            'write_ops': len(write_latencies),
+            'writes_per_second': round(len(write_latencies) / elapsed, 1),
+            'lock_errors': len(errors['write']),
+            'write_p50_ms': percentile(write_latencies, 50),
+            'write_p95_ms': percentile(write_latencies, 95),
+            'write_p99_ms': percentile(write_latencies, 99),
+            'read_ops': len(read_latencies),
+            'read_errors': len(errors['read']),
+            'read_p50_ms': percentile(read_latencies, 50),
+            'read_p95_ms': percentile(read_latencies, 95),
+            'sample_errors': sorted(set(errors['write'] + errors['read']))[:5],
+        }
@@ -0,0 +1,202 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from django.db.backends.signals import connection_created
+
+# 请求延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class RequestTimings:
+    """一次请求内各阶段的累计耗时和AI兜底原因
+
+    并发执行的阶段（如批量提醒中并行的AI调用）按各自耗时累加，可能超过请求总耗时。
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, list] = {}
+        self.fallback_reasons = []
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            totals = self.phases.setdefault(phase, [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def add_fallback(self, reason: str):
+        with self._lock:
+            if reason not in self.fallback_reasons:
+                self.fallback_reasons.append(reason)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self, total: float) -> str:
+        """生成 Server-Timing 响应头"""
+        with self._lock:
+            phases = {name: tuple(values) for name, values in self.phases.items()}
+            reasons = list(self.fallback_reasons)
+        parts = []
+        for name, (seconds, count) in phases.items():
+            desc = f'{count} queries' if name == 'db' else f'{count} calls'
+            parts.append(f'{name};dur={seconds * 1000:.1f};desc="{desc}"')
+        if reasons:
+            parts.append(f'ai-fallback;desc="{",".join(reasons)}"')
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar('request_timings', default=None)
+
+
+def start_request() -> Tuple[RequestTimings, contextvars.Token]:
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end_request(token: contextvars.Token):
+    _current.reset(token)
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+@contextmanager
+def timed(phase: str):
+    """统计代码块耗时，计入当前请求的某个阶段；不在请求中时什么都不做"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+def record_fallback(reason: str):
+    """记录AI生成使用本地兜底的原因"""
+    registry.count_fallback(reason)
+    timings = _current.get()
+    if timings is not None:
+        timings.add_fallback(reason)
+
+
+def sql_timer(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - started)
+
+
+def install_sql_timer(sender, connection, **kwargs):
+    """每个新建的数据库连接都挂上SQL计时；请求上下文通过 contextvars 传递，sync_to_async 的线程中同样有效"""
+    if sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_timer)
+
+
+connection_created.connect(install_sql_timer, dispatch_uid='chat.metrics.install_sql_timer')
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class MetricsRegistry:
+    """进程内的请求指标：按视图名汇总的延迟直方图、各阶段耗时、SQL查询数以及AI兜底次数"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (视图, 方法) -> [各桶计数..., +Inf计数], 总耗时
+            self.histograms = defaultdict(lambda: [[0] * (len(self.buckets) + 1), 0.0])
+            self.responses = defaultdict(int)  # (视图, 方法, 状态码)
+            self.phase_seconds = defaultdict(float)  # (视图, 阶段)
+            self.queries = defaultdict(int)  # 视图
+            self.fallbacks = defaultdict(int)  # 原因
+
+    def observe(self, view: str, method: str, status: int, seconds: float, timings: RequestTimings):
+        with timings._lock:
+            phases = {name: tuple(values) for name, values in timings.phases.items()}
+        with self._lock:
+            histogram = self.histograms[(view, method)]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            else:
+                histogram[0][-1] += 1
+            histogram[1] += seconds
+            self.responses[(view, method, str(status))] += 1
+            for name, (phase_seconds, count) in phases.items():
+                self.phase_seconds[(view, name)] += phase_seconds
+                if name == 'db':
+                    self.queries[view] += count
+
+    def count_fallback(self, reason: str):
+        with self._lock:
+            self.fallbacks[reason] += 1
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        with self._lock:
+            histograms = {key: (list(counts), total) for key, (counts, total) in self.histograms.items()}
+            responses = dict(self.responses)
+            phase_seconds = dict(self.phase_seconds)
+            queries = dict(self.queries)
+            fallbacks = dict(self.fallbacks)
+
+        lines = ['# HELP chat_request_duration_seconds 请求处理耗时（到视图返回响应为止）',
+                 '# TYPE chat_request_duration_seconds histogram']
+        for (view, method), (counts, total) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'chat_request_duration_seconds_bucket{_labels(view=view, method=method, le=le)} {cumulative}')
+            lines.append(f'chat_request_duration_seconds_sum{_labels(view=view, method=method)} {total:.6f}')
+            lines.append(f'chat_request_duration_seconds_count{_labels(view=view, method=method)} {cumulative}')
+
+        lines += ['# HELP chat_responses_total 按状态码统计的响应数', '# TYPE chat_responses_total counter']
+        for (view, method, status), count in sorted(responses.items()):
+            lines.append(f'chat_responses_total{_labels(view=view, method=method, status=status)} {count}')
+
+        lines += ['# HELP chat_request_phase_seconds_total 请求中各阶段（SQL、情感分析、提示词填充、AI生成）的累计耗时',
+                  '# TYPE chat_request_phase_seconds_total counter']
+        for (view, phase), seconds in sorted(phase_seconds.items()):
+            lines.append(f'chat_request_phase_seconds_total{_labels(view=view, phase=phase)} {seconds:.6f}')
+
+        lines += ['# HELP chat_sql_queries_total 请求中执行的SQL查询数', '# TYPE chat_sql_queries_total counter']
+        for view, count in sorted(queries.items()):
+            lines.append(f'chat_sql_queries_total{_labels(view=view)} {count}')
+
+        lines += ['# HELP chat_ai_fallback_total AI生成使用本地兜底的次数', '# TYPE chat_ai_fallback_total counter']
+        for reason, count in sorted(fallbacks.items()):
+            lines.append(f'chat_ai_fallback_total{_labels(reason=reason)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+# 进程内共享的指标（多进程部署时每个进程各自统计）
+registry = MetricsRegistry()
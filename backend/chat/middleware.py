@@ -0,0 +1,46 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class PerformanceMiddleware:
+    """记录每个请求的SQL、情感分析、提示词填充和AI生成耗时
+
+    结果写入 Server-Timing 响应头，并按视图名汇总到 /api/metrics。
+    流式响应只统计到视图返回为止，响应体的生成不计入。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = timings.elapsed()
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        response['Server-Timing'] = timings.server_timing(total)
+        metrics.registry.observe(view, request.method, response.status_code, total, timings)
+        return response
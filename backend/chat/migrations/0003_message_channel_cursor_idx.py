@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_prompttemplate_message_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['channel', 'created_at', 'id'], name='message_channel_cursor_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_streaks(apps, schema_editor):
+    from chat.streaks import compute_streak_state
+
+    CheckIn = apps.get_model('chat', 'CheckIn')
+    GoalStreak = apps.get_model('chat', 'GoalStreak')
+    rows = CheckIn.objects.order_by('user_id', 'goal_id', 'check_in_date').values_list(
+        'user_id', 'goal_id', 'check_in_date'
+    )
+    streaks, key, dates = [], None, []
+    for user_id, goal_id, check_in_date in rows.iterator(chunk_size=1000):
+        if (user_id, goal_id) != key:
+            if key is not None:
+                streaks.append(GoalStreak(user_id=key[0], goal_id=key[1], **compute_streak_state(dates)))
+            key, dates = (user_id, goal_id), []
+        dates.append(check_in_date)
+    if key is not None:
+        streaks.append(GoalStreak(user_id=key[0], goal_id=key[1], **compute_streak_state(dates)))
+    GoalStreak.objects.bulk_create(streaks, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_channel_cursor_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoalStreak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_streak', models.IntegerField(default=0)),
+                ('longest_streak', models.IntegerField(default=0)),
+                ('last_check_in_date', models.DateField(blank=True, null=True)),
+                ('total_checkins', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='streaks', to='chat.goal')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='goal_streaks', to='chat.user')),
+            ],
+            options={
+                'unique_together': {('user', 'goal')},
+            },
+        ),
+        migrations.RunPython(backfill_streaks, migrations.RunPython.noop),
+    ]
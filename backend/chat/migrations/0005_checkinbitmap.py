@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_bitmaps(apps, schema_editor):
+    from chat.bitmaps import day_index, encode_bits
+
+    CheckIn = apps.get_model('chat', 'CheckIn')
+    CheckInBitmap = apps.get_model('chat', 'CheckInBitmap')
+    years = {}
+    rows = CheckIn.objects.values_list('user_id', 'goal_id', 'check_in_date')
+    for user_id, goal_id, check_in_date in rows.iterator(chunk_size=1000):
+        key = (user_id, goal_id, check_in_date.year)
+        years[key] = years.get(key, 0) | 1 << day_index(check_in_date)
+    CheckInBitmap.objects.bulk_create([
+        CheckInBitmap(user_id=user_id, goal_id=goal_id, year=year, bits=encode_bits(bits))
+        for (user_id, goal_id, year), bits in years.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_goalstreak'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckInBitmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('bits', models.BinaryField(max_length=46)),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkin_bitmaps', to='chat.goal')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkin_bitmaps', to='chat.user')),
+            ],
+            options={
+                'unique_together': {('user', 'goal', 'year')},
+            },
+        ),
+        migrations.RunPython(backfill_bitmaps, migrations.RunPython.noop),
+    ]
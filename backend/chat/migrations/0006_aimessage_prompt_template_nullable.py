@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_checkinbitmap'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aimessage',
+            name='prompt_template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='chat.prompttemplate'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_aijob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aimessage',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='aimessage_user_cursor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='checkin',
+            index=models.Index(fields=['user', 'check_in_date', 'id'], name='checkin_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['created_at', 'id'], name='message_cursor_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_prompttemplate_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reminder_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['timezone', 'reminder_time'], name='user_reminder_bucket_idx'),
+        ),
+        migrations.AddField(
+            model_name='scheduledreminder',
+            name='ai_message',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chat.aimessage'),
+        ),
+        migrations.AddField(
+            model_name='scheduledreminder',
+            name='goal',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_reminders', to='chat.goal'),
+        ),
+        migrations.AddField(
+            model_name='scheduledreminder',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_reminders', to='chat.user'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='scheduledreminder',
+            unique_together={('goal', 'reminder_date')},
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:30
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _intern(ContentBlob, contents):
+    by_digest = {hashlib.sha256(content.encode('utf-8')).hexdigest(): content for content in set(contents)}
+    ids = dict(ContentBlob.objects.filter(digest__in=list(by_digest)).values_list('digest', 'id'))
+    missing = [digest for digest in by_digest if digest not in ids]
+    ContentBlob.objects.bulk_create([
+        ContentBlob(digest=digest, content=by_digest[digest], size=len(by_digest[digest].encode('utf-8')))
+        for digest in missing
+    ])
+    ids.update(ContentBlob.objects.filter(digest__in=missing).values_list('digest', 'id'))
+    return {content: ids[digest] for digest, content in by_digest.items()}
+
+
+def move_contents_to_blobs(apps, schema_editor):
+    AIMessage = apps.get_model('chat', 'AIMessage')
+    ContentBlob = apps.get_model('chat', 'ContentBlob')
+    last_id = 0
+    while True:
+        batch = list(AIMessage.objects.filter(id__gt=last_id).order_by('id').only(
+            'id', 'filled_prompt', 'context_data'
+        )[:1000])
+        if not batch:
+            break
+        contexts = {
+            message.id: json.dumps(message.context_data or {}, ensure_ascii=False, sort_keys=True,
+                                   separators=(',', ':'))
+            for message in batch
+        }
+        ids = _intern(ContentBlob, [message.filled_prompt for message in batch] + list(contexts.values()))
+        for message in batch:
+            message.prompt_blob_id = ids[message.filled_prompt]
+            message.context_blob_id = ids[contexts[message.id]]
+        AIMessage.objects.bulk_update(batch, ['prompt_blob', 'context_blob'])
+        last_id = batch[-1].id
+
+
+def restore_inline_contents(apps, schema_editor):
+    AIMessage = apps.get_model('chat', 'AIMessage')
+    for message in AIMessage.objects.select_related('prompt_blob', 'context_blob').iterator(chunk_size=1000):
+        message.filled_prompt = message.prompt_blob.content if message.prompt_blob_id else ''
+        message.context_data = json.loads(message.context_blob.content) if message.context_blob_id else {}
+        message.save(update_fields=['filled_prompt', 'context_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_scheduledreminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('content', models.TextField()),
+                ('size', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='aimessage',
+            name='context_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='chat.contentblob'),
+        ),
+        migrations.AddField(
+            model_name='aimessage',
+            name='prompt_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='chat.contentblob'),
+        ),
+        migrations.RunPython(move_contents_to_blobs, restore_inline_contents),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_contentblob'),
+    ]
+
+    operations = [
+        # 先加默认值，回滚时才能为已有数据重新添加该列
+        migrations.AlterField(
+            model_name='aimessage',
+            name='filled_prompt',
+            field=models.TextField(default=''),
+        ),
+        migrations.RemoveField(
+            model_name='aimessage',
+            name='context_data',
+        ),
+        migrations.RemoveField(
+            model_name='aimessage',
+            name='filled_prompt',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:44
+
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_directory_index(apps, schema_editor):
+    """为已有用户填充归一化用户名和三字母组索引（与 chat.directory 的规则一致）"""
+    User = apps.get_model('chat', 'User')
+    UserTrigram = apps.get_model('chat', 'UserTrigram')
+    last_id = 0
+    while True:
+        users = list(User.objects.filter(id__gt=last_id).order_by('id')[:1000])
+        if not users:
+            break
+        rows = []
+        for user in users:
+            user.username_key = unicodedata.normalize('NFKC', user.username or '').casefold()
+            key = user.username_key
+            rows += [UserTrigram(user_id=user.id, trigram=gram) for gram in {key[i:i + 3] for i in range(len(key) - 2)}]
+        User.objects.bulk_update(users, ['username_key'])
+        UserTrigram.objects.bulk_create(rows)
+        last_id = users[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_remove_aimessage_inline_contents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='username_key',
+            field=models.CharField(db_index=True, default='', max_length=150),
+        ),
+        migrations.CreateModel(
+            name='UserTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='chat.user')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trigram', 'user'), name='unique_user_trigram')],
+            },
+        ),
+        migrations.RunPython(build_directory_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+def merge_duplicate_channels(apps, schema_editor):
+    """按用户对（顺序无关）合并重复频道：保留最早创建的一个，其余频道的消息移过去后删除"""
+    Channel = apps.get_model('chat', 'Channel')
+    Message = apps.get_model('chat', 'Message')
+    keep = {}
+    duplicates = {}
+    for channel_id, from_user_id, to_user_id in Channel.objects.order_by('id').values_list('id', 'from_user_id', 'to_user_id'):
+        low, high = sorted((from_user_id, to_user_id))
+        key = f"{low}:{high}"
+        if key in keep:
+            duplicates.setdefault(keep[key], []).append(channel_id)
+        else:
+            keep[key] = channel_id
+
+    for channel_id, merged_ids in duplicates.items():
+        Message.objects.filter(channel_id__in=merged_ids).update(channel_id=channel_id)
+        Channel.objects.filter(id__in=merged_ids).delete()
+
+    channels = list(Channel.objects.only('id'))
+    ids = {channel_id: key for key, channel_id in keep.items()}
+    for channel in channels:
+        channel.pair_key = ids[channel.id]
+    Channel.objects.bulk_update(channels, ['pair_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_user_directory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='pair_key',
+            field=models.CharField(editable=False, max_length=41, null=True),
+        ),
+        migrations.RunPython(merge_duplicate_channels, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='channel',
+            name='pair_key',
+            field=models.CharField(editable=False, max_length=41, unique=True),
+        ),
+    ]
@@ -1,11 +1,20 @@
 from django.db import models
 from django.utils import timezone
+from typing import Dict, Iterable
+import hashlib
 import json
+import unicodedata
 
 # Create your models here.
 
+def normalize_username(username: str) -> str:
+    """用户目录搜索使用的键：全半角统一并忽略大小写"""
+    return unicodedata.normalize('NFKC', username or '').casefold()
+
+
 class User(models.Model):
     username = models.CharField(max_length=50, unique=True)
+    username_key = models.CharField(max_length=150, default='', db_index=True)  # 归一化的用户名，用于前缀搜索
     password = models.CharField(max_length=128)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -13,13 +22,58 @@ class User(models.Model):
     reminder_time = models.TimeField(default='09:00:00')  # 每日提醒时间
     timezone = models.CharField(max_length=50, default='Asia/Shanghai')
     
+    class Meta:
+        indexes = [
+            # 定时提醒调度按 (时区, 提醒时间) 查找到点的用户
+            models.Index(fields=['timezone', 'reminder_time'], name='user_reminder_bucket_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.username_key = normalize_username(self.username)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'username' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'username_key'}
+        super().save(*args, **kwargs)
+    
+    @property
+    def is_authenticated(self) -> bool:
+        """供DRF权限判断使用：通过令牌认证得到的User即为已登录"""
+        return True
+    
     def __str__(self):
         return self.username
 
+class UserTrigram(models.Model):
+    """用户名的三字母组倒排索引，支持用户目录的子串搜索"""
+    user = models.ForeignKey(User, related_name='trigrams', on_delete=models.CASCADE)
+    trigram = models.CharField(max_length=3)
+    
+    class Meta:
+        constraints = [
+            # 同时作为按 (三字母组, 用户ID) 顺序扫描的索引
+            models.UniqueConstraint(fields=['trigram', 'user'], name='unique_user_trigram'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.trigram}"
+
+
+def channel_pair_key(user_a_id: int, user_b_id: int) -> str:
+    """两个用户之间频道的规范键，与顺序无关"""
+    low, high = sorted((int(user_a_id), int(user_b_id)))
+    return f"{low}:{high}"
+
+
 class Channel(models.Model):
     name = models.CharField(max_length=60)
     from_user = models.ForeignKey(User, related_name='channels_from', on_delete=models.CASCADE)
     to_user = models.ForeignKey(User, related_name='channels_to', on_delete=models.CASCADE)
+    # 唯一索引保证每对用户只有一个频道，并发创建时由数据库拒绝重复
+    pair_key = models.CharField(max_length=41, unique=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.pair_key = channel_pair_key(self.from_user_id, self.to_user_id)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -35,6 +89,14 @@ class Message(models.Model):
     sentiment_score = models.FloatField(null=True, blank=True)  # 情感分数 (-1到1)
     sentiment_label = models.CharField(max_length=20, null=True, blank=True)  # 情感标签
     
+    class Meta:
+        indexes = [
+            # 支持按频道的游标分页（after_id / before_id / since）
+            models.Index(fields=['channel', 'created_at', 'id'], name='message_channel_cursor_idx'),
+            # 支持消息列表接口的游标分页
+            models.Index(fields=['created_at', 'id'], name='message_cursor_idx'),
+        ]
+    
     def __str__(self):
         return str(self.message)[:20]
 
@@ -63,10 +125,43 @@ class CheckIn(models.Model):
     
     class Meta:
         unique_together = ['user', 'goal', 'check_in_date']  # 同一天同一目标只能打卡一次
+        indexes = [
+            # 支持按用户的打卡记录游标分页
+            models.Index(fields=['user', 'check_in_date', 'id'], name='checkin_user_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.goal.title} - {self.check_in_date}"
 
+class GoalStreak(models.Model):
+    """目标连续打卡统计，随打卡写入增量维护（见 chat/streaks.py）"""
+    user = models.ForeignKey(User, related_name='goal_streaks', on_delete=models.CASCADE)
+    goal = models.ForeignKey(Goal, related_name='streaks', on_delete=models.CASCADE)
+    current_streak = models.IntegerField(default=0)  # 截至最后打卡日的连续天数
+    longest_streak = models.IntegerField(default=0)  # 历史最长连续天数
+    last_check_in_date = models.DateField(null=True, blank=True)  # 最后打卡日期
+    total_checkins = models.IntegerField(default=0)  # 累计打卡次数
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'goal']
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.goal_id} - {self.current_streak}"
+
+class CheckInBitmap(models.Model):
+    """按年存储的打卡位图，每天一位（见 chat/bitmaps.py）"""
+    user = models.ForeignKey(User, related_name='checkin_bitmaps', on_delete=models.CASCADE)
+    goal = models.ForeignKey(Goal, related_name='checkin_bitmaps', on_delete=models.CASCADE)
+    year = models.IntegerField()
+    bits = models.BinaryField(max_length=46)  # 366位，第 n 位表示当年第 n+1 天
+    
+    class Meta:
+        unique_together = ['user', 'goal', 'year']
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.goal_id} - {self.year}"
+
 class PromptTemplate(models.Model):
     """AI提示词模板"""
     name = models.CharField(max_length=100)  # 模板名称
@@ -74,20 +169,176 @@ class PromptTemplate(models.Model):
     template_content = models.TextField()  # 模板内容
     variables = models.JSONField(default=list)  # 模板变量列表
     is_active = models.BooleanField(default=True)
+    version = models.PositiveIntegerField(default=1)  # 每次修改递增，用于编译缓存失效
     created_at = models.DateTimeField(auto_now_add=True)
     
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'version'}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return self.name
 
+class ContentBlob(models.Model):
+    """按内容哈希去重存储的大文本（提示词全文、上下文JSON），被 AIMessage 引用"""
+    digest = models.CharField(max_length=64, unique=True)  # 内容的 sha256
+    content = models.TextField()
+    size = models.IntegerField(default=0)  # 内容的UTF-8字节数
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    @staticmethod
+    def digest_of(content: str) -> str:
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def intern_many(cls, contents: Iterable[str]) -> Dict[str, int]:
+        """返回 {内容: blob ID}，已存在的内容直接复用，其余批量插入"""
+        by_digest = {cls.digest_of(content): content for content in set(contents)}
+        if not by_digest:
+            return {}
+        ids = dict(cls.objects.filter(digest__in=list(by_digest)).values_list('digest', 'id'))
+        missing = [digest for digest in by_digest if digest not in ids]
+        if missing:
+            cls.objects.bulk_create([
+                cls(digest=digest, content=by_digest[digest], size=len(by_digest[digest].encode('utf-8')))
+                for digest in missing
+            ], ignore_conflicts=True)
+            ids.update(cls.objects.filter(digest__in=missing).values_list('digest', 'id'))
+        return {content: ids[digest] for digest, content in by_digest.items()}
+    
+    def __str__(self):
+        return self.digest[:12]
+
+def dump_context(data) -> str:
+    """上下文数据的规范JSON表示，相同内容得到相同的哈希"""
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+class AIMessageQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        AIMessage.store_contents(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
 class AIMessage(models.Model):
-    """AI生成的消息记录"""
+    """AI生成的消息记录
+
+    提示词全文和上下文数据按内容去重存放在 ContentBlob 中，
+    通过 filled_prompt / context_data 属性读写，保存时自动写入。
+    """
     user = models.ForeignKey(User, related_name='ai_messages', on_delete=models.CASCADE)
     goal = models.ForeignKey(Goal, related_name='ai_messages', on_delete=models.CASCADE)
-    prompt_template = models.ForeignKey(PromptTemplate, on_delete=models.CASCADE)
-    filled_prompt = models.TextField()  # 填充后的提示词
+    prompt_template = models.ForeignKey(PromptTemplate, null=True, blank=True, on_delete=models.CASCADE)  # 提醒消息不使用模板
+    prompt_blob = models.ForeignKey(ContentBlob, null=True, blank=True, related_name='+', on_delete=models.PROTECT)  # 填充后的提示词
     ai_response = models.TextField()  # AI回复内容
-    context_data = models.JSONField(default=dict)  # 上下文数据
+    context_blob = models.ForeignKey(ContentBlob, null=True, blank=True, related_name='+', on_delete=models.PROTECT)  # 上下文数据
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = AIMessageQuerySet.as_manager()
+    
+    # 尚未写入 ContentBlob 的内容，以及读取后的缓存
+    _filled_prompt = None
+    _context_data = None
+    _contents_dirty = False
+    
+    class Meta:
+        indexes = [
+            # 支持按用户的AI消息游标分页
+            models.Index(fields=['user', 'created_at', 'id'], name='aimessage_user_cursor_idx'),
+        ]
+    
+    @property
+    def filled_prompt(self) -> str:
+        if self._filled_prompt is None:
+            self._filled_prompt = self.prompt_blob.content if self.prompt_blob_id else ''
+        return self._filled_prompt
+    
+    @filled_prompt.setter
+    def filled_prompt(self, value: str):
+        self._filled_prompt = value or ''
+        self._contents_dirty = True
+    
+    @property
+    def context_data(self) -> dict:
+        if self._context_data is None:
+            self._context_data = json.loads(self.context_blob.content) if self.context_blob_id else {}
+        return self._context_data
+    
+    @context_data.setter
+    def context_data(self, value: dict):
+        self._context_data = value if value is not None else {}
+        self._contents_dirty = True
+    
+    @classmethod
+    def store_contents(cls, messages: Iterable['AIMessage']):
+        """把待保存的提示词和上下文批量写入 ContentBlob 并设置引用"""
+        dirty = [message for message in messages if message._contents_dirty]
+        if not dirty:
+            return
+        contexts = {id(message): dump_context(message.context_data) for message in dirty}
+        ids = ContentBlob.intern_many([message.filled_prompt for message in dirty] + list(contexts.values()))
+        for message in dirty:
+            message.prompt_blob_id = ids[message.filled_prompt]
+            message.context_blob_id = ids[contexts[id(message)]]
+            message._contents_dirty = False
+    
+    def save(self, *args, **kwargs):
+        if self._contents_dirty:
+            AIMessage.store_contents([self])
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'prompt_blob', 'context_blob'}
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"AI Message for {self.user.username} - {self.created_at}"
+
+class AIJob(models.Model):
+    """后台AI生成任务，基于数据库表的持久化队列（见 chat/jobs.py）"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待中'),
+        (STATUS_RUNNING, '执行中'),
+        (STATUS_DONE, '已完成'),
+        (STATUS_FAILED, '失败'),
+    ]
+    
+    kind = models.CharField(max_length=50)  # 任务类型，如 motivational_message
+    payload = models.JSONField(default=dict)  # 任务参数
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.IntegerField(default=0)  # 已执行次数
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)  # 最早执行时间（用于重试退避）
+    locked_at = models.DateTimeField(null=True, blank=True)  # 被工作进程领取的时间
+    result = models.JSONField(null=True, blank=True)  # 执行结果
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after', 'id'], name='aijob_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.id} ({self.status})"
+
+class ScheduledReminder(models.Model):
+    """调度器提前生成的每日提醒，每个目标每个本地日期最多一条（见 chat/scheduler.py）"""
+    user = models.ForeignKey(User, related_name='scheduled_reminders', on_delete=models.CASCADE)
+    goal = models.ForeignKey(Goal, related_name='scheduled_reminders', on_delete=models.CASCADE)
+    reminder_date = models.DateField()  # 用户本地日期
+    ai_message = models.ForeignKey(AIMessage, related_name='+', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ['goal', 'reminder_date']
+    
+    def __str__(self):
+        return f"{self.goal.title} - {self.reminder_date}"
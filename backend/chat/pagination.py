@@ -0,0 +1,108 @@
+import base64
+import json
+from typing import List, Optional, Sequence
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+
+class InvalidPageParameter(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = {'error': '分页参数无效'}
+
+
+def encode_cursor(values: Sequence) -> str:
+    """把排序键的值编码为不透明游标"""
+    raw = json.dumps(list(values), default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> List:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    if not isinstance(values, list):
+        raise ValueError(cursor)
+    return values
+
+
+def keyset_filter(queryset, ordering: Sequence[str], values: Sequence) -> Q:
+    """生成“排在游标之后”的条件，例如 (-created_at, -id) 对应
+    created_at < c OR (created_at = c AND id < i)"""
+    model = queryset.model
+    condition = Q()
+    equal = Q()
+    for field_spec, raw in zip(ordering, values):
+        name = field_spec.lstrip('-')
+        value = model._meta.get_field(name).to_python(raw)
+        lookup = 'lt' if field_spec.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+class KeysetPagination(BasePagination):
+    """基于排序键的游标分页：翻页代价与历史数据量无关
+
+    视图可通过 keyset_ordering 指定排序键，最后一个字段必须唯一（通常是 id）。
+    返回 {'next_cursor': ..., 'results': [...]}，没有下一页时 next_cursor 为 None。
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+
+    def __init__(self, ordering: Optional[Sequence[str]] = None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        self.next_cursor = None
+
+    def get_page_size(self, request) -> int:
+        value = request.query_params.get(self.page_size_query_param)
+        if value in (None, ''):
+            return self.page_size
+        try:
+            size = int(value)
+        except ValueError:
+            raise InvalidPageParameter({'error': 'limit参数无效'})
+        if size <= 0:
+            raise InvalidPageParameter({'error': 'limit参数无效'})
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'keyset_ordering', None) or self.ordering
+        page_size = self.get_page_size(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                values = decode_cursor(cursor)
+                if len(values) != len(ordering):
+                    raise ValueError(cursor)
+                queryset = queryset.filter(keyset_filter(queryset, ordering, values))
+            except (ValueError, TypeError, ValidationError):
+                raise InvalidPageParameter({'error': '分页游标无效'})
+
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            self.next_cursor = encode_cursor([getattr(last, f.lstrip('-')) for f in ordering])
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({'next_cursor': self.next_cursor, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,125 @@
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .models import PromptTemplate
+
+# 模板占位符：{变量名}
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+
+
+class TemplateCompileError(ValueError):
+    """模板声明的变量与内容中的占位符不一致"""
+
+
+class CompiledTemplate:
+    """编译后的提示词模板：预先切分为文本片段和变量，渲染时只做一次拼接"""
+
+    def __init__(self, template_id: int, name: str, version: int, content: str, variables: List[str]):
+        self.template_id = template_id
+        self.name = name
+        self.version = version
+        self.variables = list(variables)
+        self._segments: List[Tuple[str, Optional[str]]] = []
+        position = 0
+        for match in PLACEHOLDER_PATTERN.finditer(content):
+            self._segments.append((content[position:match.start()], match.group(1)))
+            position = match.end()
+        self._tail = content[position:]
+
+    def render(self, context: Dict[str, Any]) -> str:
+        """填充模板；上下文中缺少的变量保留原占位符"""
+        parts = []
+        for literal, variable in self._segments:
+            parts.append(literal)
+            if variable in context:
+                parts.append(str(context[variable]))
+            else:
+                parts.append(f"{{{variable}}}")
+        parts.append(self._tail)
+        return ''.join(parts)
+
+
+def validate_template(content: str, variables: List[str]):
+    """检查声明的变量与模板中的占位符是否一致"""
+    placeholders = set(PLACEHOLDER_PATTERN.findall(content or ''))
+    declared = set(variables or [])
+    undeclared = placeholders - declared
+    unused = declared - placeholders
+    errors = []
+    if undeclared:
+        errors.append(f"模板中的占位符未声明: {', '.join(sorted(undeclared))}")
+    if unused:
+        errors.append(f"声明的变量未在模板中使用: {', '.join(sorted(unused))}")
+    if errors:
+        raise TemplateCompileError('；'.join(errors))
+
+
+def compile_template(template: PromptTemplate) -> CompiledTemplate:
+    validate_template(template.template_content, template.variables)
+    return CompiledTemplate(template.id, template.name, template.version,
+                            template.template_content, template.variables)
+
+
+class PromptRegistry:
+    """编译后模板的进程内缓存
+
+    按 (模板ID, 版本) 缓存编译结果，按名称缓存当前生效的模板。
+    本进程内的修改通过模型信号立即失效；其他进程中的修改在
+    revalidate_seconds 后通过一次轻量的版本查询发现。
+    """
+
+    def __init__(self, revalidate_seconds: float = 60):
+        self.revalidate_seconds = revalidate_seconds
+        self._compiled: Dict[Tuple[int, int], CompiledTemplate] = {}
+        self._active: Dict[str, Tuple[Optional[CompiledTemplate], float]] = {}
+        self._lock = threading.Lock()
+
+    def compile(self, template: PromptTemplate) -> CompiledTemplate:
+        key = (template.id, template.version)
+        with self._lock:
+            compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = compile_template(template)
+            with self._lock:
+                self._compiled[key] = compiled
+        return compiled
+
+    def get(self, name: str) -> Optional[CompiledTemplate]:
+        """获取名称对应的生效模板，没有时返回 None"""
+        with self._lock:
+            entry = self._active.get(name)
+        if entry is not None:
+            compiled, checked_at = entry
+            if time.monotonic() - checked_at < self.revalidate_seconds:
+                return compiled
+            current = PromptTemplate.objects.filter(name=name, is_active=True).order_by('id').values_list(
+                'id', 'version'
+            ).first()
+            if compiled is not None and current == (compiled.template_id, compiled.version):
+                with self._lock:
+                    self._active[name] = (compiled, time.monotonic())
+                return compiled
+
+        template = PromptTemplate.objects.filter(name=name, is_active=True).order_by('id').first()
+        compiled = self.compile(template) if template else None
+        with self._lock:
+            self._active[name] = (compiled, time.monotonic())
+        return compiled
+
+    def invalidate(self, name: Optional[str] = None, template_id: Optional[int] = None):
+        with self._lock:
+            if name is None:
+                self._active.clear()
+            else:
+                self._active.pop(name, None)
+            if template_id is not None:
+                for key in [key for key in self._compiled if key[0] == template_id]:
+                    del self._compiled[key]
+
+
+# 进程内共享的模板注册表
+prompt_registry = PromptRegistry(revalidate_seconds=getattr(settings, 'PROMPT_TEMPLATE_REVALIDATE_SECONDS', 60))
@@ -0,0 +1,131 @@
+import contextvars
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from . import metrics
+from .db import write_transaction
+from .models import AIMessage, CheckIn, Goal, ScheduledReminder, User
+
+# 所有请求共享的AI调用线程池，限制对上游的并发数
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'AI_REMINDER_MAX_WORKERS', 4),
+    thread_name_prefix='ai-reminder',
+)
+
+
+def checked_goal_ids(goal_ids: Iterable[int], today: date) -> set:
+    """一次查询得到今天已打卡的目标ID"""
+    return set(CheckIn.objects.filter(
+        goal_id__in=list(goal_ids), check_in_date=today
+    ).values_list('goal_id', flat=True))
+
+
+def recent_checkin_dates(goal_ids: Iterable[int], per_goal: int = 3) -> Dict[int, List[date]]:
+    """一次查询得到每个目标最近 per_goal 次打卡日期（降序）"""
+    rows = CheckIn.objects.filter(goal_id__in=list(goal_ids)).annotate(
+        rank=Window(RowNumber(), partition_by=[F('goal_id')], order_by=F('check_in_date').desc())
+    ).filter(rank__lte=per_goal).order_by('goal_id', '-check_in_date').values_list('goal_id', 'check_in_date')
+    result = defaultdict(list)
+    for goal_id, check_in_date in rows:
+        result[goal_id].append(check_in_date)
+    return result
+
+
+def pregenerated_reminders(goal_ids: Iterable[int], today: date) -> Dict[int, str]:
+    """一次查询得到调度器已为今天提前生成的提醒语"""
+    return dict(ScheduledReminder.objects.filter(
+        goal_id__in=list(goal_ids), reminder_date=today
+    ).values_list('goal_id', 'ai_message__ai_response'))
+
+
+def generate_goal_reminders(ai_service, pairs: List[Tuple[User, Goal]],
+                            budget: Optional[float] = None,
+                            call_timeout: Optional[float] = None) -> Dict[int, Tuple[AIMessage, bool]]:
+    """为 (用户, 目标) 列表并发生成提醒语，返回 {目标ID: (未保存的AIMessage, 是否使用兜底)}
+
+    超过整体时间预算仍未返回的目标使用本地生成的提醒语。
+    """
+    budget = budget if budget is not None else getattr(settings, 'AI_REMINDER_BUDGET_SECONDS', 8)
+    call_timeout = call_timeout if call_timeout is not None else getattr(settings, 'AI_CALL_TIMEOUT_SECONDS', 5)
+    deadline = time.monotonic() + budget
+
+    history = recent_checkin_dates([goal.id for _, goal in pairs])
+    prompts, futures = {}, {}
+    for user, goal in pairs:
+        with metrics.timed('prompt'):
+            prompts[goal.id] = ai_service.build_reminder_prompt(user, goal, history.get(goal.id, []))
+        # 带上当前上下文，线程池中的调用也计入本次请求的耗时统计
+        futures[goal.id] = _executor.submit(contextvars.copy_context().run, ai_service.call_free_ai_api,
+                                            prompts[goal.id][0], call_timeout)
+    if futures:
+        wait(futures.values(), timeout=max(0, deadline - time.monotonic()))
+
+    result = {}
+    for user, goal in pairs:
+        prompt, context_data = prompts[goal.id]
+        future = futures[goal.id]
+        ai_response = None
+        if future.done() and future.exception() is None:
+            ai_response = future.result()
+        else:
+            # 超出时间预算：放弃等待（线程池中的调用会自行超时结束）
+            metrics.record_fallback('error' if future.done() else 'budget_exceeded')
+            future.cancel()
+        fallback = not ai_response or len(ai_response) < 5
+        if fallback:
+            if ai_response is not None:
+                metrics.record_fallback('empty_response')
+            ai_response = ai_service.generate_local_response(prompt)
+        result[goal.id] = (AIMessage(
+            user=user,
+            goal=goal,
+            prompt_template=None,
+            filled_prompt=prompt,
+            ai_response=ai_response,
+            context_data=context_data,
+        ), fallback)
+    return result
+
+
+def generate_reminders(ai_service, user: User, goals: List[Goal], today: date,
+                       budget: Optional[float] = None, call_timeout: Optional[float] = None,
+                       persist: bool = True) -> List[dict]:
+    """批量生成目标提醒语
+
+    已打卡的目标直接返回祝贺语；调度器已提前生成的直接复用；其余未打卡的目标
+    并发调用AI，并受整体时间预算约束，保证接口在预算内返回。
+    """
+    goal_ids = [goal.id for goal in goals]
+    checked = checked_goal_ids(goal_ids, today)
+    pending_ids = [goal_id for goal_id in goal_ids if goal_id not in checked]
+    ready = pregenerated_reminders(pending_ids, today)
+    generated = generate_goal_reminders(
+        ai_service,
+        [(user, goal) for goal in goals if goal.id not in checked and goal.id not in ready],
+        budget=budget,
+        call_timeout=call_timeout,
+    )
+
+    result = []
+    for goal in goals:
+        item = {'goal_id': goal.id, 'title': goal.title, 'checked': goal.id in checked, 'fallback': False}
+        if item['checked']:
+            item['ai_reminder'] = f"太棒了，今天已经完成{goal.title}，继续保持！"
+        elif goal.id in ready:
+            item['ai_reminder'] = ready[goal.id]
+        else:
+            ai_message, item['fallback'] = generated[goal.id]
+            item['ai_reminder'] = ai_message.ai_response
+        result.append(item)
+
+    if persist and generated:
+        with write_transaction():
+            AIMessage.objects.bulk_create([ai_message for ai_message, _ in generated.values()])
+    return result
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Sum, Window
+from django.db.models.functions import RowNumber, TruncDate
+from django.utils import timezone
+
+from .models import AIMessage, ContentBlob
+
+# 新写入的blob在被引用之前可能短暂处于未引用状态，清理时跳过这段时间内创建的
+BLOB_GRACE_PERIOD = timedelta(hours=1)
+
+
+def space_report() -> Dict[str, Any]:
+    """AI消息及其内容存储的行数和字节数"""
+    blobs = ContentBlob.objects.aggregate(bytes=Sum('size'))
+    report = {
+        'ai_messages': AIMessage.objects.count(),
+        'blobs': ContentBlob.objects.count(),
+        'blob_bytes': blobs['bytes'] or 0,
+    }
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            values = []
+            for pragma in ('page_size', 'page_count', 'freelist_count'):
+                cursor.execute(f'PRAGMA {pragma}')
+                values.append(cursor.fetchone()[0])
+        page_size, page_count, free_pages = values
+        report['database_bytes'] = page_size * page_count
+        report['free_bytes'] = page_size * free_pages
+    return report
+
+
+def collapse_old_messages(before: datetime, batch_size: int = 1000, dry_run: bool = False) -> int:
+    """在 before 之前的AI消息中，每个 (用户, 目标, 日期) 只保留最新的一条，返回删除数量"""
+    duplicates = AIMessage.objects.filter(created_at__lt=before).annotate(
+        rank=Window(
+            RowNumber(),
+            partition_by=[F('user_id'), F('goal_id'), TruncDate('created_at')],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        )
+    ).filter(rank__gt=1).values_list('id', flat=True)
+    ids = list(duplicates)
+    if dry_run:
+        return len(ids)
+    for i in range(0, len(ids), batch_size):
+        with transaction.atomic():
+            AIMessage.objects.filter(id__in=ids[i:i + batch_size]).delete()
+    return len(ids)
+
+
+def drop_old_contexts(before: datetime, dry_run: bool = False) -> int:
+    """去掉 before 之前消息的上下文快照（只在排查近期问题时有用），返回更新数量"""
+    queryset = AIMessage.objects.filter(created_at__lt=before, context_blob__isnull=False)
+    if dry_run:
+        return queryset.count()
+    return queryset.update(context_blob=None)
+
+
+def delete_unreferenced_blobs(grace_period: timedelta = BLOB_GRACE_PERIOD, dry_run: bool = False) -> int:
+    """删除不再被任何AI消息引用的blob，返回删除数量"""
+    queryset = ContentBlob.objects.filter(created_at__lt=timezone.now() - grace_period).filter(
+        ~Exists(AIMessage.objects.filter(prompt_blob=OuterRef('pk'))),
+        ~Exists(AIMessage.objects.filter(context_blob=OuterRef('pk'))),
+    )
+    if dry_run:
+        return queryset.count()
+    deleted, _ = queryset.delete()
+    return deleted
+
+
+def compact(retain_days: int, drop_context_days: Optional[int] = None, dry_run: bool = False) -> Dict[str, int]:
+    """按保留策略压缩AI消息：合并旧消息、去掉旧上下文、清理未引用的内容"""
+    now = timezone.now()
+    result = {'collapsed_messages': collapse_old_messages(now - timedelta(days=retain_days), dry_run=dry_run)}
+    if drop_context_days is not None:
+        result['dropped_contexts'] = drop_old_contexts(now - timedelta(days=drop_context_days), dry_run=dry_run)
+    result['deleted_blobs'] = delete_unreferenced_blobs(dry_run=dry_run)
+    return result
+
+
+def vacuum():
+    """SQLite删除数据后文件不会自动变小，需要 VACUUM 归还空间"""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM')
@@ -0,0 +1,91 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone as django_timezone
+
+from . import reminders
+from .db import write_transaction
+from .models import AIMessage, CheckIn, Goal, ScheduledReminder, User
+
+
+def resolve_timezone(name: str) -> ZoneInfo:
+    """解析用户时区，无效时使用系统时区"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(settings.TIME_ZONE)
+
+
+def local_date(user: User, now: Optional[datetime] = None) -> date:
+    """用户所在时区的当前日期"""
+    now = now or django_timezone.now()
+    return now.astimezone(resolve_timezone(user.timezone)).date()
+
+
+def due_buckets(start: datetime, end: datetime) -> Dict[Tuple[str, date], List[int]]:
+    """找出提醒时间落在 [start, end) 内的用户，按 (时区, 本地日期) 分组
+
+    每个时区把时间窗口换算为本地时间后用 reminder_time 区间查询，
+    跨越本地午夜时拆成两段。窗口长度不能超过一天。
+    """
+    if end - start > timedelta(days=1):
+        raise ValueError('调度窗口不能超过一天')
+
+    buckets = defaultdict(list)
+    for tz_name in User.objects.order_by().values_list('timezone', flat=True).distinct():
+        tz = resolve_timezone(tz_name)
+        local_start, local_end = start.astimezone(tz), end.astimezone(tz)
+        if local_start.date() == local_end.date():
+            ranges = [(local_start.date(), local_start.time(), local_end.time())]
+        else:
+            ranges = [(local_start.date(), local_start.time(), None),
+                      (local_end.date(), time.min, local_end.time())]
+        for day, lower, upper in ranges:
+            users = User.objects.filter(timezone=tz_name, reminder_time__gte=lower)
+            if upper is not None:
+                users = users.filter(reminder_time__lt=upper)
+            buckets[(tz_name, day)].extend(users.values_list('id', flat=True))
+    return {key: user_ids for key, user_ids in buckets.items() if user_ids}
+
+
+def unchecked_goals(user_ids: List[int], day: date) -> List[Goal]:
+    """一次查询得到这些用户当天未打卡、且尚未生成提醒的激活目标"""
+    return list(Goal.objects.filter(user_id__in=user_ids, is_active=True).filter(
+        ~Exists(CheckIn.objects.filter(goal=OuterRef('pk'), check_in_date=day)),
+        ~Exists(ScheduledReminder.objects.filter(goal=OuterRef('pk'), reminder_date=day)),
+    ).select_related('user').order_by('id'))
+
+
+def dispatch(ai_service, start: datetime, end: datetime,
+             batch_size: Optional[int] = None, budget: Optional[float] = None) -> int:
+    """为提醒时间落在 [start, end) 内的用户提前生成当天的提醒，返回生成数量
+
+    已生成的目标会被跳过，因此窗口重叠或重复执行不会产生重复提醒。
+    同一时刻只应运行一个调度进程。
+    """
+    batch_size = batch_size or getattr(settings, 'REMINDER_DISPATCH_BATCH_SIZE', 50)
+    budget = budget if budget is not None else getattr(settings, 'REMINDER_DISPATCH_BUDGET_SECONDS', 60)
+
+    created = 0
+    for (_, day), user_ids in due_buckets(start, end).items():
+        goals = unchecked_goals(user_ids, day)
+        for i in range(0, len(goals), batch_size):
+            batch = goals[i:i + batch_size]
+            generated = reminders.generate_goal_reminders(
+                ai_service, [(goal.user, goal) for goal in batch], budget=budget
+            )
+            with write_transaction():
+                ai_messages = AIMessage.objects.bulk_create(
+                    [ai_message for ai_message, _ in generated.values()]
+                )
+                ScheduledReminder.objects.bulk_create([
+                    ScheduledReminder(user_id=ai_message.user_id, goal_id=ai_message.goal_id,
+                                      reminder_date=day, ai_message=ai_message)
+                    for ai_message in ai_messages
+                ], ignore_conflicts=True)
+            created += len(ai_messages)
+    return created
@@ -0,0 +1,201 @@
+import random
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from django.contrib.auth.hashers import make_password
+
+from . import bitmaps, directory, streaks
+from .models import AIMessage, Channel, CheckIn, Goal, Message, User, channel_pair_key, normalize_username
+
+# 生成的用户统一使用这个密码，方便登录压测
+SEED_PASSWORD = 'seed-password'
+
+GOAL_TITLES = ['每天阅读', '晨跑5公里', '学习英语', '冥想10分钟', '写代码', '练琴', '早睡早起', '喝8杯水']
+NOTES = ['状态不错', '有点累', '坚持下来了', '今天很忙', '感觉很棒', '差点忘了', '']
+MESSAGES = ['今天打卡了吗？', '我刚跑完步，感觉很好', '好累啊，不想动', '一起加油！', '明天早上一起跑步吧',
+            '这周坚持得不错', '今天状态很差', '哈哈，太棒了', '晚安', '你的目标完成了吗？']
+TIMEZONES = ['Asia/Shanghai', 'Asia/Shanghai', 'Asia/Shanghai', 'Asia/Tokyo', 'Europe/London', 'America/New_York']
+AI_RESPONSES = ['今天也要坚持哦，加油！', '太棒了，继续保持！', '每一天的坚持都算数。', '别放弃，你已经走了很远。']
+
+# 预设规模：用户数、每个用户的目标数、打卡覆盖的年数、每个用户的聊天频道数、每个频道的消息数、每个目标的AI消息数
+SCALES = {
+    'small': {'users': 50, 'goals_per_user': 3, 'years': 1, 'channels_per_user': 2,
+              'messages_per_channel': 100, 'ai_messages_per_goal': 10},
+    'medium': {'users': 500, 'goals_per_user': 3, 'years': 2, 'channels_per_user': 3,
+               'messages_per_channel': 300, 'ai_messages_per_goal': 30},
+    'large': {'users': 5000, 'goals_per_user': 3, 'years': 3, 'channels_per_user': 3,
+              'messages_per_channel': 1000, 'ai_messages_per_goal': 60},
+}
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """临时关闭 auto_now_add，让批量插入的记录使用指定的创建时间"""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def bulk_insert(model, objects: Iterable, batch_size: int) -> int:
+    """分批 bulk_create，避免一次性在内存中构造全部对象"""
+    total = 0
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch, batch_size=batch_size)
+            total += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch, batch_size=batch_size)
+        total += len(batch)
+    return total
+
+
+def random_moment(rng: random.Random, day: date, first_hour: int = 7, last_hour: int = 23) -> datetime:
+    return datetime.combine(day, time(rng.randint(first_hour, last_hour - 1), rng.randint(0, 59),
+                                      rng.randint(0, 59)), tzinfo=dt_timezone.utc)
+
+
+class Seeder:
+    """按规模生成逼真的测试数据
+
+    打卡按“连续打卡的概率更高”的方式生成，覆盖多年历史；消息和AI消息的创建时间分散在
+    整个时间范围内。全部通过 bulk_create 写入，不触发信号，结束后统一重建连续打卡统计和日历位图。
+    """
+
+    def __init__(self, users: int, goals_per_user: int, years: int, channels_per_user: int,
+                 messages_per_channel: int, ai_messages_per_goal: int, seed: int = 42,
+                 batch_size: int = 5000, today: Optional[date] = None,
+                 log: Optional[Callable[[str], None]] = None):
+        self.users = users
+        self.goals_per_user = goals_per_user
+        self.years = years
+        self.channels_per_user = channels_per_user
+        self.messages_per_channel = messages_per_channel
+        self.ai_messages_per_goal = ai_messages_per_goal
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.today = today or date.today()
+        self.start = self.today - timedelta(days=365 * years)
+        self.log = log or (lambda message: None)
+
+    def run(self) -> Dict[str, int]:
+        with explicit_timestamps(User._meta.get_field('created_at'), Goal._meta.get_field('created_at'),
+                                 CheckIn._meta.get_field('check_in_time'), Message._meta.get_field('created_at'),
+                                 AIMessage._meta.get_field('created_at')):
+            user_ids = self.create_users()
+            goals = self.create_goals(user_ids)
+            counts = {'users': len(user_ids), 'goals': len(goals)}
+            counts['checkins'] = bulk_insert(CheckIn, self.checkins(goals), self.batch_size)
+            self.log(f"打卡 {counts['checkins']}")
+            channels = self.create_channels(user_ids)
+            counts['channels'] = len(channels)
+            counts['messages'] = bulk_insert(Message, self.messages(channels), self.batch_size)
+            self.log(f"消息 {counts['messages']}")
+            counts['ai_messages'] = bulk_insert(AIMessage, self.ai_messages(goals), self.batch_size)
+            self.log(f"AI消息 {counts['ai_messages']}")
+        streaks.rebuild_all_streaks()
+        bitmaps.rebuild_all_bitmaps()
+        self.log('已重建连续打卡统计和日历位图')
+        return counts
+
+    def create_users(self) -> List[int]:
+        # 密码哈希很慢，所有用户共用一个
+        password = make_password(SEED_PASSWORD)
+        offset = User.objects.count()
+        users = [
+            User(username=f'seed_{offset + i}', username_key=normalize_username(f'seed_{offset + i}'),
+                 password=password, timezone=self.rng.choice(TIMEZONES),
+                 reminder_time=time(self.rng.randint(6, 22), self.rng.choice((0, 15, 30, 45))),
+                 created_at=random_moment(self.rng, self.start))
+            for i in range(self.users)
+        ]
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        directory.index_users(users, batch_size=self.batch_size)
+        self.log(f'用户 {len(users)}')
+        return [user.id for user in users]
+
+    def create_goals(self, user_ids: List[int]) -> List[Goal]:
+        goals = []
+        for user_id in user_ids:
+            for title in self.rng.sample(GOAL_TITLES, min(self.goals_per_user, len(GOAL_TITLES))):
+                goals.append(Goal(user_id=user_id, title=title, description=f'{title}，养成好习惯',
+                                  created_at=random_moment(self.rng, self.start)))
+        Goal.objects.bulk_create(goals, batch_size=self.batch_size)
+        self.log(f'目标 {len(goals)}')
+        return goals
+
+    def checkins(self, goals: List[Goal]) -> Iterator[CheckIn]:
+        days = (self.today - self.start).days
+        for goal in goals:
+            # 每个目标有自己的坚持程度；昨天打过卡的话今天更可能继续
+            diligence = self.rng.uniform(0.3, 0.9)
+            checked = False
+            for offset in range(days):
+                chance = min(0.97, diligence + 0.25) if checked else diligence * 0.6
+                checked = self.rng.random() < chance
+                if not checked:
+                    continue
+                day = self.start + timedelta(days=offset)
+                yield CheckIn(user_id=goal.user_id, goal_id=goal.id, check_in_date=day,
+                              check_in_time=random_moment(self.rng, day), notes=self.rng.choice(NOTES),
+                              mood_score=self.rng.randint(1, 10) if self.rng.random() < 0.8 else None)
+
+    def create_channels(self, user_ids: List[int]) -> List[Channel]:
+        # 频道按 (较小ID, 较大ID) 存储，与 request_chat 一致
+        pairs = set()
+        if len(user_ids) > 1:
+            for user_id in user_ids:
+                for _ in range(self.channels_per_user):
+                    peer_id = self.rng.choice(user_ids)
+                    if peer_id != user_id:
+                        pairs.add((min(user_id, peer_id), max(user_id, peer_id)))
+        channels = [Channel(name=f'seed_{a}-seed_{b}', from_user_id=a, to_user_id=b, pair_key=channel_pair_key(a, b))
+                    for a, b in sorted(pairs)]
+        Channel.objects.bulk_create(channels, batch_size=self.batch_size)
+        self.log(f'频道 {len(channels)}')
+        return channels
+
+    def messages(self, channels: List[Channel]) -> Iterator[Message]:
+        start = datetime.combine(self.start, time(), tzinfo=dt_timezone.utc)
+        span = (self.today - self.start).days * 86400
+        for channel in channels:
+            moments = sorted(self.rng.randrange(span) for _ in range(self.messages_per_channel))
+            for second in moments:
+                sender, receiver = channel.from_user_id, channel.to_user_id
+                if self.rng.random() < 0.5:
+                    sender, receiver = receiver, sender
+                score = round(self.rng.uniform(-1, 1), 3)
+                yield Message(message=self.rng.choice(MESSAGES), from_user_id=sender, to_user_id=receiver,
+                              channel_id=channel.id, created_at=start + timedelta(seconds=second),
+                              sentiment_score=score,
+                              sentiment_label='positive' if score > 0.1 else 'negative' if score < -0.1 else 'neutral')
+
+    def ai_messages(self, goals: List[Goal]) -> Iterator[AIMessage]:
+        days = (self.today - self.start).days
+        for goal in goals:
+            for _ in range(self.ai_messages_per_goal):
+                day = self.start + timedelta(days=self.rng.randrange(days))
+                mood = self.rng.randint(1, 10)
+                yield AIMessage(
+                    user_id=goal.user_id, goal_id=goal.id, ai_response=self.rng.choice(AI_RESPONSES),
+                    filled_prompt=(f'用户seed刚完成了{goal.title}的打卡，心情评分{mood}/10，'
+                                   f'备注：{self.rng.choice(NOTES)}。请生成一句50字内的激励语。'),
+                    context_data={'goal_title': goal.title, 'mood_score': mood, 'date': day.isoformat()},
+                    created_at=random_moment(self.rng, day),
+                )
+
+
+def seed(scale: str = 'small', log: Optional[Callable[[str], None]] = None, **overrides) -> Dict[str, int]:
+    """按预设规模（可逐项覆盖）生成数据，返回各表写入的行数"""
+    options = dict(SCALES[scale])
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    return Seeder(log=log, **options).run()
@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from . import metrics
+
+NEUTRAL_RESULT = {'score': 0.0, 'label': 'neutral', 'confidence': 0.5}
+
+_whitespace = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本作为缓存键：全半角统一、去除首尾空白并合并连续空白"""
+    return _whitespace.sub(' ', unicodedata.normalize('NFKC', text or '')).strip()
+
+
+def score_text(text: str) -> Dict[str, Any]:
+    """用 SnowNLP 计算情感（在工作进程中执行）"""
+    from snownlp import SnowNLP
+
+    if not text:
+        return dict(NEUTRAL_RESULT)
+    try:
+        sentiment_score = SnowNLP(text).sentiments  # 0-1之间，越接近1越正面
+    except Exception as e:
+        print(f"情感分析错误: {e}")
+        return dict(NEUTRAL_RESULT)
+
+    # 将0-1的分数转换为-1到1的分数
+    normalized_score = (sentiment_score - 0.5) * 2
+
+    # 确定情感标签
+    if sentiment_score > 0.7:
+        sentiment_label = "positive"
+    elif sentiment_score < 0.3:
+        sentiment_label = "negative"
+    else:
+        sentiment_label = "neutral"
+
+    return {
+        'score': normalized_score,
+        'label': sentiment_label,
+        'confidence': sentiment_score
+    }
+
+
+def _score_many(texts: List[str]) -> List[Dict[str, Any]]:
+    return [score_text(text) for text in texts]
+
+
+def _warm_up():
+    # 预先加载 SnowNLP 模型，避免首个请求承担加载时间
+    score_text('你好')
+
+
+def default_workers() -> int:
+    """默认进程池大小：CPU核数，最多4个"""
+    return min(4, os.cpu_count() or 1)
+
+
+class SentimentService:
+    """情感分析服务：归一化文本的LRU缓存 + 进程池批量计算
+
+    SnowNLP 是纯Python实现的CPU密集计算，默认连单条文本也放到进程池中执行，
+    请求线程只负责等待结果，不再长时间占用GIL。
+    未命中缓存的文本不超过 inline_max_batch 条时在当前进程内计算（默认0，即不在请求线程内计算）；
+    workers 为0时始终在当前进程内计算。
+    """
+
+    def __init__(self, workers: Optional[int] = None, cache_size: int = 10000, chunk_size: int = 32,
+                 inline_max_batch: int = 0):
+        self.workers = default_workers() if workers is None else workers
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self.inline_max_batch = inline_max_batch
+        self._cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls) -> 'SentimentService':
+        return cls(
+            workers=getattr(settings, 'SENTIMENT_WORKERS', None),
+            cache_size=getattr(settings, 'SENTIMENT_CACHE_SIZE', 10000),
+            inline_max_batch=getattr(settings, 'SENTIMENT_INLINE_MAX_BATCH', 0),
+        )
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._executor is None:
+                # spawn 启动的工作进程不继承服务进程的线程、锁和数据库连接
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._cache.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return dict(result)
+
+    def _cache_set(self, key: str, result: Dict[str, Any]):
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _compute(self, texts: List[str]) -> List[Dict[str, Any]]:
+        if not texts or len(texts) <= self.inline_max_batch:
+            return _score_many(texts)
+        executor = self._get_executor()
+        if executor is None:
+            return _score_many(texts)
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        try:
+            return [result for chunk in executor.map(_score_many, chunks) for result in chunk]
+        except BrokenProcessPool:
+            # 工作进程异常退出，重建进程池并在本进程内完成本次计算
+            with self._lock:
+                self._executor = None
+            return _score_many(texts)
+
+    def analyze(self, text: str) -> Dict[str, Any]:
+        """分析单条文本"""
+        return self.analyze_many([text])[0]
+
+    def analyze_many(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """批量分析，重复文本和已缓存文本只计算一次，结果与输入顺序一致"""
+        with metrics.timed('sentiment'):
+            return self._analyze_many(texts)
+
+    def _analyze_many(self, texts: List[str]) -> List[Dict[str, Any]]:
+        keys = [normalize_text(text) for text in texts]
+        results: Dict[str, Dict[str, Any]] = {}
+        missing, seen = [], set()
+        for key in keys:
+            if key in seen:
+                continue
+            seen.add(key)
+            cached = self._cache_get(key)
+            if cached is None:
+                missing.append(key)
+            else:
+                results[key] = cached
+
+        for key, result in zip(missing, self._compute(missing)):
+            self._cache_set(key, result)
+            results[key] = result
+        return [dict(results[key]) for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache), 'workers': self.workers}
+
+
+# 进程内共享的情感分析服务
+sentiment_service = SentimentService.from_settings()
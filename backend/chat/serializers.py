@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import User, Channel, Message, Goal, CheckIn, PromptTemplate, AIMessage
+from .prompt_registry import TemplateCompileError, validate_template
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -43,19 +44,36 @@ class CheckInSerializer(serializers.ModelSerializer):
 class PromptTemplateSerializer(serializers.ModelSerializer):
     class Meta:
         model = PromptTemplate
-        fields = ['id', 'name', 'description', 'template_content', 'variables', 'is_active', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = ['id', 'name', 'description', 'template_content', 'variables', 'is_active', 'version', 'created_at']
+        read_only_fields = ['id', 'version', 'created_at']
+    
+    def validate(self, attrs):
+        # 保存前检查声明的变量与模板占位符一致
+        content = attrs.get('template_content', getattr(self.instance, 'template_content', ''))
+        variables = attrs.get('variables', getattr(self.instance, 'variables', []))
+        try:
+            validate_template(content, variables)
+        except TemplateCompileError as e:
+            raise serializers.ValidationError({'variables': str(e)})
+        return attrs
 
 class AIMessageSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     goal = GoalSerializer(read_only=True)
     prompt_template = PromptTemplateSerializer(read_only=True)
+    filled_prompt = serializers.CharField(read_only=True)
+    context_data = serializers.JSONField(read_only=True)
     
     class Meta:
         model = AIMessage
         fields = ['id', 'user', 'goal', 'prompt_template', 'filled_prompt', 'ai_response', 'context_data', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+class AIMessageListSerializer(AIMessageSerializer):
+    """列表用的精简版本，不包含提示词全文和上下文数据"""
+    class Meta(AIMessageSerializer.Meta):
+        fields = ['id', 'user', 'goal', 'prompt_template', 'ai_response', 'created_at']
+
 # 用于创建和更新的序列化器
 class GoalCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -68,6 +86,9 @@ class CheckInCreateSerializer(serializers.ModelSerializer):
         fields = ['goal', 'check_in_date', 'notes', 'mood_score']
 
 class AIMessageCreateSerializer(serializers.ModelSerializer):
+    filled_prompt = serializers.CharField()
+    context_data = serializers.JSONField(required=False)
+    
     class Meta:
         model = AIMessage
         fields = ['goal', 'prompt_template', 'filled_prompt', 'ai_response', 'context_data'] 
\ No newline at end of file
@@ -0,0 +1,59 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Channel, CheckIn, PromptTemplate, User
+from . import bitmaps, directory, streaks
+from .authentication import identity_cache
+from .channels import channel_cache
+from .prompt_registry import prompt_registry
+
+
+@receiver(post_save, sender=CheckIn)
+def update_streak_on_save(sender, instance, created, raw=False, **kwargs):
+    """打卡写入后维护连续打卡统计和打卡位图"""
+    if raw:
+        return
+    if created:
+        check_in_date = CheckIn._meta.get_field('check_in_date').to_python(instance.check_in_date)
+        streaks.record_checkin(instance.user_id, instance.goal_id, check_in_date)
+        bitmaps.set_day(instance.user_id, instance.goal_id, check_in_date)
+    else:
+        # 修改了打卡日期等字段，重新计算
+        streaks.rebuild_streak(instance.user_id, instance.goal_id)
+        bitmaps.rebuild_goal_bitmaps(instance.user_id, instance.goal_id)
+
+
+@receiver(post_delete, sender=CheckIn)
+def update_streak_on_delete(sender, instance, **kwargs):
+    """删除打卡后重新计算连续打卡统计并清除对应的位"""
+    streaks.rebuild_streak(instance.user_id, instance.goal_id)
+    check_in_date = CheckIn._meta.get_field('check_in_date').to_python(instance.check_in_date)
+    bitmaps.set_day(instance.user_id, instance.goal_id, check_in_date, checked=False)
+
+
+@receiver(post_save, sender=PromptTemplate)
+@receiver(post_delete, sender=PromptTemplate)
+def invalidate_prompt_template(sender, instance, **kwargs):
+    """模板修改、停用或删除后清除编译缓存"""
+    prompt_registry.invalidate(template_id=instance.id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_identity(sender, instance, **kwargs):
+    """用户修改或删除后清除身份缓存"""
+    identity_cache.invalidate(instance.id)
+
+
+@receiver(post_save, sender=User)
+def index_username(sender, instance, raw=False, **kwargs):
+    """维护用户目录的三字母组索引"""
+    if raw:
+        return
+    directory.index_users([instance])
+
+
+@receiver(post_delete, sender=Channel)
+def invalidate_channel(sender, instance, **kwargs):
+    """频道删除后清除用户对缓存"""
+    channel_cache.invalidate(instance.pair_key)
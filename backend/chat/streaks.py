@@ -0,0 +1,120 @@
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from django.db import transaction
+
+from .models import CheckIn, GoalStreak
+
+
+def compute_streak_state(dates: Iterable[date]) -> dict:
+    """根据升序的打卡日期计算连续打卡统计"""
+    current = longest = total = 0
+    last = None
+    for check_in_date in dates:
+        total += 1
+        if last is not None and check_in_date == last + timedelta(days=1):
+            current += 1
+        elif last is None or check_in_date != last:
+            current = 1
+        longest = max(longest, current)
+        last = check_in_date
+    return {
+        'current_streak': current,
+        'longest_streak': longest,
+        'last_check_in_date': last,
+        'total_checkins': total,
+    }
+
+
+def count_back_from(dates_desc: Iterable[date], today: date) -> int:
+    """从 today 开始向前数连续打卡天数（dates_desc 为降序、不晚于 today 的日期）"""
+    consecutive = 0
+    expected = today
+    for check_in_date in dates_desc:
+        if check_in_date != expected:
+            break
+        consecutive += 1
+        expected -= timedelta(days=1)
+    return consecutive
+
+
+def rebuild_streak(user_id, goal_id) -> Optional[GoalStreak]:
+    """用一次查询重新计算单个目标的连续打卡统计"""
+    dates = CheckIn.objects.filter(
+        user_id=user_id, goal_id=goal_id
+    ).order_by('check_in_date').values_list('check_in_date', flat=True)
+    state = compute_streak_state(dates)
+    if state['total_checkins'] == 0:
+        GoalStreak.objects.filter(user_id=user_id, goal_id=goal_id).delete()
+        return None
+    streak, _ = GoalStreak.objects.update_or_create(user_id=user_id, goal_id=goal_id, defaults=state)
+    return streak
+
+
+def record_checkin(user_id, goal_id, check_in_date: date) -> Optional[GoalStreak]:
+    """新增打卡后更新统计：顺延时 O(1) 更新，补打过去日期时重新计算"""
+    with transaction.atomic():
+        streak = GoalStreak.objects.select_for_update().filter(user_id=user_id, goal_id=goal_id).first()
+        if streak is None or streak.last_check_in_date is None:
+            return rebuild_streak(user_id, goal_id)
+
+        last = streak.last_check_in_date
+        if check_in_date <= last:
+            # 补打卡可能连接两段连续记录，需要整体重算
+            return rebuild_streak(user_id, goal_id)
+
+        if check_in_date == last + timedelta(days=1):
+            streak.current_streak += 1
+        else:
+            streak.current_streak = 1
+        streak.longest_streak = max(streak.longest_streak, streak.current_streak)
+        streak.last_check_in_date = check_in_date
+        streak.total_checkins += 1
+        streak.save()
+        return streak
+
+
+def consecutive_days(user_id, goal_id, today: date, streak: Optional[GoalStreak] = None) -> int:
+    """截至 today 的连续打卡天数（今天未打卡则为0）"""
+    if streak is None:
+        streak = GoalStreak.objects.filter(user_id=user_id, goal_id=goal_id).first()
+    if streak is None or streak.last_check_in_date is None or streak.last_check_in_date < today:
+        return 0
+    if streak.last_check_in_date == today:
+        return streak.current_streak
+    # 存在晚于今天的打卡记录，退回到按日期计算
+    dates = CheckIn.objects.filter(
+        user_id=user_id, goal_id=goal_id, check_in_date__lte=today
+    ).order_by('-check_in_date').values_list('check_in_date', flat=True)
+    return count_back_from(dates.iterator(), today)
+
+
+def rebuild_all_streaks(batch_size: int = 1000) -> int:
+    """从 CheckIn 表批量重建全部连续打卡统计，返回写入的记录数"""
+    rows = CheckIn.objects.order_by('user_id', 'goal_id', 'check_in_date').values_list(
+        'user_id', 'goal_id', 'check_in_date'
+    )
+    created = 0
+    pending = []
+
+    def flush():
+        nonlocal created
+        GoalStreak.objects.bulk_create(pending, batch_size=batch_size)
+        created += len(pending)
+        pending.clear()
+
+    with transaction.atomic():
+        GoalStreak.objects.all().delete()
+        key, dates = None, []
+        for user_id, goal_id, check_in_date in rows.iterator(chunk_size=batch_size):
+            if (user_id, goal_id) != key:
+                if key is not None:
+                    pending.append(GoalStreak(user_id=key[0], goal_id=key[1], **compute_streak_state(dates)))
+                key, dates = (user_id, goal_id), []
+            dates.append(check_in_date)
+            if len(pending) >= batch_size:
+                flush()
+        if key is not None:
+            pending.append(GoalStreak(user_id=key[0], goal_id=key[1], **compute_streak_state(dates)))
+        flush()
+    return created
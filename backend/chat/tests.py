@@ -1,3 +1,1024 @@
-from django.test import TestCase
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.db import IntegrityError, connection, models, transaction
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import bitmaps, channels, jobs, metrics, reminders, retention, scheduler, seeding, sentiment, streaks, urls
+from .ai_cache import ResponseCache
+from .ai_service import AIService
+from .authentication import identity_cache, issue_token
+from .channels import channel_cache
+from .events import broker, user_topic
+from .http_client import CircuitBreaker, InferenceClient
+from .models import User, Channel, Message, Goal, CheckIn, PromptTemplate, AIMessage, AIJob, CheckInBitmap, ContentBlob, GoalStreak, ScheduledReminder
+from .prompt_registry import prompt_registry
+
+
+class FakeInferenceServer:
+    """本地模拟的推理API，按顺序返回预设的响应"""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = 0
+        self.connections = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                server.requests += 1
+                server.connections.add(self.client_address)
+                status, body, delay = server.responses.pop(0) if server.responses else (200, [{'generated_text': '默认回复内容'}], 0)
+                if delay:
+                    time.sleep(delay)
+                payload = json.dumps(body).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/models/test'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class InferenceClientTests(SimpleTestCase):
+    """call_free_ai_api 在本地模拟推理服务上的行为"""
+
+    def make_service(self, server, **client_options):
+        options = dict(connect_timeout=1.0, read_timeout=1.0, max_retries=2, backoff_base=0.01, backoff_max=0.05)
+        options.update(client_options)
+        service = AIService()
+        service.api_url = server.url
+        service.response_cache = ResponseCache(enabled=False)
+        service.http_client = InferenceClient(**options)
+        service.generate_local_response = lambda prompt: '本地兜底回复'
+        return service
+
+    def test_reuses_pooled_connection(self):
+        with FakeInferenceServer() as server:
+            service = self.make_service(server)
+            for _ in range(5):
+                self.assertEqual(service.call_free_ai_api('提示词'), '默认回复内容')
+            self.assertEqual(server.requests, 5)
+            self.assertEqual(len(server.connections), 1)
+
+    def test_retries_model_loading(self):
+        with FakeInferenceServer() as server:
+            server.responses = [
+                (503, {'error': 'Model is currently loading', 'estimated_time': 0.01}, 0),
+                (503, {'error': 'Model is currently loading', 'estimated_time': 0.01}, 0),
+                (200, [{'generated_text': '模型加载完成后的回复'}], 0),
+            ]
+            service = self.make_service(server)
+            self.assertEqual(service.call_free_ai_api('提示词'), '模型加载完成后的回复')
+            self.assertEqual(server.requests, 3)
+
+    def test_read_timeout_falls_back_to_local(self):
+        with FakeInferenceServer() as server:
+            server.responses = [(200, [{'generated_text': '太慢了'}], 1.0)]
+            service = self.make_service(server, read_timeout=0.2)
+            start = time.monotonic()
+            self.assertEqual(service.call_free_ai_api('提示词'), '本地兜底回复')
+            self.assertLess(time.monotonic() - start, 0.9)
+
+    def test_circuit_breaker_skips_unhealthy_upstream(self):
+        with FakeInferenceServer() as server:
+            server.responses = [(500, {'error': 'boom'}, 0)] * 3
+            service = self.make_service(server, breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=0.2))
+            for _ in range(3):
+                self.assertEqual(service.call_free_ai_api('提示词'), '本地兜底回复')
+            self.assertEqual(server.requests, 3)
+
+            # 熔断期间不再请求上游
+            for _ in range(5):
+                self.assertEqual(service.call_free_ai_api('提示词'), '本地兜底回复')
+            self.assertEqual(server.requests, 3)
+            self.assertEqual(service.http_client.breaker.state, CircuitBreaker.OPEN)
+
+            # 冷却后试探请求成功，熔断器关闭
+            time.sleep(0.25)
+            self.assertEqual(service.call_free_ai_api('提示词'), '默认回复内容')
+            self.assertEqual(service.http_client.breaker.state, CircuitBreaker.CLOSED)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    """AI回复缓存：TTL过期、LRU淘汰、命中统计，兜底回复不进缓存"""
+
+    def test_ttl_expiry(self):
+        cache = ResponseCache(ttl=0.05)
+        cache.set('k', '回复')
+        self.assertEqual(cache.get('k'), '回复')
+        time.sleep(0.06)
+        self.assertIsNone(cache.get('k'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_lru_eviction_and_counters(self):
+        cache = ResponseCache(max_size=2)
+        cache.set('a', '1')
+        cache.set('b', '2')
+        cache.get('a')  # a 变为最近使用
+        cache.set('c', '3')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), ('1', '3'))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (3, 1, 2))
+        self.assertEqual(stats['hit_rate'], 0.75)
+
+    def test_fallback_replies_are_not_cached(self):
+        with FakeInferenceServer() as server:
+            server.responses = [(500, {'error': 'boom'}, 0), (200, [{'generated_text': ''}], 0)]
+            service = AIService()
+            service.api_url = server.url
+            service.response_cache = ResponseCache()
+            service.http_client = InferenceClient(max_retries=0)
+            service.generate_local_response = lambda prompt: '本地兜底回复'
+            self.assertEqual(service.call_free_ai_api('提示词'), '本地兜底回复')
+            self.assertEqual(service.call_free_ai_api('提示词'), '')
+            self.assertEqual(service.call_free_ai_api('提示词'), '默认回复内容')
+            self.assertEqual(service.call_free_ai_api('提示词'), '默认回复内容')
+            self.assertEqual(server.requests, 3)
+            self.assertEqual(service.response_cache.stats()['hits'], 1)
+
+
+class SentimentServiceTests(SimpleTestCase):
+    """情感分析：归一化后的文本共用缓存，批量结果保持输入顺序，单条文本默认也经过进程池"""
+
+    def test_normalized_text_hits_lru_cache(self):
+        service = sentiment.SentimentService(workers=0, cache_size=2)
+        first = service.analyze('今天 跑步  很开心')
+        self.assertEqual(service.analyze('  今天\t跑步 很开心\n'), first)
+        self.assertEqual(service.analyze('今天　跑步　很开心'), first)  # 全角空格
+        self.assertEqual((service.hits, service.misses), (2, 1))
+
+        service.analyze('有点累')
+        service.analyze('今天 跑步 很开心')  # 变为最近使用
+        service.analyze('压力很大')
+        self.assertEqual(service.stats()['size'], 2)
+        misses = service.misses
+        service.analyze('有点累')  # 已被淘汰
+        self.assertEqual(service.misses, misses + 1)
+
+    def test_single_text_uses_pool_by_default(self):
+        service = sentiment.SentimentService(workers=2)
+        executor = ThreadPoolExecutor(max_workers=1)  # 代替进程池，只记录是否被调用
+        self.addCleanup(executor.shutdown)
+        with mock.patch.object(service, '_get_executor', return_value=executor) as get_executor:
+            self.assertEqual(service.analyze('非常开心'), sentiment.score_text('非常开心'))
+            self.assertEqual(get_executor.call_count, 1)
+            service.analyze('非常开心')  # 命中缓存，不再计算
+            self.assertEqual(get_executor.call_count, 1)
+
+    def test_inline_scoring_is_opt_in(self):
+        service = sentiment.SentimentService(workers=2, inline_max_batch=8)
+        with mock.patch.object(service, '_get_executor', side_effect=AssertionError('不应启动进程池')):
+            self.assertEqual(service.analyze('非常开心'), sentiment.score_text('非常开心'))
+            service.analyze_many([f'消息{i}' for i in range(8)])
+
+    def test_analyze_many_preserves_order_with_duplicates(self):
+        texts = ['非常开心', '特别沮丧', '非常开心 ', '还不错', '特别沮丧', '']
+        expected = [sentiment.score_text(sentiment.normalize_text(text)) for text in texts]
+        service = sentiment.SentimentService(workers=1, chunk_size=1)
+        try:
+            calls = []
+            real_compute = service._compute
+            service._compute = lambda missing: calls.append(list(missing)) or real_compute(missing)
+            self.assertEqual(service.analyze_many(texts), expected)
+            self.assertEqual(calls, [['非常开心', '特别沮丧', '还不错', '']])
+            self.assertIsNotNone(service._executor)
+            self.assertEqual(service.analyze_many(list(reversed(texts))), list(reversed(expected)))
+            self.assertEqual(calls[1:], [[]])  # 全部命中缓存
+        finally:
+            service.shutdown()
+
+
+class StreakTests(TestCase):
+    """打卡写入和删除时增量维护连续打卡统计"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='streaker', password='x')
+        self.goal = Goal.objects.create(user=self.user, title='跑步')
+        self.today = date(2026, 3, 10)
+
+    def check_in(self, days_ago):
+        return CheckIn.objects.create(user=self.user, goal=self.goal,
+                                      check_in_date=self.today - timedelta(days=days_ago))
+
+    def streak(self):
+        return GoalStreak.objects.get(user=self.user, goal=self.goal)
+
+    def test_backdated_checkin_joins_two_runs(self):
+        for days_ago in (5, 4, 2, 1, 0):
+            self.check_in(days_ago)
+        self.assertEqual((self.streak().current_streak, self.streak().longest_streak), (3, 3))
+        self.check_in(3)
+        streak = self.streak()
+        self.assertEqual((streak.current_streak, streak.longest_streak, streak.total_checkins), (6, 6, 6))
+        self.assertEqual(streak.last_check_in_date, self.today)
+
+    def test_deleting_middle_day_splits_run(self):
+        checkins = [self.check_in(days_ago) for days_ago in (4, 3, 2, 1, 0)]
+        checkins[2].delete()
+        streak = self.streak()
+        self.assertEqual((streak.current_streak, streak.longest_streak, streak.total_checkins), (2, 2, 4))
+        for checkin in checkins[:2] + checkins[3:]:
+            checkin.delete()
+        self.assertFalse(GoalStreak.objects.filter(user=self.user, goal=self.goal).exists())
+
+    def test_consecutive_days_is_zero_until_today_is_checked_in(self):
+        for days_ago in (3, 2, 1):
+            self.check_in(days_ago)
+        self.assertEqual(streaks.consecutive_days(self.user.id, self.goal.id, self.today), 0)
+        self.check_in(0)
+        self.assertEqual(streaks.consecutive_days(self.user.id, self.goal.id, self.today), 4)
+        # 存在晚于 today 的打卡（时区差异）时按日期往回数
+        CheckIn.objects.create(user=self.user, goal=self.goal, check_in_date=self.today + timedelta(days=1))
+        self.assertEqual(streaks.consecutive_days(self.user.id, self.goal.id, self.today), 4)
+
+
+class CheckInBitmapTests(TestCase):
+    """打卡位图：跨年和闰日的编码、信号维护以及日历接口的区间限制"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='calendar', password='x')
+        self.goal = Goal.objects.create(user=self.user, title='阅读')
+
+    def test_encoding_across_year_boundary_and_leap_day(self):
+        days = [date(2023, 12, 30), date(2023, 12, 31), date(2024, 1, 1), date(2024, 2, 29), date(2024, 12, 31)]
+        years = bitmaps.bits_from_dates(days)
+        self.assertEqual(years[2023], (1 << 363) | (1 << 364))
+        # 闰年的2月29日是第60天，12月31日是第366天
+        self.assertEqual(years[2024], (1 << 0) | (1 << 59) | (1 << 365))
+        self.assertEqual(bitmaps.decode_bits(bitmaps.encode_bits(years[2024])), years[2024])
+        calendar = bitmaps.CheckInCalendar(years)
+        self.assertTrue(calendar.is_checked(date(2024, 2, 29)))
+        self.assertFalse(calendar.is_checked(date(2024, 3, 1)))
+        self.assertEqual(calendar.count(date(2023, 12, 31), date(2024, 3, 1)), 3)
+        self.assertEqual(calendar.consecutive_days(date(2024, 1, 1)), 3)
+
+    def test_signals_update_bits_on_create_and_delete(self):
+        first = CheckIn.objects.create(user=self.user, goal=self.goal, check_in_date=date(2024, 12, 31))
+        CheckIn.objects.create(user=self.user, goal=self.goal, check_in_date=date(2025, 1, 1))
+        calendar = bitmaps.load_calendar(self.user.id, self.goal.id)
+        self.assertEqual(calendar.consecutive_days(date(2025, 1, 1)), 2)
+        first.delete()
+        self.assertFalse(CheckInBitmap.objects.filter(user=self.user, year=2024).exists())
+        calendar = bitmaps.load_calendar(self.user.id, self.goal.id)
+        self.assertFalse(calendar.is_checked(date(2024, 12, 31)))
+        self.assertTrue(calendar.is_checked(date(2025, 1, 1)))
+
+    def test_calendar_endpoint_range_limit(self):
+        CheckIn.objects.create(user=self.user, goal=self.goal, check_in_date=date(2024, 2, 29))
+        # 含首尾最多 366*3 天
+        params = {'user_id': self.user.id, 'start': '2023-12-30', 'end': '2026-12-31'}
+        data = self.client.get('/api/checkin-calendar/', params).json()
+        self.assertEqual(len(data['days']), 366 * 3)
+        self.assertEqual(data['checked_days'], 1)
+        self.assertEqual(self.client.get('/api/checkin-calendar/', dict(params, start='2023-12-29')).status_code, 400)
+        self.assertEqual(self.client.get('/api/checkin-calendar/', dict(params, start='2027-01-01')).status_code, 400)
+
+
+class QueryBudgetTests(TestCase):
+    """列表接口的查询次数必须与返回行数无关"""
+
+    # 每个接口允许的最大查询次数
+    BUDGETS = {
+        'users': 1,
+        'channels': 1,
+        'messages': 1,
+        'get_messages': 1,
+        'goals': 1,
+        'checkins': 1,
+        'ai_messages': 1,
+        'prompt_templates': 1,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create(username='budget_owner', password='x')
+        self.peer = User.objects.create(username='budget_peer', password='x')
+        self.channel = Channel.objects.create(name='budget', from_user=self.user, to_user=self.peer)
+        self.template = PromptTemplate.objects.create(
+            name='budget', description='', template_content='{username}', variables=['username']
+        )
+        self.rows = 0
+
+    def add_rows(self, count):
+        """为每个列表接口追加 count 行数据"""
+        for _ in range(count):
+            self.rows += 1
+            other = User.objects.create(username=f'budget_user_{self.rows}', password='x')
+            Channel.objects.create(name=f'budget_{self.rows}', from_user=other, to_user=self.user)
+            Message.objects.create(message=f'消息{self.rows}', from_user=other, to_user=self.user, channel=self.channel)
+            goal = Goal.objects.create(user=self.user, title=f'目标{self.rows}')
+            CheckIn.objects.create(user=self.user, goal=goal, check_in_date=date.today() - timedelta(days=self.rows))
+            PromptTemplate.objects.create(name=f'budget_{self.rows}', description='', template_content='', variables=[])
+            AIMessage.objects.create(
+                user=self.user, goal=goal, prompt_template=self.template,
+                filled_prompt='提示词', ai_response='回复', context_data={}
+            )
+
+    def urls(self):
+        return {
+            'users': '/api/users/',
+            'channels': '/api/channels/',
+            'messages': '/api/messages/',
+            'get_messages': f'/api/get-messages/?channel={self.channel.id}',
+            'goals': f'/api/goals/?user_id={self.user.id}',
+            'checkins': f'/api/checkins/?user_id={self.user.id}',
+            'ai_messages': f'/api/ai-messages/?user_id={self.user.id}',
+            'prompt_templates': '/api/prompt-templates/',
+        }
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_list_endpoints_use_constant_queries(self):
+        self.add_rows(2)
+        small = {name: self.count_queries(url) for name, url in self.urls().items()}
+        self.add_rows(10)
+        large = {name: self.count_queries(url) for name, url in self.urls().items()}
+
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(small[name], large[name])
+                self.assertLessEqual(large[name], budget)
+
+
+class KeysetPaginationTests(TestCase):
+    """游标分页逐页遍历不重复、不遗漏"""
+
+    def test_walks_checkins_in_pages(self):
+        user = User.objects.create(username='pager', password='x')
+        goals = [Goal.objects.create(user=user, title=f'目标{i}') for i in range(3)]
+        for day in range(20):
+            for goal in goals:
+                CheckIn.objects.create(user=user, goal=goal, check_in_date=date.today() - timedelta(days=day))
+
+        seen, cursor = [], None
+        while True:
+            params = {'user_id': user.id, 'limit': 7}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get('/api/checkins/', params).json()
+            self.assertLessEqual(len(data['results']), 7)
+            seen.extend(row['id'] for row in data['results'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        expected = list(CheckIn.objects.order_by('-check_in_date', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_rejects_invalid_cursor(self):
+        response = self.client.get('/api/users/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+
+class MessageCursorTests(TestCase):
+    """聊天消息的增量拉取和向前翻页：按 (created_at, id) 排序，时间相同的消息不重不漏"""
+
+    def setUp(self):
+        a = User.objects.create(username='ma', password='x')
+        b = User.objects.create(username='mb', password='x')
+        self.channel = Channel.objects.create(name='ma-mb', from_user=a, to_user=b)
+        base = timezone.now() - timedelta(hours=1)
+        # 第2、3、4条消息的创建时间相同
+        minutes = [0, 10, 10, 10, 20, 30]
+        self.ids = []
+        for i, minute in enumerate(minutes):
+            message = Message.objects.create(message=f'm{i}', from_user=a, to_user=b, channel=self.channel)
+            Message.objects.filter(id=message.id).update(created_at=base + timedelta(minutes=minute))
+            self.ids.append(message.id)
+        self.base = base
+
+    def fetch(self, **params):
+        response = self.client.get('/api/get-messages/', dict(params, channel=self.channel.id))
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()]
+
+    def test_default_returns_latest_page_in_order(self):
+        self.assertEqual(self.fetch(limit=3), self.ids[3:])
+        self.assertEqual(self.fetch(), self.ids)
+
+    def test_after_id_breaks_ties_on_created_at(self):
+        self.assertEqual(self.fetch(after_id=self.ids[1]), self.ids[2:])
+        self.assertEqual(self.fetch(after_id=self.ids[2], limit=2), self.ids[3:5])
+        self.assertEqual(self.fetch(after_id=self.ids[-1]), [])
+
+    def test_before_id_pages_back_across_ties(self):
+        self.assertEqual(self.fetch(before_id=self.ids[4], limit=2), self.ids[2:4])
+        self.assertEqual(self.fetch(before_id=self.ids[2], limit=2), self.ids[:2])
+
+    def test_since(self):
+        since = (self.base + timedelta(minutes=10)).isoformat()
+        self.assertEqual(self.fetch(since=since), self.ids[4:])
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({'after_id': 'abc'}, {'before_id': 'abc'}, {'since': 'yesterday'}, {'limit': '0'}):
+            response = self.client.get('/api/get-messages/', dict(params, channel=self.channel.id))
+            self.assertEqual(response.status_code, 400, params)
+        self.assertEqual(self.client.get('/api/get-messages/', {'channel': 'abc'}).status_code, 400)
+
+
+class PromptRegistryTests(TestCase):
+    """模板编译缓存：命中时不查库，修改后立即失效"""
+
+    def setUp(self):
+        prompt_registry.invalidate()
+        self.template = PromptTemplate.objects.create(
+            name='greeting', template_content='你好{username}，继续{goal_title}',
+            variables=['username', 'goal_title'],
+        )
+
+    def test_cached_template_renders_without_queries(self):
+        prompt_registry.get('greeting')
+        with self.assertNumQueries(0):
+            text = prompt_registry.get('greeting').render({'username': '小明', 'goal_title': '跑步'})
+        self.assertEqual(text, '你好小明，继续跑步')
+
+    def test_update_bumps_version_and_invalidates(self):
+        prompt_registry.get('greeting')
+        response = self.client.put(
+            f'/api/prompt-templates/{self.template.id}/',
+            {'template_content': '加油{username}', 'variables': ['username']},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json()['version'], 2)
+        self.assertEqual(prompt_registry.get('greeting').render({'username': '小明'}), '加油小明')
+
+    def test_rejects_undeclared_placeholder(self):
+        response = self.client.put(
+            f'/api/prompt-templates/{self.template.id}/',
+            {'template_content': '你好{username}{unknown}'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class StubReminderAIService(AIService):
+    """不访问网络的AI服务，记录调用次数"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def call_free_ai_api(self, prompt, timeout=None):
+        self.calls += 1
+        return '今天也要坚持哦，加油！'
+
+
+class SlowReminderAIService(StubReminderAIService):
+    """目标名里带“慢”的提示词故意超过时间预算"""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    def call_free_ai_api(self, prompt, timeout=None):
+        if '慢' in prompt:
+            time.sleep(self.delay)
+        return super().call_free_ai_api(prompt, timeout)
+
+
+class BatchReminderTests(TestCase):
+    """批量提醒：整体时间预算内返回，超时的目标使用兜底提醒语，生成结果一次写入"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='batch', password='x')
+        self.fast = Goal.objects.create(user=self.user, title='阅读')
+        self.slow = Goal.objects.create(user=self.user, title='慢跑')
+        self.today = date(2026, 3, 10)
+
+    def test_budget_exceeded_uses_fallback_and_persists_in_one_insert(self):
+        ai_service = SlowReminderAIService(delay=1.0)
+        started = time.monotonic()
+        with CaptureQueriesContext(connection) as captured:
+            items = reminders.generate_reminders(ai_service, self.user, [self.fast, self.slow], self.today,
+                                                 budget=0.2)
+        self.assertLess(time.monotonic() - started, 0.8)
+        by_goal = {item['goal_id']: item for item in items}
+        self.assertFalse(by_goal[self.fast.id]['fallback'])
+        self.assertEqual(by_goal[self.fast.id]['ai_reminder'], '今天也要坚持哦，加油！')
+        self.assertTrue(by_goal[self.slow.id]['fallback'])
+        self.assertTrue(by_goal[self.slow.id]['ai_reminder'])
+        inserts = [query for query in captured.captured_queries if query['sql'].startswith('INSERT INTO "chat_aimessage"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AIMessage.objects.filter(user=self.user).count(), 2)
+
+    def test_recent_dates_are_top_three_per_goal(self):
+        for days_ago in range(5):
+            CheckIn.objects.create(user=self.user, goal=self.fast, check_in_date=self.today - timedelta(days=days_ago))
+        CheckIn.objects.create(user=self.user, goal=self.slow, check_in_date=self.today)
+        with self.assertNumQueries(1):
+            history = reminders.recent_checkin_dates([self.fast.id, self.slow.id])
+        self.assertEqual(history[self.fast.id], [self.today - timedelta(days=i) for i in range(3)])
+        self.assertEqual(history[self.slow.id], [self.today])
+
+
+class ReminderSchedulerTests(TestCase):
+    """定时提醒按用户本地时间分桶，重复调度不重复生成"""
+
+    def setUp(self):
+        self.now = datetime(2026, 3, 1, 0, 55, tzinfo=dt_timezone.utc)  # 上海 08:55，纽约前一天 19:55
+        self.shanghai = User.objects.create(username='sh', password='x', reminder_time='09:00',
+                                            timezone='Asia/Shanghai')
+        self.new_york = User.objects.create(username='ny', password='x', reminder_time='09:00',
+                                            timezone='America/New_York')
+        self.reading = Goal.objects.create(user=self.shanghai, title='阅读')
+        self.running = Goal.objects.create(user=self.shanghai, title='跑步')
+        Goal.objects.create(user=self.new_york, title='健身')
+        CheckIn.objects.create(user=self.shanghai, goal=self.running, check_in_date=date(2026, 3, 1))
+
+    def test_dispatches_due_bucket_once(self):
+        ai_service = StubReminderAIService()
+        window_end = self.now + timedelta(minutes=15)
+        self.assertEqual(scheduler.due_buckets(self.now, window_end),
+                         {('Asia/Shanghai', date(2026, 3, 1)): [self.shanghai.id]})
+
+        self.assertEqual(scheduler.dispatch(ai_service, self.now, window_end), 1)
+        self.assertEqual(scheduler.dispatch(ai_service, self.now, window_end), 0)
+        self.assertEqual(ai_service.calls, 1)
+        reminder = ScheduledReminder.objects.get()
+        self.assertEqual((reminder.goal_id, reminder.reminder_date), (self.reading.id, date(2026, 3, 1)))
+
+        # 到点后的批量提醒直接复用已生成的结果
+        items = reminders.generate_reminders(ai_service, self.shanghai, [self.reading, self.running],
+                                             date(2026, 3, 1))
+        self.assertEqual(ai_service.calls, 1)
+        self.assertEqual(items[0]['ai_reminder'], reminder.ai_message.ai_response)
+        self.assertTrue(items[1]['checked'])
+
+
+class AIJobQueueTests(TestCase):
+    """任务只被领取一次，失败按指数退避重试直至failed，超时任务放回队列，只能查询自己的任务"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='worker', password='x')
+        self.goal = Goal.objects.create(user=self.user, title='阅读')
+        self.checkin = CheckIn.objects.create(user=self.user, goal=self.goal, check_in_date=date(2026, 3, 1))
+
+    def test_conditional_update_claims_once(self):
+        first = jobs.enqueue('motivational_message', {'checkin_id': self.checkin.id})
+        second = jobs.enqueue('motivational_message', {'checkin_id': self.checkin.id})
+        real_write_transaction = jobs.write_transaction
+        raced = []
+
+        @contextmanager
+        def racing_write_transaction():
+            # 模拟另一个工作进程在本进程选出候选任务之后、UPDATE之前抢先领取了第一个任务
+            if not raced:
+                raced.append(AIJob.objects.filter(id=first.id).update(status=AIJob.STATUS_RUNNING))
+            with real_write_transaction():
+                yield
+
+        with mock.patch.object(jobs, 'write_transaction', racing_write_transaction):
+            claimed = jobs.claim_next()
+        self.assertEqual(raced, [1])
+        self.assertEqual((claimed.id, claimed.status, claimed.attempts), (second.id, AIJob.STATUS_RUNNING, 1))
+        self.assertEqual(AIJob.objects.get(id=first.id).attempts, 0)
+        self.assertIsNone(jobs.claim_next())
+
+    def test_retries_with_backoff_until_failed(self):
+        def broken_handler(ai_service, payload):
+            raise RuntimeError('推理服务不可用')
+
+        with mock.patch.dict(jobs.HANDLERS, {'broken': broken_handler}):
+            job = jobs.enqueue('broken', {'checkin_id': self.checkin.id}, max_attempts=3)
+            for attempt in (1, 2):
+                started = timezone.now()
+                job = jobs.run_job(None, jobs.claim_next())
+                self.assertEqual((job.status, job.attempts), (AIJob.STATUS_PENDING, attempt))
+                self.assertGreaterEqual(job.run_after, started + timedelta(seconds=2 ** attempt))
+                self.assertIn('推理服务不可用', job.error)
+                # 退避期间不会被领取，时间到了才能再次领取
+                self.assertIsNone(jobs.claim_next())
+                AIJob.objects.filter(id=job.id).update(run_after=timezone.now())
+            job = jobs.run_job(None, jobs.claim_next())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_at), (AIJob.STATUS_FAILED, 3, None))
+        self.assertIsNone(jobs.claim_next())
+
+    def test_requeue_stale(self):
+        now = timezone.now()
+        stale = AIJob.objects.create(kind='motivational_message', payload={'checkin_id': self.checkin.id},
+                                     status=AIJob.STATUS_RUNNING, locked_at=now - timedelta(minutes=10), attempts=1)
+        fresh = AIJob.objects.create(kind='motivational_message', payload={'checkin_id': self.checkin.id},
+                                     status=AIJob.STATUS_RUNNING, locked_at=now, attempts=1)
+
+        self.assertEqual(jobs.requeue_stale(timeout_seconds=300), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.locked_at), (AIJob.STATUS_PENDING, None))
+        self.assertEqual(fresh.status, AIJob.STATUS_RUNNING)
+        self.assertEqual(jobs.claim_next().id, stale.id)
+
+    def test_requeue_stale_fails_jobs_out_of_attempts(self):
+        # 每次都让工作进程卡死的任务：领取时已用完尝试次数，超时后不再放回队列
+        exhausted = AIJob.objects.create(kind='motivational_message', payload={'checkin_id': self.checkin.id},
+                                         status=AIJob.STATUS_RUNNING, attempts=3, max_attempts=3,
+                                         locked_at=timezone.now() - timedelta(minutes=10))
+
+        self.assertEqual(jobs.requeue_stale(timeout_seconds=300), 0)
+        exhausted.refresh_from_db()
+        self.assertEqual((exhausted.status, exhausted.locked_at), (AIJob.STATUS_FAILED, None))
+        self.assertIn('最大尝试次数', exhausted.error)
+        self.assertIsNone(jobs.claim_next())
+
+    def test_detail_only_for_owner(self):
+        job = jobs.enqueue('motivational_message', {'checkin_id': self.checkin.id})
+        other = User.objects.create(username='other', password='x')
+
+        response = self.client.get(f'/api/ai-jobs/{job.id}/', {'user_id': self.user.id})
+        self.assertEqual(response.json()['status'], AIJob.STATUS_PENDING)
+        response = self.client.get(f'/api/ai-jobs/{job.id}/', {'user_id': other.id})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get(f'/api/ai-jobs/{job.id}/').status_code, 400)
+
+
+class CheckInImportExportTests(TestCase):
+    """批量导入跳过重复和无效行并重建统计，导出结果可以再次导入"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='importer', password='x')
+        self.goal = Goal.objects.create(user=self.user, title='阅读')
+        CheckIn.objects.create(user=self.user, goal=self.goal, check_in_date=date(2026, 1, 1))
+
+    def test_import_ndjson_body(self):
+        lines = [
+            {'goal_id': self.goal.id, 'check_in_date': '2026-01-01'},  # 已存在
+            {'goal_id': self.goal.id, 'check_in_date': '2026-01-02', 'mood_score': 7},
+            {'goal_id': self.goal.id, 'check_in_date': '2026-01-02'},  # 文件内重复
+            {'goal_id': self.goal.id, 'check_in_date': '2026-01-03', 'notes': '第三天'},
+            {'goal_title': '跑步', 'check_in_date': '2026-01-03'},
+            {'goal_id': self.goal.id, 'check_in_date': '01/04/2026'},
+        ]
+        body = '\n'.join(json.dumps(line, ensure_ascii=False) for line in lines) + '\nnot json\n'
+        response = self.client.post(f'/api/checkins/import/?user_id={self.user.id}', body.encode('utf-8'),
+                                    content_type='application/x-ndjson')
+        result = response.json()
+        self.assertEqual((result['total'], result['imported'], result['skipped'], result['invalid']), (7, 3, 2, 2))
+        self.assertEqual([error['line'] for error in result['errors']], [6, 7])
+        self.assertEqual(result['goals_created'], 1)
+        self.assertFalse(AIJob.objects.exists())
+
+        streak = GoalStreak.objects.get(goal=self.goal)
+        self.assertEqual((streak.current_streak, streak.total_checkins), (3, 3))
+        self.assertTrue(bitmaps.load_calendar(self.user.id, self.goal.id).is_checked(date(2026, 1, 3)))
+
+    def test_invalid_rows_do_not_create_goals(self):
+        lines = [
+            {'goal_title': '游泳', 'check_in_date': '2026/01/05'},
+            {'goal_title': '冥想', 'check_in_date': '2026-01-05', 'mood_score': 11},
+            {'goal_title': '冥想', 'check_in_date': '2026-01-06', 'mood_score': 5},
+        ]
+        body = '\n'.join(json.dumps(line, ensure_ascii=False) for line in lines)
+        response = self.client.post(f'/api/checkins/import/?user_id={self.user.id}', body.encode('utf-8'),
+                                    content_type='application/x-ndjson')
+        result = response.json()
+        self.assertEqual((result['imported'], result['invalid'], result['goals_created']), (1, 2, 1))
+        self.assertEqual(sorted(Goal.objects.filter(user=self.user).values_list('title', flat=True)), ['冥想', '阅读'])
+
+    def test_csv_export_round_trip(self):
+        CheckIn.objects.create(user=self.user, goal=self.goal, check_in_date=date(2026, 1, 2), notes='逗号, 引号"')
+        response = self.client.get('/api/checkins/export/', {'user_id': self.user.id, 'file_format': 'csv'})
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+
+        other = User.objects.create(username='other', password='x')
+        upload = SimpleUploadedFile('checkins.csv', content, content_type='text/csv')
+        response = self.client.post('/api/checkins/import/', {'user_id': other.id, 'file': upload})
+        result = response.json()
+        self.assertEqual((result['imported'], result['invalid'], result['goals_created']), (2, 0, 1))
+        self.assertEqual(CheckIn.objects.get(user=other, check_in_date=date(2026, 1, 2)).notes, '逗号, 引号"')
+
+
+class StreamingExportTests(TestCase):
+    """聊天记录和AI消息日志以NDJSON流式导出，包含完整字段"""
+
+    def test_exports_messages_and_ai_messages(self):
+        alice = User.objects.create(username='alice', password='x')
+        bob = User.objects.create(username='bob', password='x')
+        channel = Channel.objects.create(name='alice-bob', from_user=alice, to_user=bob)
+        for i in range(5):
+            Message.objects.create(message=f'消息{i}', from_user=alice, to_user=bob, channel=channel)
+        goal = Goal.objects.create(user=alice, title='阅读')
+        AIMessage.objects.create(user=alice, goal=goal, filled_prompt='提示词', ai_response='加油',
+                                 context_data={'consecutive_days': 3})
+
+        carol = User.objects.create(username='carol', password='x')
+        response = self.client.get('/api/get-messages/export/', {'channel': channel.id, 'user_id': carol.id})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.get('/api/get-messages/export/', {'channel': channel.id}).status_code, 400)
+
+        response = self.client.get('/api/get-messages/export/', {'channel': channel.id, 'user_id': bob.id})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([row['message'] for row in rows], [f'消息{i}' for i in range(5)])
+
+        response = self.client.get('/api/ai-messages/export/', {'user_id': alice.id})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual(rows[0]['filled_prompt'], '提示词')
+        self.assertEqual(rows[0]['context_data'], {'consecutive_days': 3})
+
+
+class ContentBlobTests(TestCase):
+    """相同的提示词和上下文只存一份，压缩后清理不再引用的内容"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='blob', password='x')
+        self.goal = Goal.objects.create(user=self.user, title='阅读')
+
+    def test_deduplicates_prompts_and_contexts(self):
+        messages = [AIMessage(user=self.user, goal=self.goal, filled_prompt='同一个提示词', ai_response=f'回复{i}',
+                              context_data={'b': 1, 'a': [1, 2]}) for i in range(3)]
+        AIMessage.objects.bulk_create(messages)
+        AIMessage.objects.create(user=self.user, goal=self.goal, filled_prompt='同一个提示词', ai_response='再来一次',
+                                 context_data={'a': [1, 2], 'b': 1})
+        self.assertEqual(ContentBlob.objects.count(), 2)
+
+        message = AIMessage.objects.order_by('id').last()
+        self.assertEqual(message.filled_prompt, '同一个提示词')
+        self.assertEqual(message.context_data, {'a': [1, 2], 'b': 1})
+
+    def test_compact_collapses_old_rows_and_deletes_unreferenced_blobs(self):
+        for i in range(3):
+            AIMessage.objects.create(user=self.user, goal=self.goal, filled_prompt=f'提示词{i}', ai_response='回复')
+        old = timezone.now() - timedelta(days=100)
+        AIMessage.objects.update(created_at=old)
+        ContentBlob.objects.update(created_at=old)
+        AIMessage.objects.create(user=self.user, goal=self.goal, filled_prompt='今天的提示词', ai_response='回复')
+
+        result = retention.compact(retain_days=90)
+        self.assertEqual(result, {'collapsed_messages': 2, 'deleted_blobs': 2})
+        self.assertEqual(sorted(AIMessage.objects.values_list('prompt_blob__content', flat=True)),
+                         ['今天的提示词', '提示词2'])
+
+
+class SeedingTests(TestCase):
+    """生成的数据带有分散的创建时间，并重建了连续打卡统计"""
+
+    def test_seed_small_dataset(self):
+        counts = seeding.seed(users=4, goals_per_user=2, years=1, channels_per_user=2,
+                              messages_per_channel=5, ai_messages_per_goal=3, today=date(2026, 1, 1))
+        self.assertEqual((counts['users'], counts['goals'], counts['ai_messages']), (4, 8, 24))
+        self.assertEqual(CheckIn.objects.count(), counts['checkins'])
+        self.assertEqual(GoalStreak.objects.aggregate(total=models.Sum('total_checkins'))['total'],
+                         counts['checkins'])
+        self.assertLess(Message.objects.earliest('created_at').created_at.date(), date(2025, 12, 1))
+        # 频道与 request_chat 一样按 (较小ID, 较大ID) 存储
+        self.assertFalse(Channel.objects.filter(from_user_id__gte=models.F('to_user_id')).exists())
+
+    def test_benchmark_covers_every_route(self):
+        from .management.commands.bench_endpoints import SKIPPED, endpoint_specs, url_names
+        ctx = dict.fromkeys(['user_id', 'goal_id', 'channel_id'], 1)
+        covered = {url_name for _, _, url_name, _ in endpoint_specs(ctx)}
+        self.assertEqual(url_names(urls.urlpatterns) - covered - set(SKIPPED), set())
+
+
+class PerformanceMetricsTests(TestCase):
+    """每个请求带 Server-Timing 响应头，并按视图汇总到 /api/metrics"""
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.user = User.objects.create(username='metrics', password='x')
+        Goal.objects.create(user=self.user, title='阅读')
+
+    def test_server_timing_header_reports_sql(self):
+        response = self.client.get('/api/goals/', {'user_id': self.user.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="1 queries".*total;dur=[\d.]+')
+
+    def test_timings_and_fallbacks_follow_the_request_context(self):
+        timings, token = metrics.start_request()
+        try:
+            with metrics.timed('sentiment'):
+                pass
+            metrics.record_fallback('circuit_open')
+        finally:
+            metrics.end_request(token)
+        header = timings.server_timing(timings.elapsed())
+        self.assertIn('sentiment;dur=', header)
+        self.assertIn('ai-fallback;desc="circuit_open"', header)
+        # 请求之外的计时不会报错，也不会计入
+        with metrics.timed('ai'):
+            pass
+        self.assertNotIn('ai', timings.phases)
+
+    def test_metrics_endpoint_renders_prometheus_text(self):
+        self.client.get('/api/goals/', {'user_id': self.user.id})
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('chat_request_duration_seconds_bucket{view="goals",method="GET",le="+Inf"} 1', body)
+        self.assertIn('chat_sql_queries_total{view="goals"} 1', body)
+
+        response = self.client.get('/api/metrics', REMOTE_ADDR='10.0.0.8')
+        self.assertEqual(response.status_code, 403)
+
+
+class SignedTokenAuthTests(TestCase):
+    """登录签发令牌，后续请求凭令牌认证且只能访问自己的数据"""
+
+    def setUp(self):
+        identity_cache.invalidate()
+        self.client.post('/api/register/', {'username': 'alice', 'password': 'secret'}, content_type='application/json')
+        self.user = User.objects.get(username='alice')
+        self.other = User.objects.create(username='bob', password='x')
+        Goal.objects.create(user=self.user, title='阅读')
+
+    def auth(self, token):
+        return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def test_login_returns_token_that_authenticates_without_user_lookup(self):
+        response = self.client.post('/api/login/', {'username': 'alice', 'password': 'secret'},
+                                    content_type='application/json')
+        token = response.json()['token']
+        self.client.get('/api/goals/', {'user_id': self.user.id}, **self.auth(token))
+        # 身份已缓存：只剩目标查询本身
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/goals/', {'user_id': self.user.id}, **self.auth(token))
+        self.assertEqual(len(response.json()), 1)
+
+    def test_token_cannot_access_other_users_data(self):
+        token = issue_token(self.user)
+        response = self.client.get('/api/goals/', {'user_id': self.other.id}, **self.auth(token))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post('/api/send-message/', {'message': 'hi', 'from_user': self.other.id,
+                                                          'to_user': self.user.id, 'channel': 1},
+                                    content_type='application/json', **self.auth(token))
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_or_expired_token_is_rejected(self):
+        response = self.client.get('/api/goals/', {'user_id': self.user.id}, **self.auth('not-a-token'))
+        self.assertEqual(response.status_code, 401)
+        token = issue_token(self.user)
+        with self.settings(ACCESS_TOKEN_TTL_SECONDS=-1):
+            response = self.client.get('/api/goals/', {'user_id': self.user.id}, **self.auth(token))
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_required_setting(self):
+        with self.settings(AUTH_TOKEN_REQUIRED=True):
+            response = self.client.get('/api/goals/', {'user_id': self.user.id})
+            self.assertEqual(response.status_code, 401)
+            # 注册和登录不需要令牌
+            response = self.client.post('/api/login/', {'username': 'alice', 'password': 'secret'},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+
+
+class UserDirectoryTests(TestCase):
+    """用户目录搜索：前缀匹配在前、子串匹配在后，忽略大小写，游标分页跨越两个阶段"""
+
+    def setUp(self):
+        for name in ['Alice', 'alina', 'Malice', 'palace', 'bob', 'Xalicex']:
+            User.objects.create(username=name, password='x')
+        self.me = User.objects.create(username='alibaba', password='x')
+
+    def search(self, **params):
+        return self.client.get('/api/users/search/', params)
+
+    def test_prefix_results_come_before_substring_results(self):
+        response = self.search(q='ALI', user_id=self.me.id)
+        names = [row['username'] for row in response.json()['results']]
+        self.assertEqual(names, ['Alice', 'alina', 'Malice', 'Xalicex'])
+        self.assertIsNone(response.json()['next_cursor'])
+
+    def test_pagination_crosses_from_prefix_to_substring(self):
+        names, cursor = [], None
+        while True:
+            params = {'q': 'ali', 'limit': 1, 'user_id': self.me.id}
+            if cursor:
+                params['cursor'] = cursor
+            payload = self.search(**params).json()
+            names += [row['username'] for row in payload['results']]
+            cursor = payload['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(names, ['Alice', 'alina', 'Malice', 'Xalicex'])
+
+    def test_short_query_is_prefix_only_and_renamed_user_is_reindexed(self):
+        self.assertEqual([row['username'] for row in self.search(q='al').json()['results']],
+                         ['alibaba', 'Alice', 'alina'])
+        bob = User.objects.get(username='bob')
+        bob.username = 'Bobalice'
+        bob.save()
+        names = [row['username'] for row in self.search(q='lic').json()['results']]
+        self.assertIn('Bobalice', names)
+
+    def test_invalid_cursor_is_rejected(self):
+        self.assertEqual(self.search(q='ali', cursor='garbage').status_code, 400)
+
+
+class ChannelPairTests(TestCase):
+    """每对用户只有一个频道：顺序无关，重复插入被唯一索引拒绝，重复打开命中缓存"""
+
+    def setUp(self):
+        channel_cache.invalidate()
+        self.a = User.objects.create(username='a', password='x')
+        self.b = User.objects.create(username='b', password='x')
+
+    def request_chat(self, from_user, to_user):
+        return self.client.post('/api/request_chat', {'from_user': from_user, 'to_user': to_user},
+                                content_type='application/json')
+
+    def test_same_channel_in_either_order_and_cached(self):
+        first = self.request_chat(self.a.id, self.b.id).json()
+        second = self.request_chat(self.b.id, self.a.id).json()
+        self.assertEqual(first, second)
+        self.assertEqual(Channel.objects.count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.request_chat(self.a.id, self.b.id).json(), first)
+
+    def test_duplicate_pair_is_rejected_by_database(self):
+        Channel.objects.create(name='a-b', from_user=self.a, to_user=self.b)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Channel.objects.create(name='b-a', from_user=self.b, to_user=self.a)
+        # 另一个请求抢先创建了频道：返回已有的那个
+        self.assertEqual(channels.get_or_create_channel(self.b.id, self.a.id)[1], 'a-b')
+
+    def test_unknown_user(self):
+        self.assertEqual(self.request_chat(self.a.id, 999).status_code, 404)
+
+
+class EventStreamTests(TestCase):
+    """事件流通过ASGI立即返回数据；新会话通知只在频道新建时发送"""
+
+    async def test_stream_sends_bytes_immediately(self):
+        response = await self.async_client.get('/api/events/', {'channel': 1})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        first = await asyncio.wait_for(anext(chunks), timeout=2)
+        self.assertTrue(first.startswith(b'retry:'))
+        await chunks.aclose()
+
+    async def test_new_chat_published_only_when_channel_created(self):
+        channel_cache.invalidate()
+        a = await User.objects.acreate(username='sa', password='x')
+        b = await User.objects.acreate(username='sb', password='x')
+        subscription = broker.subscribe([user_topic(b.id)])
+        try:
+            for _ in range(2):
+                response = await self.async_client.post('/api/request_chat', {'from_user': a.id, 'to_user': b.id},
+                                                        content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+            await asyncio.sleep(0.05)  # 等 call_soon_threadsafe 投递
+            self.assertEqual(subscription.queue.qsize(), 1)
+            self.assertEqual((await subscription.get(timeout=1))['type'], 'new_chat')
+        finally:
+            broker.unsubscribe(subscription)
+
+
+class SQLiteConcurrencyTests(SimpleTestCase):
+    """生产SQLite配置下多线程并发写入不出现 database is locked"""
+
+    def test_stress_has_no_lock_errors(self):
+        # 在子进程中运行，压测使用独立的临时数据库文件（测试库是内存数据库，无法体现WAL和锁）
+        output = subprocess.run(
+            [sys.executable, 'manage.py', 'stress_sqlite', '--writers', '8', '--readers', '2',
+             '--seconds', '2', '--json'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=120, check=True,
+        ).stdout
+        report = json.loads(output[output.index('{'):])
+        self.assertEqual(report['pragmas']['journal_mode'], 'wal')
+        self.assertGreater(report['write_ops'], 0)
+        self.assertEqual((report['lock_errors'], report['read_errors']), (0, 0), report['sample_errors'])
@@ -21,14 +21,27 @@ urlpatterns = [
     # 打卡管理
     path('checkins/', views.checkins, name='checkins'),
     path('checkin-stats/', views.checkin_stats, name='checkin_stats'),
+    path('checkins/import/', views.checkins_import, name='checkins_import'),
+    path('checkins/export/', views.checkins_export, name='checkins_export'),
+    path('checkin-calendar/', views.checkin_calendar, name='checkin_calendar'),
     
     # AI消息
     path('generate-reminder/', views.generate_reminder, name='generate_reminder'),
     path('ai-messages/', views.ai_messages, name='ai_messages'),
+    path('ai-messages/export/', views.ai_messages_export, name='ai_messages_export'),
+    path('ai-jobs/<int:job_id>/', views.ai_job_detail, name='ai_job_detail'),
     
     # 消息管理（扩展原有功能）
     path('send-message/', views.send_message, name='send_message'),
     path('get-messages/', views.get_messages, name='get_messages'),
+    path('get-messages/export/', views.messages_export, name='messages_export'),
+    path('sentiment/batch/', views.sentiment_batch, name='sentiment_batch'),
+    
+    # 实时推送
+    path('events/', views.event_stream, name='event_stream'),
+    
+    # 性能指标
+    path('metrics', views.metrics_view, name='metrics'),
     
     # 提示词模板管理
     path('prompt-templates/', views.prompt_templates, name='prompt_templates'),
@@ -1,39 +1,86 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import action, api_view, parser_classes, permission_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.hashers import make_password, check_password
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db.models import Q, Max
 from django.views.decorators.csrf import csrf_exempt
 from datetime import datetime, date
+import asyncio
 import json
-from snownlp import SnowNLP
 
-from .models import User, Channel, Message, Goal, CheckIn, PromptTemplate, AIMessage
+from .models import User, Channel, Message, Goal, CheckIn, GoalStreak, PromptTemplate, AIMessage, AIJob
 from .serializers import (
     UserSerializer, ChannelSerializer, MessageSerializer, 
-    GoalSerializer, CheckInSerializer, PromptTemplateSerializer, AIMessageSerializer,
+    GoalSerializer, CheckInSerializer, PromptTemplateSerializer, AIMessageSerializer, AIMessageListSerializer,
     GoalCreateSerializer, CheckInCreateSerializer, AIMessageCreateSerializer
 )
 from .ai_service import AIService
+from .events import broker, channel_topic, user_topic, format_sse
+from .sentiment import sentiment_service
+from .pagination import KeysetPagination
+from .db import write_transaction
+from .authentication import issue_token, request_user, request_user_id, token_ttl
+from . import bitmaps, channels, directory, exports, imports, jobs, metrics, reminders, scheduler, streaks
 
 # Create your views here.
 
 # 初始化AI服务
 ai_service = AIService()
 
+# 消息分页大小
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_PAGE_MAX_SIZE = 200
+
+# 批量情感分析单次最多文本数
+SENTIMENT_BATCH_MAX_SIZE = 500
+
+# 打卡日历单次查询的最大天数
+CALENDAR_MAX_DAYS = 366 * 3
+
+# 事件流心跳间隔（秒），防止代理断开空闲连接
+SSE_HEARTBEAT_SECONDS = 15
+
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()  # type: ignore
     serializer_class = UserSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """用户目录搜索：q 按用户名前缀和子串匹配（忽略大小写），分页返回，不包含当前用户"""
+        exclude_id = request_user_id(request, request.GET.get('user_id'))
+        try:
+            exclude_id = int(exclude_id) if exclude_id else None
+        except ValueError:
+            return Response({'error': 'user_id参数无效'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = KeysetPagination().get_page_size(request)
+        try:
+            results, next_cursor = directory.search(request.GET.get('q', ''), exclude_id, limit,
+                                                    request.GET.get('cursor'))
+        except (ValueError, TypeError, ValidationError):
+            return Response({'error': '分页游标无效'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'next_cursor': next_cursor, 'results': results})
 
 class ChannelViewSet(viewsets.ModelViewSet):
-    queryset = Channel.objects.all()  # type: ignore
+    queryset = Channel.objects.select_related('from_user', 'to_user')  # type: ignore
     serializer_class = ChannelSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('id',)
 
 class MessageViewSet(viewsets.ModelViewSet):
-    queryset = Message.objects.all() # type: ignore
+    queryset = Message.objects.select_related('from_user', 'to_user') # type: ignore
     serializer_class = MessageSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
 # 用户相关视图
 @csrf_exempt
@@ -57,7 +104,8 @@ def register(request):
     )
     
     serializer = UserSerializer(user)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(dict(serializer.data, token=issue_token(user), expires_in=token_ttl()),
+                    status=status.HTTP_201_CREATED)
 
 @csrf_exempt
 @api_view(['POST'])
@@ -71,8 +119,9 @@ def login(request):
     try:
         user = User.objects.get(username=username)
         if check_password(password, user.password):
+            # 只在登录时校验密码，之后的请求凭签名令牌认证
             serializer = UserSerializer(user)
-            return Response(serializer.data)
+            return Response(dict(serializer.data, token=issue_token(user), expires_in=token_ttl()))
         else:
             return Response({'error': '密码错误'}, status=status.HTTP_401_UNAUTHORIZED)
     except User.DoesNotExist:
@@ -87,7 +136,7 @@ def goals(request):
         if not user_id:
             return Response({'error': '用户ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
         
-        goals = Goal.objects.filter(user_id=user_id, is_active=True)
+        goals = Goal.objects.filter(user_id=user_id, is_active=True).select_related('user')
         serializer = GoalSerializer(goals, many=True)
         return Response(serializer.data)
     
@@ -140,13 +189,15 @@ def checkins(request):
         if goal_id:
             filters['goal_id'] = goal_id
         
-        checkins = CheckIn.objects.filter(**filters).order_by('-check_in_date')
-        serializer = CheckInSerializer(checkins, many=True)
-        return Response(serializer.data)
+        checkins = CheckIn.objects.filter(**filters).select_related('user', 'goal__user')
+        paginator = KeysetPagination(ordering=('-check_in_date', '-id'))
+        page = paginator.paginate_queryset(checkins, request)
+        serializer = CheckInSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     elif request.method == 'POST':
         data = request.data.copy()
-        user_id = data.get('user_id')
+        user_id = request_user_id(request, data.get('user_id'))
         goal_id = data.get('goal_id')
         
         if not user_id or not goal_id:
@@ -162,17 +213,21 @@ def checkins(request):
         serializer = CheckInCreateSerializer(data=data)
         
         if serializer.is_valid():
-            checkin = serializer.save(user_id=user_id, goal_id=goal_id)
+            # 打卡、统计更新和任务入队在同一个写事务中完成
+            # 令牌认证的请求已有用户对象，序列化时不必再查询
+            owner = {'user': request.user} if isinstance(request.user, User) else {'user_id': user_id}
+            with write_transaction():
+                checkin = serializer.save(goal_id=goal_id, **owner)
+                # AI激励消息交给后台工作进程生成，客户端通过 ai-jobs 接口获取结果
+                job = jobs.enqueue('motivational_message', {'checkin_id': checkin.id})
             
-            # 生成AI激励消息
-            user = User.objects.get(id=user_id)
-            goal = Goal.objects.get(id=goal_id)
-            ai_message = ai_service.generate_motivational_message(user, goal, checkin)
-            
-            return Response({
+            payload = {
                 'checkin': CheckInSerializer(checkin).data,
-                'ai_message': ai_message
-            }, status=status.HTTP_201_CREATED)
+                'ai_message': None,
+                'ai_job_id': job.id
+            }
+            broker.publish(user_topic(user_id), 'checkin', payload)
+            return Response(payload, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -190,51 +245,133 @@ def checkin_stats(request):
         filters['goal_id'] = goal_id
     
     checkins = CheckIn.objects.filter(**filters)
-    
-    # 计算统计信息
-    total_checkins = checkins.count()
     today = date.today()
-    today_checkin = checkins.filter(check_in_date=today).exists()
-    
-    # 计算连续打卡天数
-    consecutive_days = 0
-    check_date = today
-    while True:
-        if checkins.filter(check_in_date=check_date).exists():
-            consecutive_days += 1
-            check_date -= timezone.timedelta(days=1)
-        else:
-            break
-    
-    # 最近7天打卡情况
-    recent_checkins = []
-    for i in range(7):
-        check_date = today - timezone.timedelta(days=i)
-        recent_checkins.append({
-            'date': check_date.strftime('%Y-%m-%d'),
-            'checked': checkins.filter(check_in_date=check_date).exists()
-        })
+    
+    week_start = today - timezone.timedelta(days=6)
+    
+    if goal_id:
+        # 单个目标：直接读取增量维护的连续打卡统计
+        streak = GoalStreak.objects.filter(user_id=user_id, goal_id=goal_id).first()
+        total_checkins = streak.total_checkins if streak else 0
+        longest_streak = streak.longest_streak if streak else 0
+        consecutive_days = streaks.consecutive_days(user_id, goal_id, today, streak=streak)
+        calendar = bitmaps.load_calendar(user_id, goal_id, start_year=week_start.year, end_year=today.year)
+    else:
+        # 所有目标：任意目标打卡即算当天已打卡，合并各目标位图后用位运算计算
+        total_checkins = checkins.count()
+        longest_streak = GoalStreak.objects.filter(user_id=user_id).aggregate(
+            longest=Max('longest_streak')
+        )['longest'] or 0
+        calendar = bitmaps.load_calendar(user_id, end_year=today.year)
+        consecutive_days = calendar.consecutive_days(today)
+    
+    today_checkin = calendar.is_checked(today)
+    
+    # 最近7天打卡情况（位图中读取，无需逐天查询）
+    recent_checkins = list(reversed(calendar.days(week_start, today)))
     
     return Response({
         'total_checkins': total_checkins,
         'consecutive_days': consecutive_days,
+        'longest_streak': longest_streak,
         'today_checkin': today_checkin,
         'recent_checkins': recent_checkins
     })
 
+@api_view(['GET'])
+def checkin_calendar(request):
+    """获取日期区间内的打卡日历（热力图），默认最近一年"""
+    user_id = request.GET.get('user_id')
+    goal_id = request.GET.get('goal_id')
+    
+    if not user_id:
+        return Response({'error': '用户ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    today = date.today()
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else today
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timezone.timedelta(days=364)
+    except ValueError:
+        return Response({'error': '日期格式应为YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end:
+        return Response({'error': '开始日期不能晚于结束日期'}, status=status.HTTP_400_BAD_REQUEST)
+    if (end - start).days >= CALENDAR_MAX_DAYS:
+        return Response({'error': f'日期区间不能超过{CALENDAR_MAX_DAYS}天'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    calendar = bitmaps.load_calendar(user_id, goal_id, start_year=start.year, end_year=end.year)
+    return Response({
+        'start': start.strftime('%Y-%m-%d'),
+        'end': end.strftime('%Y-%m-%d'),
+        'checked_days': calendar.count(start, end),
+        'days': calendar.days(start, end)
+    })
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def checkins_import(request):
+    """批量导入历史打卡（NDJSON或CSV），上传文件字段为 file，也可直接以请求体发送"""
+    user_id = request.query_params.get('user_id')
+    upload = None
+    if request.content_type.startswith('multipart/form-data'):
+        user_id = user_id or request.data.get('user_id')
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': '请上传文件'}, status=status.HTTP_400_BAD_REQUEST)
+    if not user_id:
+        return Response({'error': '用户ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
+    user = get_object_or_404(User, id=user_id)
+    
+    try:
+        fmt = imports.detect_format(
+            request.query_params.get('file_format'),
+            filename=upload.name if upload else '',
+            content_type=upload.content_type if upload else request.content_type,
+        )
+    except ValueError:
+        return Response({'error': 'file_format参数应为ndjson或csv'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # 按行流式读取，不把整个文件读入内存
+    if upload is not None:
+        byte_lines = upload
+    elif request.stream is not None:
+        byte_lines = iter(request.stream.readline, b'')
+    else:
+        byte_lines = []
+    try:
+        result = imports.import_checkins(user, byte_lines, fmt)
+    except UnicodeDecodeError:
+        return Response({'error': '文件编码应为UTF-8'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result)
+
+@api_view(['GET'])
+def checkins_export(request):
+    """流式导出打卡记录（NDJSON或CSV）"""
+    user_id = request.GET.get('user_id')
+    goal_id = request.GET.get('goal_id')
+    if not user_id:
+        return Response({'error': '用户ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fmt = exports.parse_format(request.GET.get('file_format'))
+    except ValueError:
+        return Response({'error': 'file_format参数应为ndjson或csv'}, status=status.HTTP_400_BAD_REQUEST)
+    get_object_or_404(User, id=user_id)
+    
+    rows = exports.checkin_rows(user_id, goal_id)
+    return exports.streaming_response(request, rows, fmt, exports.CHECKIN_EXPORT_FIELDS, f'checkins-{user_id}')
+
 # AI消息相关视图
 @api_view(['POST'])
 def generate_reminder(request):
     """生成AI提醒消息"""
     data = request.data
-    user_id = data.get('user_id')
+    user_id = request_user_id(request, data.get('user_id'))
     goal_id = data.get('goal_id')
     
     if not user_id or not goal_id:
         return Response({'error': '用户ID和目标ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        user = User.objects.get(id=user_id)
+        user = request_user(request, user_id)
         goal = Goal.objects.get(id=goal_id)
         
         ai_message = ai_service.generate_reminder_message(user, goal)
@@ -261,9 +398,50 @@ def ai_messages(request):
     if goal_id:
         filters['goal_id'] = goal_id
     
-    ai_messages = AIMessage.objects.filter(**filters).order_by('-created_at')
-    serializer = AIMessageSerializer(ai_messages, many=True)
-    return Response(serializer.data)
+    ai_messages = AIMessage.objects.filter(**filters).select_related('user', 'goal__user', 'prompt_template')
+    # 默认不返回体积较大的 filled_prompt 和 context_data，需要时传 detail=full
+    serializer_class = AIMessageSerializer if request.GET.get('detail') == 'full' else AIMessageListSerializer
+    if serializer_class is AIMessageSerializer:
+        ai_messages = ai_messages.select_related('prompt_blob', 'context_blob')
+    paginator = KeysetPagination(ordering=('-created_at', '-id'))
+    page = paginator.paginate_queryset(ai_messages, request)
+    serializer = serializer_class(page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+@api_view(['GET'])
+def ai_messages_export(request):
+    """流式导出AI消息日志（含完整提示词和上下文），默认NDJSON"""
+    user_id = request.GET.get('user_id')
+    goal_id = request.GET.get('goal_id')
+    if not user_id:
+        return Response({'error': '用户ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fmt = exports.parse_format(request.GET.get('file_format'))
+    except ValueError:
+        return Response({'error': 'file_format参数应为ndjson或csv'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    rows = exports.ai_message_rows(user_id, goal_id)
+    return exports.streaming_response(request, rows, fmt, exports.AI_MESSAGE_EXPORT_FIELDS, f'ai-messages-{user_id}')
+
+@api_view(['GET'])
+def ai_job_detail(request, job_id):
+    """查询后台AI任务的状态和结果，只能查询自己打卡产生的任务"""
+    user_id = request_user_id(request, request.GET.get('user_id'))
+    if not user_id:
+        return Response({'error': '用户ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
+    job = get_object_or_404(AIJob, id=job_id)
+    # 任务不属于该用户时和任务不存在一样返回404，不暴露其他用户的任务ID
+    if not CheckIn.objects.filter(id=job.payload.get('checkin_id'), user_id=user_id).exists():
+        return Response({'error': '任务不存在'}, status=status.HTTP_404_NOT_FOUND)
+    result = job.result or {}
+    return Response({
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'ai_message': result.get('ai_message'),
+        'created_at': job.created_at,
+        'updated_at': job.updated_at
+    })
 
 # 消息相关视图（扩展原有功能）
 @api_view(['POST'])
@@ -281,29 +459,174 @@ def send_message(request):
     # 进行情感分析
     sentiment_result = ai_service.analyze_sentiment(message_text)
     
-    message = Message.objects.create(
-        message=message_text,
-        from_user_id=from_user_id,
-        to_user_id=to_user_id,
-        channel_id=channel_id,
-        sentiment_score=sentiment_result['score'],
-        sentiment_label=sentiment_result['label']
-    )
+    with write_transaction():
+        message = Message.objects.create(
+            message=message_text,
+            from_user_id=from_user_id,
+            to_user_id=to_user_id,
+            channel_id=channel_id,
+            sentiment_score=sentiment_result['score'],
+            sentiment_label=sentiment_result['label']
+        )
     
     serializer = MessageSerializer(message)
+    broker.publish(channel_topic(channel_id), 'new_message', serializer.data)
+    broker.publish(user_topic(to_user_id), 'new_message', serializer.data)
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+@api_view(['POST'])
+def sentiment_batch(request):
+    """批量情感分析"""
+    texts = request.data.get('texts')
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return Response({'error': 'texts必须是字符串列表'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(texts) > SENTIMENT_BATCH_MAX_SIZE:
+        return Response({'error': f'单次最多分析{SENTIMENT_BATCH_MAX_SIZE}条文本'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'results': sentiment_service.analyze_many(texts)})
+
 @api_view(['GET'])
 def get_messages(request):
-    """获取消息列表"""
+    """获取消息列表
+
+    - after_id / since：增量拉取该游标之后的新消息（轮询用）
+    - before_id：向前翻页加载更早的历史消息
+    - 不带游标时返回最近一页
+    结果始终按时间正序返回，每页最多 MESSAGE_PAGE_MAX_SIZE 条。
+    """
     channel_id = request.GET.get('channel')
     if not channel_id:
         return Response({'error': '频道ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
     
-    messages = Message.objects.filter(channel_id=channel_id).order_by('created_at')
+    since = request.GET.get('since')
+    try:
+        limit = _parse_limit(request.GET.get('limit'), MESSAGE_PAGE_SIZE, MESSAGE_PAGE_MAX_SIZE)
+    except ValueError:
+        return Response({'error': 'limit参数无效'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        channel_id = _parse_id(channel_id)
+        after_id = _parse_id(request.GET.get('after_id'))
+        before_id = _parse_id(request.GET.get('before_id'))
+    except ValueError:
+        return Response({'error': 'channel、after_id和before_id应为整数'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    messages = Message.objects.filter(channel_id=channel_id).select_related('from_user', 'to_user')
+    
+    if after_id or since:
+        # 增量模式：只取游标之后的消息，代价与新消息数量成正比
+        if after_id:
+            anchor = Message.objects.filter(channel_id=channel_id, id=after_id).values('created_at', 'id').first()
+            if anchor is None:
+                return Response({'error': '游标消息不存在'}, status=status.HTTP_400_BAD_REQUEST)
+            messages = messages.filter(
+                Q(created_at__gt=anchor['created_at']) |
+                Q(created_at=anchor['created_at'], id__gt=anchor['id'])
+            )
+        else:
+            since_dt = parse_datetime(since)
+            if since_dt is None:
+                return Response({'error': 'since参数格式错误'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(since_dt):
+                since_dt = timezone.make_aware(since_dt)
+            messages = messages.filter(created_at__gt=since_dt)
+        messages = list(messages.order_by('created_at', 'id')[:limit])
+    else:
+        # 翻页模式：倒序取一页再翻转为正序
+        if before_id:
+            anchor = Message.objects.filter(channel_id=channel_id, id=before_id).values('created_at', 'id').first()
+            if anchor is None:
+                return Response({'error': '游标消息不存在'}, status=status.HTTP_400_BAD_REQUEST)
+            messages = messages.filter(
+                Q(created_at__lt=anchor['created_at']) |
+                Q(created_at=anchor['created_at'], id__lt=anchor['id'])
+            )
+        messages = list(messages.order_by('-created_at', '-id')[:limit])
+        messages.reverse()
+    
     serializer = MessageSerializer(messages, many=True)
     return Response(serializer.data)
 
+def _parse_id(value):
+    """解析可选的整数ID参数，缺省时返回None"""
+    if value in (None, ''):
+        return None
+    return int(value)
+
+def _parse_limit(value, default, maximum):
+    """解析分页大小参数，超过上限时截断"""
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    if limit <= 0:
+        raise ValueError(value)
+    return min(limit, maximum)
+
+@api_view(['GET'])
+def messages_export(request):
+    """流式导出聊天记录（用户参与的某个频道或该用户收发的全部消息），默认NDJSON"""
+    try:
+        channel_id = _parse_id(request.GET.get('channel'))
+        user_id = _parse_id(request_user_id(request, request.GET.get('user_id')))
+    except (TypeError, ValueError):
+        return Response({'error': 'channel和user_id应为整数'}, status=status.HTTP_400_BAD_REQUEST)
+    if not user_id:
+        return Response({'error': '用户ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        fmt = exports.parse_format(request.GET.get('file_format'))
+    except ValueError:
+        return Response({'error': 'file_format参数应为ndjson或csv'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if channel_id is not None:
+        # 只能导出自己参与的频道，其他频道和不存在的频道一样返回404
+        is_member = Channel.objects.filter(Q(from_user_id=user_id) | Q(to_user_id=user_id), id=channel_id).exists()
+        if not is_member:
+            return Response({'error': '频道不存在'}, status=status.HTTP_404_NOT_FOUND)
+        rows = exports.message_rows(channel_id=channel_id)
+    else:
+        rows = exports.message_rows(user_id=user_id)
+    filename = f'messages-channel-{channel_id}' if channel_id else f'messages-user-{user_id}'
+    return exports.streaming_response(request, rows, fmt, exports.MESSAGE_EXPORT_FIELDS, filename)
+
+# 性能指标（Prometheus 文本格式）
+def metrics_view(request):
+    """按视图汇总的请求延迟直方图、各阶段耗时和AI兜底次数，仅允许本机抓取"""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return JsonResponse({'error': '无权访问'}, status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+# 实时推送视图（Server-Sent Events，需通过ASGI服务运行，见 backend/asgi.py）
+async def event_stream(request):
+    """订阅频道消息和用户通知的事件流"""
+    topics = []
+    try:
+        if request.GET.get('channel'):
+            topics.append(channel_topic(int(request.GET['channel'])))
+        if request.GET.get('user_id'):
+            topics.append(user_topic(int(request.GET['user_id'])))
+    except ValueError:
+        return JsonResponse({'error': '参数格式错误'}, status=status.HTTP_400_BAD_REQUEST)
+    if not topics:
+        return JsonResponse({'error': '频道ID或用户ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    async def stream():
+        subscription = broker.subscribe(topics)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 # 提示词模板管理视图
 @api_view(['GET', 'POST'])
 def prompt_templates(request):
@@ -350,41 +673,30 @@ def request_chat(request):
     if not from_user_id or not to_user_id:
         return Response({'error': 'from_user和to_user为必填'}, status=status.HTTP_400_BAD_REQUEST)
     
-    # 用排序保证顺序无关
-    user_ids = sorted([from_user_id, to_user_id])
-    channel = Channel.objects.filter(from_user_id=user_ids[0], to_user_id=user_ids[1]).first()
-    if not channel:
-        from_user = User.objects.get(id=user_ids[0])
-        to_user = User.objects.get(id=user_ids[1])
-        channel = Channel.objects.create(
-            name=f"{from_user.username}-{to_user.username}",
-            from_user=from_user,
-            to_user=to_user
-        )
-    return Response({
-        'channel_id': channel.id,
-        'channel_name': channel.name
-    })
+    try:
+        channel_id, channel_name, created = channels.get_or_create_channel(from_user_id, to_user_id)
+    except User.DoesNotExist:
+        return Response({'error': '用户不存在'}, status=status.HTTP_404_NOT_FOUND)
+    data = {
+        'channel_id': channel_id,
+        'channel_name': channel_name
+    }
+    # 只在频道新建时通知对方有新的聊天请求
+    if created:
+        broker.publish(user_topic(to_user_id), 'new_chat', dict(data, from_user=from_user_id))
+    return Response(data)
 
 @api_view(['GET'])
 def batch_reminders(request):
     """批量获取所有目标的AI提示语，区分已打卡/未打卡"""
-    user_id = request.GET.get('user_id')
+    user_id = request_user_id(request, request.GET.get('user_id'))
     if not user_id:
         return Response({'error': '用户ID不能为空'}, status=status.HTTP_400_BAD_REQUEST)
-    today = date.today()
-    goals = Goal.objects.filter(user_id=user_id, is_active=True)
-    result = []
-    for goal in goals:
-        checked = CheckIn.objects.filter(user_id=user_id, goal_id=goal.id, check_in_date=today).exists()
-        if checked:
-            ai_reminder = f"太棒了，今天已经完成{goal.title}，继续保持！"
-        else:
-            ai_reminder = AIService().generate_reminder_message(goal.user, goal)
-        result.append({
-            'goal_id': goal.id,
-            'title': goal.title,
-            'checked': checked,
-            'ai_reminder': ai_reminder
-        })
+    try:
+        user = request_user(request, user_id)
+    except User.DoesNotExist:
+        return Response({'error': '用户不存在'}, status=status.HTTP_404_NOT_FOUND)
+    goals = list(Goal.objects.filter(user_id=user_id, is_active=True))
+    # 一次查询今日打卡情况，复用调度器提前生成的提醒，其余AI调用并发执行并受整体时间预算约束
+    result = reminders.generate_reminders(ai_service, user, goals, scheduler.local_date(user))
     return Response(result)
@@ -18,7 +18,12 @@ const _axios = axios.create(config);
 
 _axios.interceptors.request.use(
   function(config) {
-    // Do something before request is sent
+    // 登录后保存的用户信息中带有访问令牌，随每个请求发送
+    const savedUser = localStorage.getItem('user');
+    const token = savedUser ? JSON.parse(savedUser).token : null;
+    if (token) {
+      config.headers['Authorization'] = `Bearer ${token}`;
+    }
     return config;
   },
   function(error) {
@@ -34,7 +39,11 @@ _axios.interceptors.response.use(
     return response;
   },
   function(error) {
-    // Do something with response error
+    // 令牌过期或无效：清除登录状态，刷新后回到登录页
+    if (error.response && error.response.status === 401 && localStorage.getItem('user')) {
+      localStorage.removeItem('user');
+      window.location.reload();
+    }
     return Promise.reject(error);
   }
 );
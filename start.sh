@@ -12,8 +12,15 @@ fi
 echo "📡 启动后端服务 (Django)..."
 cd backend
 source ../venv/bin/activate
-python manage.py runserver --noreload &
+# 实时事件流（/api/events/）是异步视图，必须通过ASGI服务运行；runserver 是WSGI，连接会一直挂起
+uvicorn backend.asgi:application --host 127.0.0.1 --port 8000 &
 BACKEND_PID=$!
+# 后台AI任务工作进程（打卡后的激励消息）
+python manage.py run_ai_worker &
+WORKER_PID=$!
+# 定时提醒调度进程（按用户本地提醒时间提前生成）
+python manage.py run_reminder_scheduler &
+SCHEDULER_PID=$!
 cd ..
 
 # 等待后端启动
@@ -36,5 +43,5 @@ echo ""
 echo "按 Ctrl+C 停止所有服务"
 
 # 等待用户中断
-trap "echo '🛑 正在停止服务...'; kill $BACKEND_PID $FRONTEND_PID 2>/dev/null; exit" INT
+trap "echo '🛑 正在停止服务...'; kill $BACKEND_PID $WORKER_PID $SCHEDULER_PID $FRONTEND_PID 2>/dev/null; exit" INT
 wait 
\ No newline at end of file